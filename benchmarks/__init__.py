@@ -0,0 +1,3 @@
+"""
+Benchmark suites for the MIFARE system
+"""
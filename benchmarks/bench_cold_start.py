@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the web application
+
+Each sample runs in a fresh interpreter, the way a serverless container
+starts: it times importing the application module, building the app and
+serving the first request until its first body byte. Also reports which
+heavy modules were loaded by then and whether a database engine exists.
+
+Usage:
+    python benchmarks/bench_cold_start.py
+    python benchmarks/bench_cold_start.py --path /login --runs 20
+    python benchmarks/bench_cold_start.py --entry app     # legacy module-level app
+"""
+
+import os
+import sys
+import json
+import statistics
+import subprocess
+import tempfile
+
+import click
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['flask_wtf', 'wtforms', 'mifare', 'qrcode', 'jwt', 'sqlite3', 'psycopg2']
+
+SAMPLE = r'''
+import sys, time, json
+start = time.perf_counter()
+if {entry!r} == 'factory':
+    from webapp import create_app
+    imported = time.perf_counter()
+    app = create_app()
+else:
+    from app import app
+    imported = time.perf_counter()
+created = time.perf_counter()
+client = app.test_client()
+response = client.get({path!r}, buffered=False)
+first_chunk = next(iter(response.response), b'')
+first_byte = time.perf_counter()
+engines = app.extensions['sqlalchemy']._app_engines[app]
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'first_byte_ms': (first_byte - created) * 1000,
+    'total_ms': (first_byte - start) * 1000,
+    'status': response.status_code,
+    'loaded': [m for m in {heavy!r} if m in sys.modules],
+    'engine_created': any(not hasattr(e, 'func') for e in dict.values(engines)),
+}}))
+'''
+
+
+def run_sample(entry: str, path: str, database_url: str) -> dict:
+    """Start a fresh interpreter and return its timings"""
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONDONTWRITEBYTECODE='')
+    code = SAMPLE.format(entry=entry, path=path, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@click.command()
+@click.option('--runs', default=10, show_default=True, help='Fresh interpreters to start')
+@click.option('--path', default='/', show_default=True, help='Path requested as the first request')
+@click.option('--entry', type=click.Choice(['factory', 'app']), default='factory', show_default=True,
+              help='Start from webapp.create_app() or the module-level app in app.py')
+def main(runs, path, entry):
+    """Measure import time and time to first byte in fresh interpreters"""
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'cold_start.db')}"
+        samples = [run_sample(entry, path, database_url) for _ in range(runs)]
+
+    click.echo(f"{entry} entry, first request GET {path} -> {samples[-1]['status']}, {runs} runs")
+    for key in ('import_ms', 'create_ms', 'first_byte_ms', 'total_ms'):
+        values = [s[key] for s in samples]
+        click.echo(f"  {key:<14} median {statistics.median(values):8.1f}  min {min(values):8.1f}")
+    click.echo(f"  heavy modules loaded: {', '.join(samples[-1]['loaded']) or 'none'}")
+    click.echo(f"  database engine created: {samples[-1]['engine_created']}")
+
+
+if __name__ == '__main__':
+    main()
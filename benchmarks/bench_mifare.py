@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the mifare package
+
+Times the helpers used by bulk jobs against the fixtures in fixtures.py,
+compares them with the recorded baseline and exits non-zero when any
+benchmark is slower than the baseline by more than the threshold.
+
+Usage:
+    python benchmarks/bench_mifare.py                  # compare with baseline
+    python benchmarks/bench_mifare.py --save-baseline  # record a new baseline
+    python benchmarks/bench_mifare.py -k tlv           # only matching benchmarks
+"""
+
+import os
+import sys
+import json
+import platform
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import click
+
+from mifare import MifareUtils
+from mifare.card_types import CardTypeDetector
+from mifare.diversify import KeyDiversifier
+from mifare.dump import classic_layout
+from mifare import desfire, iso14443, ndef, personalize, ultralight, verify
+from benchmarks import fixtures
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_THRESHOLD = 0.30
+
+# name -> factory returning (operation, items processed per call)
+BENCHMARKS: Dict[str, Callable[[], Tuple[Callable[[], object], int]]] = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark factory under the given name"""
+    def decorator(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return decorator
+
+
+@benchmark('hex.bytes_to_hex.1k')
+def bench_bytes_to_hex():
+    dumps = fixtures.classic_1k_dumps()
+    return (lambda: [MifareUtils.bytes_to_hex(d) for d in dumps]), len(dumps)
+
+
+@benchmark('hex.hex_to_bytes.1k')
+def bench_hex_to_bytes():
+    hex_dumps = [MifareUtils.bytes_to_hex(d) for d in fixtures.classic_1k_dumps()]
+    return (lambda: [MifareUtils.hex_to_bytes(h) for h in hex_dumps]), len(hex_dumps)
+
+
+@benchmark('hex.bytes_to_hex.4k')
+def bench_bytes_to_hex_4k():
+    dumps = fixtures.classic_4k_dumps()
+    return (lambda: [MifareUtils.bytes_to_hex(d, '') for d in dumps]), len(dumps)
+
+
+@benchmark('hex.split_hex_string.4k')
+def bench_split_hex_string():
+    hex_dumps = [MifareUtils.bytes_to_hex(d, '') for d in fixtures.classic_4k_dumps()]
+    return (lambda: [MifareUtils.split_hex_string(h) for h in hex_dumps]), len(hex_dumps)
+
+
+@benchmark('hex.validate_hex_string.1k')
+def bench_validate_hex():
+    hex_dumps = [MifareUtils.bytes_to_hex(d) for d in fixtures.classic_1k_dumps()]
+    return (lambda: [MifareUtils.validate_hex_string(h) for h in hex_dumps]), len(hex_dumps)
+
+
+@benchmark('format.uid')
+def bench_format_uid():
+    uids = fixtures.uid_corpus()
+    return (lambda: [MifareUtils.format_uid(u) for u in uids]), len(uids)
+
+
+@benchmark('format.atr')
+def bench_format_atr():
+    atrs = fixtures.atr_corpus()
+    return (lambda: [MifareUtils.format_atr(a) for a in atrs]), len(atrs)
+
+
+@benchmark('tlv.parse_ndef_area')
+def bench_parse_tlv():
+    areas = fixtures.ndef_areas()
+    return (lambda: [MifareUtils.parse_tlv(a) for a in areas]), len(areas)
+
+
+@benchmark('detect.card_type')
+def bench_detect_card_type():
+    atrs = fixtures.atr_corpus()
+    return (lambda: [CardTypeDetector.detect_card_type(a) for a in atrs]), len(atrs)
+
+
+@benchmark('detect.create_card_info')
+def bench_create_card_info():
+    inputs = fixtures.card_info_inputs()
+    return (lambda: [CardTypeDetector.create_card_info(a, u, r) for a, u, r in inputs]), len(inputs)
+
+
+@benchmark('diversify.classic_key')
+def bench_diversify_single():
+    diversifier = KeyDiversifier(fixtures.MASTER_KEY)
+    uids = fixtures.uid_corpus()
+    return (lambda: [diversifier.classic_key(u, 1, 'A') for u in uids]), len(uids)
+
+
+@benchmark('diversify.batch.1k_card')
+def bench_diversify_batch():
+    # Per-card cost of a roll-out: keys A and B for all 16 sectors of each card
+    diversifier = KeyDiversifier(fixtures.MASTER_KEY)
+    uids = fixtures.uid_corpus(10000)
+    return (lambda: list(diversifier.batch_sector_keys(uids, range(16)))), len(uids)
+
+
+@benchmark('iso14443.crc_a.block')
+def bench_crc_a():
+    # CRC_A over 16-byte blocks plus a command byte, as on a READ/WRITE frame
+    frames = [b'\xa0' + d[o:o + 16] for d in fixtures.classic_1k_dumps() for o in range(0, 1024, 16)]
+    return (lambda: [iso14443.crc_a(f) for f in frames]), len(frames)
+
+
+@benchmark('iso14443.block0.single')
+def bench_block0_single():
+    dumps = fixtures.classic_1k_dumps() + fixtures.classic_4k_dumps()
+    return (lambda: [iso14443.validate_classic_block0(d[:16], len(d)) for d in dumps]), len(dumps)
+
+
+@benchmark('iso14443.block0.array.1k')
+def bench_block0_array():
+    dumps = fixtures.classic_1k_dumps() * 32
+    data = b''.join(dumps)
+    return (lambda: iso14443.validate_classic_images(data, 1024)), len(dumps)
+
+
+@benchmark('ndef.encode_image.ntag215')
+def bench_ndef_encode():
+    spec = ultralight.get_spec('NTAG215')
+    messages = [[ndef.uri_record(f'https://example.com/card/{n}'), ndef.text_record(f'Card {n} ' * 8)]
+                for n in range(256)]
+    return (lambda: [ultralight.encode_ndef_image(spec, ndef.encode_message(m)) for m in messages]), len(messages)
+
+
+@benchmark('ultralight.write_plan.ntag215')
+def bench_write_plan():
+    spec = ultralight.get_spec('NTAG215')
+    images = [ultralight.encode_ndef_image(spec, ndef.encode_message([ndef.text_record(f'Card {n} ' * 8)]))
+              for n in range(257)]
+    pairs = list(zip(images, images[1:]))
+    return (lambda: [ultralight.write_plan(a, b) for a, b in pairs]), len(pairs)
+
+
+def _desfire_card(size: int):
+    card = desfire.SimulatedDesfireCard()
+    client = desfire.DesfireClient(card.transceive)
+    client.provision(desfire.DesfireProgram([desfire.DesfireApplication(
+        0xF00001, files=[desfire.DesfireFile(1, size, data=bytes(range(256)) * (size // 256))])]))
+    return client
+
+
+@benchmark('desfire.read_stream.4k')
+def bench_desfire_read():
+    client = _desfire_card(4096)
+    return (lambda: client.read_data(1)), 1
+
+
+@benchmark('desfire.write_plan.4k')
+def bench_desfire_write():
+    client = _desfire_card(4096)
+    ops = [desfire.FileOp(0xF00001, 'write', 1, offset, bytes(64)) for offset in range(0, 4096, 64)]
+    return (lambda: client.execute(desfire.plan(ops))), 1
+
+
+@benchmark('personalize.render.1k')
+def bench_personalize():
+    trailer = fixtures.DEFAULT_TRAILER.hex().upper()
+    sector_data = {str(sector): {'blocks': ['00' * 16] * 3 + [trailer], 'accessBits': trailer[12:20],
+                                 'keys': {'keyA': trailer[:12], 'keyB': trailer[20:]}} for sector in range(16)}
+    template = personalize.Template(sector_data, personalize.parse_fields([
+        {'name': 'employee', 'type': 'uint', 'sector': 1, 'block': 0, 'length': 4},
+        {'name': 'site', 'type': 'bcd', 'sector': 1, 'block': 0, 'offset': 4, 'length': 2},
+        {'name': 'name', 'type': 'ascii', 'sector': 2, 'block': 0, 'length': 16},
+    ]))
+    rows = [{'employee': n, 'site': n % 100, 'name': f'Holder {n}'} for n in range(1000)]
+    return (lambda: list(template.render_many(rows))), len(rows)
+
+
+def _verify_fixture():
+    image = fixtures.classic_1k_dumps()[0]
+    sector_data = {str(sector): {'blocks': [image[o:o + 16].hex().upper()
+                                            for o in range(first * 16, (first + count) * 16, 16)]}
+                   for sector, (first, count) in enumerate(classic_layout(16))}
+    return verify.ExpectedImage(sector_data), image
+
+
+@benchmark('verify.image_match.1k')
+def bench_verify_match():
+    expected, image = _verify_fixture()
+    return (lambda: [expected.compare_image(image) for _ in range(1000)]), 1000
+
+
+@benchmark('verify.image_mismatch.1k')
+def bench_verify_mismatch():
+    expected, image = _verify_fixture()
+    changed = bytearray(image)
+    changed[5 * 16] ^= 0xFF
+    changed = bytes(changed)
+    return (lambda: [expected.compare_image(changed) for _ in range(1000)]), 1000
+
+
+@benchmark('verify.block_hashes.1k')
+def bench_verify_hashes():
+    expected, _ = _verify_fixture()
+    hashes = dict(expected.hashes)
+    return (lambda: [expected.compare_hashes(hashes) for _ in range(1000)]), 1000
+
+
+def measure(operation: Callable[[], object], repeat: int = 7) -> float:
+    """Best-of-N seconds per call of operation"""
+    timer = timeit.Timer(operation)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def read_baseline(path: str) -> Dict[str, float]:
+    """Load recorded per-item timings, or an empty dict if none exist"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('results', {})
+
+
+def write_baseline(path: str, results: Dict[str, float]) -> None:
+    """Write per-item timings together with the interpreter they came from"""
+    with open(path, 'w') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def run(names: List[str], repeat: int) -> Dict[str, float]:
+    """Run the named benchmarks and return seconds per processed item"""
+    results = {}
+    for name in names:
+        operation, items = BENCHMARKS[name]()
+        results[name] = measure(operation, repeat) / items
+    return results
+
+
+@click.command()
+@click.option('--baseline', 'baseline_path', default=BASELINE_FILE, show_default=True,
+              help='Baseline file to compare against or write')
+@click.option('--save-baseline', is_flag=True, help='Record the current timings as the baseline')
+@click.option('--threshold', default=DEFAULT_THRESHOLD, show_default=True,
+              help='Allowed slowdown relative to the baseline (0.30 = 30%)')
+@click.option('--repeat', default=7, show_default=True, help='Timing repeats per benchmark')
+@click.option('-k', 'pattern', default='', help='Only run benchmarks whose name contains this')
+def main(baseline_path, save_baseline, threshold, repeat, pattern):
+    """Run the mifare micro-benchmarks"""
+    names = [name for name in BENCHMARKS if pattern in name]
+    results = run(names, repeat)
+
+    if save_baseline:
+        recorded = read_baseline(baseline_path)
+        recorded.update(results)
+        write_baseline(baseline_path, recorded)
+
+    baseline = read_baseline(baseline_path)
+    regressions = []
+
+    click.echo(f"{'benchmark':<32} {'per item':>12} {'baseline':>12} {'ratio':>7}")
+    for name in names:
+        current = results[name]
+        reference = baseline.get(name)
+        if reference:
+            ratio = current / reference
+            status = ' REGRESSED' if ratio > 1 + threshold else ''
+            if status:
+                regressions.append(name)
+            click.echo(f"{name:<32} {current * 1e6:>10.2f}us {reference * 1e6:>10.2f}us {ratio:>6.2f}x{status}")
+        else:
+            click.echo(f"{name:<32} {current * 1e6:>10.2f}us {'-':>12} {'-':>7}")
+
+    if regressions:
+        click.echo(f"\n{len(regressions)} benchmark(s) regressed beyond {threshold:.0%}: {', '.join(regressions)}", err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+SQLite write-throughput benchmark
+
+Programs cards concurrently against a fresh SQLite file: each of --threads
+workers marks its share of distributions as fetched and then as
+programmed, the two writes the programming API makes per card. Runs the
+workload with the default journal settings, with the WAL pragmas of
+webapp.sqlite, and with WAL plus the single writer queue, and reports
+card writes per second and "database is locked" failures for each.
+
+Usage:
+    python benchmarks/bench_sqlite.py
+    python benchmarks/bench_sqlite.py --threads 16 --cards 4000
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import click
+
+MODES = {
+    'default': {'SQLITE_PRAGMAS': {}, 'SQLITE_WRITER': False},
+    'wal': {'SQLITE_WRITER': False},
+    'wal+writer': {'SQLITE_WRITER': True},
+}
+
+
+def _seed(app, cards: int):
+    from webapp.extensions import db
+    from webapp.models import User, CardProgram, ProgramDistribution
+    from webapp.schema import upgrade_schema
+
+    with app.app_context():
+        upgrade_schema()
+        admin = User(username='admin', email='admin@example.com', password_hash='x', is_admin=True)
+        db.session.add(admin)
+        db.session.flush()
+        program = CardProgram(name='bench', sector_data=json.dumps({'1': {'blocks': ['00' * 16]}}),
+                              created_by=admin.id)
+        db.session.add(program)
+        db.session.flush()
+        for start in range(0, cards, 1000):
+            user = User(username=f'user{start}', email=f'user{start}@example.com', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            db.session.bulk_save_objects([
+                ProgramDistribution(program_id=program.id, user_id=user.id, access_token=f'token-{n}',
+                                    expires_at=program.created_at.replace(year=2100), program_version=1)
+                for n in range(start, min(start + 1000, cards))
+            ])
+        db.session.commit()
+        return [d.id for d in ProgramDistribution.query.order_by(ProgramDistribution.id)]
+
+
+def run_mode(mode: str, threads: int, cards: int) -> dict:
+    from webapp import create_app
+    from webapp.extensions import db
+    from webapp.models import ProgramDistribution
+    from webapp import audit, distributions, writer
+
+    directory = tempfile.mkdtemp(prefix='bench_sqlite_')
+    try:
+        config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(directory, "bench.db")}'}
+        config.update(MODES[mode])
+        app = create_app(config)
+        ids = _seed(app, cards)
+        errors = []
+
+        def worker(chunk):
+            with app.app_context():
+                for distribution_id in chunk:
+                    try:
+                        distribution = db.session.get(ProgramDistribution, distribution_id)
+                        distributions.mark_fetched(distribution)
+                        distributions.mark_programmed(distribution)
+                    except Exception as e:
+                        errors.append(str(e).splitlines()[0])
+                        db.session.rollback()
+                    finally:
+                        db.session.remove()
+
+        workers = [threading.Thread(target=worker, args=(ids[n::threads],)) for n in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            programmed = ProgramDistribution.query.filter_by(is_used=True).count()
+            queue = writer.get_writer()
+            commits = queue.commits if queue else None
+            audit.get_buffer().stop()  # write the buffered events before the database goes away
+            if queue:
+                queue.stop()
+            db.engine.dispose()
+        return {
+            'mode': mode,
+            'seconds': elapsed,
+            'cards_per_second': programmed / elapsed,
+            'programmed': programmed,
+            'locked': sum('locked' in error for error in errors),
+            'errors': len(errors),
+            'commits': commits,
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@click.command()
+@click.option('--threads', default=8, show_default=True, help='Concurrent request threads')
+@click.option('--cards', default=2000, show_default=True, help='Distributions to program')
+@click.option('--mode', 'modes', multiple=True, type=click.Choice(list(MODES)), help='Modes to run (default: all)')
+def main(threads, cards, modes):
+    """Compare SQLite write throughput with and without WAL and the writer queue"""
+    print(f'{"mode":<12} {"cards/s":>9} {"seconds":>8} {"programmed":>10} {"locked":>7} {"commits":>8}')
+    for mode in modes or MODES:
+        result = run_mode(mode, threads, cards)
+        commits = '-' if result['commits'] is None else result['commits']
+        print(f'{mode:<12} {result["cards_per_second"]:9.0f} {result["seconds"]:8.2f} '
+              f'{result["programmed"]:10d} {result["locked"]:7d} {commits:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark fixtures for the mifare package
+
+Deterministic card dumps, ATR corpora and NDEF areas that look like what
+field readers produce, so benchmark numbers are comparable between runs.
+"""
+
+import random
+from typing import List, Tuple
+
+from mifare.card_types import CardTypeDetector
+
+SEED = 0x4D494641  # "MIFA"
+
+DEFAULT_TRAILER = bytes.fromhex('FFFFFFFFFFFF' 'FF078069' 'FFFFFFFFFFFF')
+MASTER_KEY = bytes.fromhex('00112233445566778899AABBCCDDEEFF')  # AN10922 example key
+
+
+def _manufacturer_block(rng: random.Random, sak: int = 0x08, atqa: bytes = b'\x04\x00') -> bytes:
+    """Build a block 0 with a 4-byte UID, matching BCC, SAK and ATQA"""
+    uid = bytes(rng.randrange(256) for _ in range(4))
+    bcc = uid[0] ^ uid[1] ^ uid[2] ^ uid[3]
+    vendor = bytes(rng.randrange(256) for _ in range(8))
+    return uid + bytes([bcc, sak]) + atqa + vendor
+
+
+def classic_dump(rng: random.Random, sectors_4k: bool = False) -> bytes:
+    """Generate a MIFARE Classic 1K or 4K image with valid trailers"""
+    if sectors_4k:
+        layout = [4] * 32 + [16] * 8
+        sak, atqa = 0x18, b'\x02\x00'
+    else:
+        layout = [4] * 16
+        sak, atqa = 0x08, b'\x04\x00'
+
+    image = bytearray()
+    for sector, blocks in enumerate(layout):
+        for block in range(blocks):
+            if sector == 0 and block == 0:
+                image += _manufacturer_block(rng, sak, atqa)
+            elif block == blocks - 1:
+                image += DEFAULT_TRAILER
+            else:
+                image += bytes(rng.randrange(256) for _ in range(16))
+    return bytes(image)
+
+
+def classic_1k_dumps(count: int = 32) -> List[bytes]:
+    """Corpus of 1K images"""
+    rng = random.Random(SEED)
+    return [classic_dump(rng) for _ in range(count)]
+
+
+def classic_4k_dumps(count: int = 8) -> List[bytes]:
+    """Corpus of 4K images"""
+    rng = random.Random(SEED + 1)
+    return [classic_dump(rng, sectors_4k=True) for _ in range(count)]
+
+
+def atr_corpus(count: int = 512) -> List[str]:
+    """Mix of known, reformatted and unknown ATRs as readers report them"""
+    rng = random.Random(SEED + 2)
+    known = [pattern for patterns in CardTypeDetector.ATR_PATTERNS.values() for pattern in patterns]
+    unknown = [
+        '3B8F8001804F0CA0000003060300FF0000000000',
+        '3B8C80018073C821108001A0000003060300',
+        '3B0265',
+        '3BFA1300008131FE454A434F5034315632333194',
+    ]
+
+    corpus = []
+    for _ in range(count):
+        atr = rng.choice(known if rng.random() < 0.8 else unknown)
+        style = rng.randrange(3)
+        if style == 1:
+            atr = ' '.join(atr[i:i + 2] for i in range(0, len(atr), 2))
+        elif style == 2:
+            atr = atr.lower()
+        corpus.append(atr)
+    return corpus
+
+
+def uid_corpus(count: int = 512) -> List[str]:
+    """4- and 7-byte UIDs in the formats the web app stores"""
+    rng = random.Random(SEED + 3)
+    uids = []
+    for _ in range(count):
+        length = 4 if rng.random() < 0.7 else 7
+        uid = ''.join(f'{rng.randrange(256):02x}' for _ in range(length))
+        if rng.random() < 0.5:
+            uid = ' '.join(uid[i:i + 2] for i in range(0, len(uid), 2))
+        uids.append(uid)
+    return uids
+
+
+def _ndef_uri_record(rng: random.Random) -> bytes:
+    """Short-record NDEF URI record with a random path"""
+    path = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789/') for _ in range(rng.randrange(8, 40)))
+    payload = b'\x04' + path.encode()  # 0x04 = "https://"
+    return bytes([0xD1, 0x01, len(payload)]) + b'U' + payload
+
+
+def ndef_area(rng: random.Random, size: int = 144) -> bytes:
+    """NDEF data area: lock control TLV, NDEF message TLV, terminator, padding"""
+    area = bytearray(b'\x01\x03\xA0\x0C\x34')
+    message = _ndef_uri_record(rng)
+    area += bytes([0x03, len(message)]) + message
+    area += b'\xFE'
+    area += bytes(max(0, size - len(area)))
+    return bytes(area[:size])
+
+
+def ndef_areas(count: int = 64) -> List[bytes]:
+    """Corpus of NTAG215-sized NDEF areas"""
+    rng = random.Random(SEED + 4)
+    return [ndef_area(rng, 504) for _ in range(count)]
+
+
+def card_info_inputs(count: int = 512) -> List[Tuple[str, str, str]]:
+    """(atr, uid, reader) triples for CardInfo construction"""
+    atrs = atr_corpus(count)
+    uids = uid_corpus(count)
+    readers = ['ACS ACR122U PICC Interface 00 00', 'Web NFC API', 'OMNIKEY 5022 CL 0']
+    return [(atr, uid, readers[i % len(readers)]) for i, (atr, uid) in enumerate(zip(atrs, uids))]
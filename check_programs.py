@@ -7,11 +7,10 @@ from app import app, db, CardProgram, User
 
 def check_programs():
     with app.app_context():
-        # Check all programs
-        programs = CardProgram.query.all()
-        print(f"Total programs in database: {len(programs)}")
+        # Check all programs, streamed so large tables don't load at once
+        print(f"Total programs in database: {CardProgram.query.count()}")
         
-        for program in programs:
+        for program in CardProgram.query.order_by(CardProgram.id).yield_per(500):
             print(f"- ID: {program.id}")
             print(f"  Name: {program.name}")
             print(f"  Description: {program.description}")
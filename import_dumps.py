@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Bulk Dump Importer
+Converts MIFARE Classic card dumps (.mfd/.bin/.dump/.eml files, loose or
+inside .zip/.tar archives) into CardProgram rows
+
+Dumps are memory-mapped and decoded on a process pool; the decoded
+programs are inserted in chunks, one transaction per chunk.
+"""
+
+import os
+import sys
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+from mifare.dump import CardDump, open_dump, find_dump_sources
+
+
+def decode_dump(source):
+    """Decode and validate one dump (runs in a worker process)
+
+    Returns (label, row, errors); row is None when the dump was rejected.
+    """
+    label = source.source if isinstance(source, CardDump) else source
+    try:
+        with open_dump(source) as dump:
+            errors = dump.validate()
+            if errors:
+                return label, None, errors
+            row = {
+                'uid': dump.uid,
+                'card_type': dump.card_type.value,
+                'sector_data': json.dumps(dump.to_sector_data(), separators=(',', ':')),
+            }
+        return label, row, []
+    except Exception as e:
+        return label, None, [str(e)]
+
+
+def insert_programs(db, rows):
+    """Insert one chunk of programs in a single transaction"""
+    from sqlalchemy import insert
+    from app import CardProgram
+
+    db.session.execute(insert(CardProgram), rows)
+    db.session.commit()
+
+
+@click.command()
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--owner', default='admin', show_default=True, help='Admin username that will own the programs')
+@click.option('--name', 'name_template', default='Dump {uid}', show_default=True,
+              help='Program name; {uid}, {card_type} and {source} are substituted')
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='Decoder processes')
+@click.option('--chunk-size', default=500, show_default=True, help='Programs per insert transaction')
+@click.option('--dry-run', is_flag=True, help='Decode and validate without writing to the database')
+@click.option('--verbose', is_flag=True, help='List every rejected dump and why')
+def import_dumps(paths, owner, name_template, workers, chunk_size, dry_run, verbose):
+    """Import card dumps from PATHS as card programs"""
+    # Archive members are read here, one pass per archive, and sent to the workers as bytes
+    sources = [CardDump(source.source, bytes(source.data)) if isinstance(source, CardDump) else source
+               for source in find_dump_sources(paths)]
+    total = len(sources)
+    if not total:
+        click.echo('No dump files found', err=True)
+        return
+
+    from app import app, db, User
+
+    with app.app_context():
+        owner_user = User.query.filter_by(username=owner).first()
+        if not owner_user:
+            click.echo(f'User not found: {owner}', err=True)
+            sys.exit(1)
+
+        started = time.perf_counter()
+        done = imported = rejected = 0
+        chunk = []
+
+        def flush():
+            nonlocal imported
+            if chunk and not dry_run:
+                insert_programs(db, chunk)
+            imported += len(chunk)
+            chunk.clear()
+            rate = done / max(time.perf_counter() - started, 1e-9)
+            click.echo(f'{done}/{total} dumps, {imported} imported, {rejected} rejected, '
+                       f'{rate:.0f} dumps/s', err=True)
+
+        chunksize = max(1, min(64, total // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for label, row, errors in pool.map(decode_dump, sources, chunksize=chunksize):
+                done += 1
+                if row is None:
+                    rejected += 1
+                    if verbose:
+                        click.echo(f'rejected {label}: {"; ".join(errors)}', err=True)
+                    continue
+
+                chunk.append({
+                    'name': name_template.format(uid=row['uid'], card_type=row['card_type'],
+                                                 source=os.path.basename(label))[:100],
+                    'description': f"{row['card_type']} imported from {label}",
+                    'sector_data': row['sector_data'],
+                    'created_by': owner_user.id,
+                })
+                if len(chunk) >= chunk_size:
+                    flush()
+        flush()
+
+    action = 'Validated' if dry_run else 'Imported'
+    click.echo(f'{action} {imported} of {total} dumps in {time.perf_counter() - started:.1f}s '
+               f'({rejected} rejected)')
+
+
+if __name__ == '__main__':
+    import_dumps()
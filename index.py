@@ -1,4 +1,6 @@
-from app import app
+from webapp import create_app
+
+app = create_app()
 
 # Netlify serverless function entry point
 def handler(event, context):
@@ -5,7 +5,13 @@ Mifare App - Main Application Entry Point
 A Python application for working with MIFARE cards and NFC operations.
 """
 
+import os
 import sys
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 import click
 from colorama import init, Fore, Style
 
@@ -13,6 +19,8 @@ from colorama import init, Fore, Style
 init()
 
 from mifare import CardReader, MifareUtils
+from mifare.card_types import CardTypeDetector
+from mifare.dump import CardDump, open_dump, find_dump_sources
 
 @click.group()
 @click.version_option(version='1.0.0')
@@ -76,6 +84,183 @@ def info():
     except Exception as e:
         click.echo(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
 
+def _identify_reader(reader_name):
+    """Identify the card on a reader from its ATR"""
+    reader = CardReader()
+    try:
+        connection = reader.connect_to_card(reader_name)
+        info = CardTypeDetector.create_card_info(connection['atr'], reader=reader_name)
+        return {
+            'card_type': info.card_type.value,
+            'uid': info.uid,
+            'atr': info.atr,
+            'memory_size': info.memory_size,
+        }
+    finally:
+        reader.disconnect()
+
+def _read_reader(reader_name):
+    """Read the card on a reader"""
+    reader = CardReader()
+    try:
+        data = reader.read_card(reader_name)
+        return {
+            'card_type': data.get('type'),
+            'uid': data.get('uid'),
+            'atr': data.get('atr'),
+        }
+    finally:
+        reader.disconnect()
+
+def _identify_dump(source):
+    """Identify the card a dump file was taken from"""
+    with open_dump(source) as dump:
+        info = dump.card_info()
+    return {
+        'card_type': info.card_type.value,
+        'uid': info.uid,
+        'memory_size': info.memory_size,
+        'sector_count': info.sector_count,
+        'block_count': info.block_count,
+    }
+
+def _read_dump(source):
+    """Identify a dump file and include its blocks"""
+    with open_dump(source) as dump:
+        block_size = 16 if dump.is_classic else 4
+        record = {
+            'card_type': dump.card_type.value,
+            'uid': dump.uid,
+            'memory_size': len(dump.data),
+            'blocks': [block.hex().upper() for block in dump.blocks(block_size)],
+        }
+        if dump.is_classic:
+            record['problems'] = dump.validate()
+        return record
+
+def _batch_sources(dumps, readers, all_readers):
+    """Collect (kind, source) pairs from the batch command arguments"""
+    if all_readers:
+        readers = list(readers) + CardReader().list_readers()
+    paths = list(dumps)
+    if '-' in paths:
+        paths.remove('-')
+        paths.extend(line.strip() for line in sys.stdin if line.strip())
+    sources = [('reader', name) for name in readers]
+    sources.extend(('dump', source) for source in find_dump_sources(paths))
+    return sources
+
+def _run_batch(sources, handlers, workers):
+    """Process sources on a worker pool and stream one NDJSON record per card
+
+    Records are written as soon as their card finishes, in completion
+    order, and stdout is flushed once per round of completed work rather
+    than per line. A summary record is written last.
+    """
+    out = sys.stdout
+    started = time.perf_counter()
+    counts = Counter()
+    card_types = Counter()
+    max_pending = workers * 4
+    sources = iter(sources)
+
+    def emit(record):
+        out.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def fill():
+            # Keep a bounded number of cards in flight so huge input lists stay cheap
+            for kind, source in sources:
+                pending[pool.submit(handlers[kind], source)] = (kind, source)
+                if len(pending) >= max_pending:
+                    break
+
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, source = pending.pop(future)
+                if isinstance(source, CardDump):
+                    source = source.source
+                record = {'type': 'card', 'input': kind, 'source': source}
+                try:
+                    record.update(future.result())
+                    record['ok'] = True
+                    counts['ok'] += 1
+                    card_types[record.get('card_type') or 'Unknown'] += 1
+                except Exception as e:
+                    record['ok'] = False
+                    record['error'] = str(e)
+                    counts['errors'] += 1
+                emit(record)
+            out.flush()
+            fill()
+
+    emit({
+        'type': 'summary',
+        'total': counts['ok'] + counts['errors'],
+        'ok': counts['ok'],
+        'errors': counts['errors'],
+        'card_types': dict(card_types),
+        'elapsed_s': round(time.perf_counter() - started, 3),
+    })
+    out.flush()
+    return counts['errors']
+
+def _batch_command(name, help_text, handlers):
+    """Build a batch command around per-reader and per-dump handlers"""
+    @cli.command(name, help=help_text)
+    @click.argument('dumps', nargs=-1, type=click.Path())
+    @click.option('--reader', 'readers', multiple=True, help='Reader name (repeatable)')
+    @click.option('--all-readers', is_flag=True, help='Include every reader reported by the system')
+    @click.option('--workers', default=min(32, (os.cpu_count() or 1) * 4), show_default=True,
+                  help='Worker threads')
+    def command(dumps, readers, all_readers, workers):
+        sources = _batch_sources(dumps, readers, all_readers)
+        errors = _run_batch(sources, handlers, max(1, workers))
+        if errors:
+            sys.exit(1)
+    return command
+
+batch_read = _batch_command(
+    'batch-read',
+    """Read many cards and stream one NDJSON record per card.
+
+    DUMPS are dump files, archives of them (.zip, .tar) or directories
+    (.mfd, .bin, .dump, .eml); use - to read paths from stdin. Cards on readers are added with
+    --reader or --all-readers.""",
+    {'reader': _read_reader, 'dump': _read_dump})
+
+batch_identify = _batch_command(
+    'batch-identify',
+    """Identify many cards and stream one NDJSON record per card.
+
+    Takes the same inputs as batch-read but only reports card type, UID
+    and memory layout.""",
+    {'reader': _identify_reader, 'dump': _identify_dump})
+
+@cli.command('derive-keys')
+@click.argument('uids', type=click.File('r'), default='-')
+@click.option('--master-key', envvar='MIFARE_MASTER_KEY', required=True,
+              help='AES-128 master key in hex (or MIFARE_MASTER_KEY)')
+@click.option('--system-id', envvar='MIFARE_SYSTEM_ID', default='', help='System identifier in hex')
+@click.option('--sectors', default=16, show_default=True, help='Sectors per card (16 for 1K, 40 for 4K)')
+def derive_keys(uids, master_key, system_id, sectors):
+    """Derive per-card sector keys for a list of UIDs (one per line).
+
+    Keys are diversified from the master key as in NXP AN10922 and
+    streamed as one NDJSON record per card."""
+    from mifare.diversify import KeyDiversifier
+
+    diversifier = KeyDiversifier(master_key, bytes.fromhex(system_id))
+    card_uids = (line.strip() for line in uids if line.strip())
+    out = sys.stdout
+    for uid, keys in diversifier.batch_sector_keys(card_uids, range(sectors)):
+        out.write(json.dumps({'uid': uid, 'keys': keys}, separators=(',', ':')) + '\n')
+    out.flush()
+
 def main():
     """Main entry point"""
     try:
@@ -95,20 +95,20 @@ class CardTypeDetector:
         MifareCardType.DESFIRE_EV1: {
             'memory_size': 8192,  # Variable, this is common size
             'sector_count': 0,
-            'block_count': 0,
-            'block_size': 0
+            'block_count': 256,  # 32-byte allocation units, see mifare.desfire
+            'block_size': 32
         },
         MifareCardType.DESFIRE_EV2: {
             'memory_size': 8192,  # Variable
             'sector_count': 0,
-            'block_count': 0,
-            'block_size': 0
+            'block_count': 256,  # 32-byte allocation units, see mifare.desfire
+            'block_size': 32
         },
         MifareCardType.DESFIRE_EV3: {
             'memory_size': 8192,  # Variable
             'sector_count': 0,
-            'block_count': 0,
-            'block_size': 0
+            'block_count': 256,  # 32-byte allocation units, see mifare.desfire
+            'block_size': 32
         }
     }
     
@@ -0,0 +1,123 @@
+"""
+Program Deltas
+
+Computes the blocks that differ between two versions of a program's
+sector_data, so a card that already holds the older version only needs the
+changed blocks written.
+
+A delta has the same shape as sector_data but only lists changed sectors,
+and within them uses None for blocks that are unchanged. When a sector's
+keys change, the keys the card currently holds are included as
+previousKeys so the writer can authenticate before rewriting the trailer.
+
+A sector the newer version no longer has is mapped to None, so writers
+can clear it on cards that still hold it. The sector editor saves edits
+in the same shape, where a sector mapped to None removes it from the
+program.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from .dump import access_bits_valid
+
+SectorData = Dict[str, Dict[str, Any]]
+
+
+def _normalise(block: Optional[str]) -> Optional[str]:
+    return block.replace(' ', '').upper() if block else block
+
+
+def compute_delta(old: SectorData, new: SectorData) -> SectorData:
+    """Sectors and blocks of new that differ from old"""
+    delta = {}
+    for sector, new_sector in new.items():
+        old_sector = old.get(sector) or {}
+        old_blocks = old_sector.get('blocks') or []
+        new_blocks = new_sector.get('blocks') or []
+
+        blocks = []
+        changed = False
+        for index, block in enumerate(new_blocks):
+            previous = old_blocks[index] if index < len(old_blocks) else None
+            if _normalise(block) == _normalise(previous):
+                blocks.append(None)
+            else:
+                blocks.append(block)
+                changed = True
+
+        if not changed:
+            continue
+
+        entry = dict(new_sector)
+        entry['blocks'] = blocks
+        old_keys = old_sector.get('keys')
+        if old_keys and old_keys != new_sector.get('keys'):
+            entry['previousKeys'] = old_keys
+        delta[sector] = entry
+    for sector in old:
+        if sector not in new:
+            delta[sector] = None
+    return delta
+
+
+def apply_delta(base: SectorData, delta: SectorData) -> SectorData:
+    """Reconstruct the newer sector_data from a base version and a delta"""
+    result = {sector: dict(data, blocks=list(data.get('blocks') or [])) for sector, data in base.items()}
+    for sector, changes in delta.items():
+        if changes is None:
+            result.pop(sector, None)
+            continue
+        target = result.setdefault(sector, {'blocks': []})
+        blocks = target['blocks']
+        for index, block in enumerate(changes.get('blocks') or []):
+            if block is None:
+                continue
+            if index >= len(blocks):
+                blocks.extend([None] * (index + 1 - len(blocks)))
+            blocks[index] = block
+        for key, value in changes.items():
+            if key not in ('blocks', 'previousKeys'):
+                target[key] = value
+    return result
+
+
+def changed_block_count(delta: SectorData) -> int:
+    """Number of blocks a delta writes (removed sectors write none)"""
+    return sum(1 for sector in delta.values() if sector for block in sector.get('blocks') or [] if block is not None)
+
+
+def removed_sectors(delta: SectorData) -> List[str]:
+    """Sectors the newer version no longer has"""
+    return [sector for sector, changes in delta.items() if changes is None]
+
+
+_BLOCK_HEX = re.compile(r'[0-9A-Fa-f]{32}')
+
+
+def validate_sectors(sector_data: SectorData, sectors: Iterable[str]) -> List[str]:
+    """Problems with the given sectors of sector_data (sectors it lacks are skipped)"""
+    errors = []
+    for sector in sectors:
+        data = sector_data.get(sector)
+        if data is None:
+            continue
+        if not sector.isdigit() or int(sector) > 39:
+            errors.append(f'sector {sector}: not a Classic sector number')
+            continue
+        if not isinstance(data, dict):
+            errors.append(f'sector {sector}: must be an object')
+            continue
+        expected = 16 if int(sector) >= 32 else 4
+        blocks = data.get('blocks') or []
+        if len(blocks) != expected:
+            errors.append(f'sector {sector}: has {len(blocks)} blocks, expected {expected}')
+            continue
+        for index, block in enumerate(blocks):
+            if not isinstance(block, str) or not _BLOCK_HEX.fullmatch(block.replace(' ', '')):
+                errors.append(f'sector {sector} block {index}: must be 32 hex digits')
+                break
+        else:
+            if not access_bits_valid(bytes.fromhex(blocks[-1].replace(' ', ''))):
+                errors.append(f'sector {sector}: access bits fail their inverted-copy check')
+    return errors
@@ -0,0 +1,618 @@
+"""
+MIFARE DESFire Applications and Files
+
+Programs for DESFire cards describe applications (3-byte AIDs) holding
+standard and backup data files:
+
+    {"desfire": {"applications": [
+        {"aid": "F00001", "keys": 1, "files": [
+            {"id": 1, "type": "standard", "size": 64, "data": "<hex>"}]}]}}
+
+DesfireClient drives a card through a transceive callable using native
+commands wrapped in ISO 7816-4 APDUs (CLA 0x90). Reads and writes longer
+than one frame are chained with ADDITIONAL_FRAME (0xAF) and streamed, so no
+more than one frame of file data is buffered whatever the file size.
+plan() groups file operations so each application is selected once, merges
+contiguous writes and commits backup files once per application.
+
+Only plain communication is modelled: files that need MACed or enciphered
+transfers require an authenticated session, which is out of scope here.
+SimulatedDesfireCard answers the same commands in memory.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .card_types import CardTypeDetector, MifareCardType
+
+CLA = 0x90
+MAX_FRAME = 59  # data bytes per native frame
+WRITE_HEADER = 7  # file number, 3-byte offset, 3-byte length
+ALLOCATION_UNIT = 32  # file sizes are rounded up to this on the card
+MAX_APPLICATIONS = 28
+MAX_FILES = 32
+PICC_AID = 0x000000
+
+# Native commands
+CMD_SELECT_APPLICATION = 0x5A
+CMD_GET_APPLICATION_IDS = 0x6A
+CMD_CREATE_APPLICATION = 0xCA
+CMD_DELETE_APPLICATION = 0xDA
+CMD_GET_FILE_IDS = 0x6F
+CMD_GET_FILE_SETTINGS = 0xF5
+CMD_CREATE_STD_DATA_FILE = 0xCD
+CMD_CREATE_BACKUP_DATA_FILE = 0xCB
+CMD_READ_DATA = 0xBD
+CMD_WRITE_DATA = 0x3D
+CMD_COMMIT_TRANSACTION = 0xC7
+CMD_ABORT_TRANSACTION = 0xA7
+CMD_FREE_MEMORY = 0x6E
+ADDITIONAL_FRAME = 0xAF
+
+# Status codes (SW2 after 0x91)
+OPERATION_OK = 0x00
+OUT_OF_EEPROM = 0x0E
+ILLEGAL_COMMAND = 0x1C
+LENGTH_ERROR = 0x7E
+PERMISSION_DENIED = 0x9D
+PARAMETER_ERROR = 0x9E
+APPLICATION_NOT_FOUND = 0xA0
+BOUNDARY_ERROR = 0xBE
+DUPLICATE_ERROR = 0xDE
+FILE_NOT_FOUND = 0xF0
+
+STATUS_NAMES = {
+    OUT_OF_EEPROM: 'out of EEPROM',
+    ILLEGAL_COMMAND: 'illegal command',
+    LENGTH_ERROR: 'length error',
+    PERMISSION_DENIED: 'permission denied',
+    PARAMETER_ERROR: 'parameter error',
+    APPLICATION_NOT_FOUND: 'application not found',
+    BOUNDARY_ERROR: 'boundary error',
+    DUPLICATE_ERROR: 'duplicate',
+    FILE_NOT_FOUND: 'file not found',
+}
+
+FILE_TYPES = {'standard': 0x00, 'backup': 0x01}
+FILE_TYPE_NAMES = {code: name for name, code in FILE_TYPES.items()}
+CREATE_COMMANDS = {'standard': CMD_CREATE_STD_DATA_FILE, 'backup': CMD_CREATE_BACKUP_DATA_FILE}
+COMM_PLAIN = 0x00
+FREE_ACCESS = 0xEEEE  # every access right set to "free"
+DEFAULT_KEY_SETTINGS = 0x0F
+
+
+class DesfireError(Exception):
+    """The card answered a command with an error status"""
+
+    def __init__(self, status: int, command: int):
+        self.status = status
+        self.command = command
+        super().__init__(f'command {command:02X} failed: '
+                         f'{STATUS_NAMES.get(status, "status")} ({status:02X})')
+
+
+def _u24(value: int) -> bytes:
+    return value.to_bytes(3, 'little')
+
+
+def _allocated(size: int) -> int:
+    return -(-size // ALLOCATION_UNIT) * ALLOCATION_UNIT
+
+
+@dataclass
+class DesfireFile:
+    """A standard or backup data file"""
+    file_id: int
+    size: int
+    file_type: str = 'standard'
+    data: bytes = b''
+    access_rights: int = FREE_ACCESS
+
+    @property
+    def allocated(self) -> int:
+        """Card memory used, rounded up to the allocation unit"""
+        return _allocated(self.size)
+
+
+@dataclass
+class DesfireApplication:
+    """An application and its files"""
+    aid: int
+    key_count: int = 1
+    key_settings: int = DEFAULT_KEY_SETTINGS
+    files: List[DesfireFile] = field(default_factory=list)
+
+
+@dataclass
+class DesfireProgram:
+    """Applications to create on a DESFire card"""
+    applications: List[DesfireApplication] = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'DesfireProgram':
+        """Build and validate a program from its sector_data "desfire" entry"""
+        try:
+            return cls._parse(data)
+        except KeyError as e:
+            raise ValueError(f'missing field {e}') from None
+
+    @classmethod
+    def _parse(cls, data: Dict) -> 'DesfireProgram':
+        applications = []
+        seen_aids = set()
+        for app in data.get('applications', []):
+            aid = int(str(app['aid']), 16)
+            if not PICC_AID < aid <= 0xFFFFFF:
+                raise ValueError(f'AID {app["aid"]} is out of range')
+            if aid in seen_aids:
+                raise ValueError(f'AID {aid:06X} is listed twice')
+            seen_aids.add(aid)
+            key_count = int(app.get('keys', 1))
+            if not 1 <= key_count <= 14:
+                raise ValueError(f'AID {aid:06X}: applications have 1 to 14 keys')
+
+            files = []
+            seen_files = set()
+            for item in app.get('files', []):
+                file_id = int(item['id'])
+                file_type = item.get('type', 'standard')
+                size = int(item['size'])
+                content = bytes.fromhex(item.get('data', ''))
+                if not 0 <= file_id < MAX_FILES or file_id in seen_files:
+                    raise ValueError(f'AID {aid:06X}: invalid or duplicate file id {file_id}')
+                if file_type not in FILE_TYPES:
+                    raise ValueError(f'AID {aid:06X}: unsupported file type {file_type}')
+                if not 0 < size <= 0xFFFFFF:
+                    raise ValueError(f'AID {aid:06X} file {file_id}: invalid size {size}')
+                if len(content) > size:
+                    raise ValueError(f'AID {aid:06X} file {file_id}: {len(content)} bytes of data '
+                                     f'exceed the {size}-byte file')
+                seen_files.add(file_id)
+                files.append(DesfireFile(file_id, size, file_type, content,
+                                         int(str(item.get('access', 'EEEE')), 16)))
+            applications.append(DesfireApplication(aid, key_count,
+                                                   int(str(app.get('keySettings', '0F')), 16), files))
+
+        if len(applications) > MAX_APPLICATIONS:
+            raise ValueError(f'A card holds at most {MAX_APPLICATIONS} applications')
+        return cls(applications)
+
+    def to_json(self) -> Dict:
+        return {'applications': [
+            {'aid': f'{app.aid:06X}', 'keys': app.key_count, 'keySettings': f'{app.key_settings:02X}',
+             'files': [{'id': f.file_id, 'type': f.file_type, 'size': f.size, 'data': f.data.hex().upper(),
+                        'access': f'{f.access_rights:04X}'} for f in app.files]}
+            for app in self.applications
+        ]}
+
+    def memory_required(self) -> int:
+        """Bytes of card memory the files allocate"""
+        return sum(f.allocated for app in self.applications for f in app.files)
+
+    def fits(self, card_type: MifareCardType) -> bool:
+        memory = CardTypeDetector.get_card_specs(card_type).get('memory_size') or 0
+        return self.memory_required() <= memory
+
+    def write_ops(self) -> List['FileOp']:
+        """Writes that store every file's initial data"""
+        return [FileOp(app.aid, 'write', f.file_id, 0, f.data, backup=f.file_type == 'backup')
+                for app in self.applications for f in app.files if f.data]
+
+
+@dataclass(frozen=True)
+class FileOp:
+    """One read or write of a file in an application
+
+    Reads take length bytes from offset (0 reads to the end of the file);
+    writes store data at offset. backup marks writes to backup files,
+    which only take effect on commit.
+    """
+    aid: int
+    kind: str
+    file_id: int
+    offset: int = 0
+    data: bytes = b''
+    length: int = 0
+    backup: bool = False
+
+
+@dataclass
+class ApplicationBatch:
+    """Operations run under one application selection"""
+    aid: int
+    ops: List[FileOp] = field(default_factory=list)
+    commit: bool = False
+
+
+def plan(ops: Iterable[FileOp]) -> List[ApplicationBatch]:
+    """Group operations by application, in order of first use
+
+    Applications have separate file systems, so operations on different
+    AIDs are independent and only the order within an application is kept.
+    A write that continues the previous write to the same file is merged
+    into it, and one commit closes each application with backup writes.
+    """
+    batches: Dict[int, ApplicationBatch] = {}
+    for op in ops:
+        if op.kind not in ('read', 'write'):
+            raise ValueError(f'Unknown operation: {op.kind}')
+        batch = batches.get(op.aid)
+        if batch is None:
+            batch = batches[op.aid] = ApplicationBatch(op.aid)
+        last = batch.ops[-1] if batch.ops else None
+        if (op.kind == 'write' and last is not None and last.kind == 'write'
+                and last.file_id == op.file_id and last.offset + len(last.data) == op.offset):
+            batch.ops[-1] = FileOp(op.aid, 'write', op.file_id, last.offset, last.data + op.data,
+                                   backup=last.backup or op.backup)
+        else:
+            batch.ops.append(op)
+        if op.kind == 'write' and op.backup:
+            batch.commit = True
+    return list(batches.values())
+
+
+def wrap(command: int, data: bytes = b'') -> bytes:
+    """Native command as an ISO 7816-4 APDU"""
+    if data:
+        return bytes([CLA, command, 0x00, 0x00, len(data)]) + data + b'\x00'
+    return bytes([CLA, command, 0x00, 0x00, 0x00])
+
+
+def unwrap(response: bytes) -> Tuple[int, bytes]:
+    """(status, data) of a wrapped response"""
+    if len(response) < 2 or response[-2] != 0x91:
+        raise ValueError(f'Not a wrapped DESFire response: {response.hex().upper()}')
+    return response[-1], response[:-2]
+
+
+def _rechunk(chunks: Iterable[bytes], first: int, size: int) -> Iterator[bytes]:
+    """Re-slice a byte stream into frames of first, then size, bytes"""
+    buffer = bytearray()
+    want = first
+    for chunk in chunks:
+        view = memoryview(chunk)
+        while view:
+            take = want - len(buffer)
+            buffer += view[:take]
+            view = view[take:]
+            if len(buffer) == want:
+                yield bytes(buffer)
+                buffer.clear()
+                want = size
+    if buffer:
+        yield bytes(buffer)
+
+
+class DesfireClient:
+    """Reader-side DESFire command engine over a transceive callable"""
+
+    def __init__(self, transceive: Callable[[bytes], bytes]):
+        self.transceive = transceive
+        self.selected: Optional[int] = None
+        self.exchanges = 0
+
+    def _exchange(self, command: int, data: bytes = b'') -> Tuple[int, bytes]:
+        self.exchanges += 1
+        return unwrap(self.transceive(wrap(command, data)))
+
+    def _frames(self, command: int, data: bytes = b'') -> Iterator[bytes]:
+        """Response data frame by frame, following continuation frames"""
+        status, payload = self._exchange(command, data)
+        while status == ADDITIONAL_FRAME:
+            yield payload
+            status, payload = self._exchange(ADDITIONAL_FRAME)
+        if status != OPERATION_OK:
+            raise DesfireError(status, command)
+        yield payload
+
+    def command(self, command: int, data: bytes = b'') -> bytes:
+        """Run a command and return its complete response data"""
+        return b''.join(self._frames(command, data))
+
+    def select_application(self, aid: int) -> None:
+        if aid == self.selected:
+            return
+        self.selected = None
+        self.command(CMD_SELECT_APPLICATION, _u24(aid))
+        self.selected = aid
+
+    def get_application_ids(self) -> List[int]:
+        self.select_application(PICC_AID)
+        data = self.command(CMD_GET_APPLICATION_IDS)
+        return [int.from_bytes(data[i:i + 3], 'little') for i in range(0, len(data), 3)]
+
+    def create_application(self, app: DesfireApplication) -> None:
+        self.select_application(PICC_AID)
+        self.command(CMD_CREATE_APPLICATION, _u24(app.aid) + bytes([app.key_settings, app.key_count]))
+
+    def get_file_ids(self) -> List[int]:
+        return list(self.command(CMD_GET_FILE_IDS))
+
+    def get_file_settings(self, file_id: int) -> Dict:
+        data = self.command(CMD_GET_FILE_SETTINGS, bytes([file_id]))
+        return {'type': FILE_TYPE_NAMES.get(data[0], data[0]), 'comm': data[1],
+                'access': int.from_bytes(data[2:4], 'little'), 'size': int.from_bytes(data[4:7], 'little')}
+
+    def create_file(self, f: DesfireFile) -> None:
+        self.command(CREATE_COMMANDS[f.file_type],
+                     bytes([f.file_id, COMM_PLAIN]) + f.access_rights.to_bytes(2, 'little') + _u24(f.size))
+
+    def free_memory(self) -> int:
+        self.select_application(PICC_AID)
+        return int.from_bytes(self.command(CMD_FREE_MEMORY), 'little')
+
+    def read_stream(self, file_id: int, offset: int = 0, length: int = 0) -> Iterator[bytes]:
+        """Yield a file's data one frame at a time (length 0 reads to the end)"""
+        return self._frames(CMD_READ_DATA, bytes([file_id]) + _u24(offset) + _u24(length))
+
+    def read_data(self, file_id: int, offset: int = 0, length: int = 0) -> bytes:
+        return b''.join(self.read_stream(file_id, offset, length))
+
+    def read_into(self, file_id: int, sink, offset: int = 0, length: int = 0) -> int:
+        """Stream a file into a writable object; returns the bytes copied"""
+        copied = 0
+        for frame in self.read_stream(file_id, offset, length):
+            sink.write(frame)
+            copied += len(frame)
+        return copied
+
+    def write_stream(self, file_id: int, chunks: Iterable[bytes], length: int, offset: int = 0) -> None:
+        """Write length bytes taken from chunks, sending each frame as it fills"""
+        frames = _rechunk(chunks, MAX_FRAME - WRITE_HEADER, MAX_FRAME)
+        first = next(frames, b'')
+        sent = len(first)
+        if sent > length:
+            raise ValueError(f'Data is longer than the {length} bytes announced')
+        status, _ = self._exchange(CMD_WRITE_DATA, bytes([file_id]) + _u24(offset) + _u24(length) + first)
+        for frame in frames:
+            sent += len(frame)
+            if status != ADDITIONAL_FRAME or sent > length:
+                raise ValueError(f'Data is longer than the {length} bytes announced')
+            status, _ = self._exchange(ADDITIONAL_FRAME, frame)
+        if status == ADDITIONAL_FRAME:
+            raise ValueError(f'Data ended after {sent} of {length} bytes')
+        if status != OPERATION_OK:
+            raise DesfireError(status, CMD_WRITE_DATA)
+
+    def write_data(self, file_id: int, data: bytes, offset: int = 0) -> None:
+        self.write_stream(file_id, [data], len(data), offset)
+
+    def commit_transaction(self) -> None:
+        self.command(CMD_COMMIT_TRANSACTION)
+
+    def run_batch(self, batch: ApplicationBatch) -> List[Tuple[FileOp, bytes]]:
+        """Run one application's operations; returns (op, data) of its reads"""
+        self.select_application(batch.aid)
+        reads = []
+        for op in batch.ops:
+            if op.kind == 'read':
+                reads.append((op, self.read_data(op.file_id, op.offset, op.length)))
+            else:
+                self.write_data(op.file_id, op.data, op.offset)
+        if batch.commit:
+            self.commit_transaction()
+        return reads
+
+    def execute(self, batches: List[ApplicationBatch]) -> List[Tuple[FileOp, bytes]]:
+        """Run a plan; returns (op, data) of every read in plan order"""
+        reads = []
+        for batch in batches:
+            reads.extend(self.run_batch(batch))
+        return reads
+
+    def provision(self, program: DesfireProgram) -> None:
+        """Create the program's missing applications and files and write their data"""
+        existing = set(self.get_application_ids())
+        for app in program.applications:
+            if app.aid not in existing:
+                self.create_application(app)
+        batches = {batch.aid: batch for batch in plan(program.write_ops())}
+        for app in program.applications:
+            self.select_application(app.aid)
+            present = set(self.get_file_ids())
+            for f in app.files:
+                if f.file_id not in present:
+                    self.create_file(f)
+            if app.aid in batches:
+                self.run_batch(batches[app.aid])
+
+
+@dataclass
+class _SimulatedFile:
+    file_type: str
+    access_rights: int
+    size: int
+    data: bytearray
+    shadow: Optional[bytearray] = None  # uncommitted backup file data
+
+
+class SimulatedDesfireCard:
+    """In-memory DESFire card answering wrapped native commands
+
+    Access rights are stored but not enforced, since authentication is not
+    modelled. Responses longer than max_frame are chained like a real card.
+    """
+
+    def __init__(self, memory_size: int = 8192, max_frame: int = MAX_FRAME):
+        self.memory_size = memory_size
+        self.max_frame = max_frame
+        self.applications: Dict[int, Dict[int, _SimulatedFile]] = {}
+        self.selected = PICC_AID
+        self.frames = 0
+        self._out = b''
+        self._write: Optional[Dict] = None
+
+    @property
+    def free(self) -> int:
+        used = sum(_allocated(f.size) for files in self.applications.values() for f in files.values())
+        return self.memory_size - used
+
+    def transceive(self, apdu: bytes) -> bytes:
+        self.frames += 1
+        if len(apdu) < 5 or apdu[0] != CLA:
+            return self._respond(ILLEGAL_COMMAND)
+        command = apdu[1]
+        data = bytes(apdu[5:5 + apdu[4]]) if len(apdu) > 5 else b''
+        if command == ADDITIONAL_FRAME:
+            return self._continue(data)
+        self._out = b''
+        self._write = None
+        handler = self._HANDLERS.get(command)
+        if handler is None:
+            return self._respond(ILLEGAL_COMMAND)
+        try:
+            return handler(self, data)
+        except IndexError:
+            return self._respond(LENGTH_ERROR)
+
+    def _respond(self, status: int, data: bytes = b'') -> bytes:
+        if status == OPERATION_OK and len(data) > self.max_frame:
+            self._out = data[self.max_frame:]
+            return data[:self.max_frame] + bytes([0x91, ADDITIONAL_FRAME])
+        return data + bytes([0x91, status])
+
+    def _continue(self, data: bytes) -> bytes:
+        if self._out:
+            out, self._out = self._out, b''
+            return self._respond(OPERATION_OK, out)
+        if self._write is not None:
+            return self._receive(data)
+        return self._respond(ILLEGAL_COMMAND)
+
+    def _files(self) -> Optional[Dict[int, _SimulatedFile]]:
+        return self.applications.get(self.selected) if self.selected != PICC_AID else None
+
+    def _abort(self) -> None:
+        for f in (self._files() or {}).values():
+            f.shadow = None
+
+    def _select(self, data: bytes) -> bytes:
+        aid = int.from_bytes(data[0:3], 'little')
+        if aid != PICC_AID and aid not in self.applications:
+            return self._respond(APPLICATION_NOT_FOUND)
+        self._abort()
+        self.selected = aid
+        return self._respond(OPERATION_OK)
+
+    def _application_ids(self, data: bytes) -> bytes:
+        if self.selected != PICC_AID:
+            return self._respond(ILLEGAL_COMMAND)
+        return self._respond(OPERATION_OK, b''.join(_u24(aid) for aid in self.applications))
+
+    def _create_application(self, data: bytes) -> bytes:
+        aid = int.from_bytes(data[0:3], 'little')
+        if self.selected != PICC_AID:
+            return self._respond(PERMISSION_DENIED)
+        if aid == PICC_AID or not 1 <= data[4] & 0x0F <= 14:
+            return self._respond(PARAMETER_ERROR)
+        if aid in self.applications:
+            return self._respond(DUPLICATE_ERROR)
+        if len(self.applications) >= MAX_APPLICATIONS:
+            return self._respond(OUT_OF_EEPROM)
+        self.applications[aid] = {}
+        return self._respond(OPERATION_OK)
+
+    def _delete_application(self, data: bytes) -> bytes:
+        aid = int.from_bytes(data[0:3], 'little')
+        if self.applications.pop(aid, None) is None:
+            return self._respond(APPLICATION_NOT_FOUND)
+        if self.selected == aid:
+            self.selected = PICC_AID
+        return self._respond(OPERATION_OK)
+
+    def _file_ids(self, data: bytes) -> bytes:
+        files = self._files()
+        if files is None:
+            return self._respond(PERMISSION_DENIED)
+        return self._respond(OPERATION_OK, bytes(sorted(files)))
+
+    def _file_settings(self, data: bytes) -> bytes:
+        f = (self._files() or {}).get(data[0])
+        if f is None:
+            return self._respond(FILE_NOT_FOUND)
+        return self._respond(OPERATION_OK, bytes([FILE_TYPES[f.file_type], COMM_PLAIN])
+                             + f.access_rights.to_bytes(2, 'little') + _u24(f.size))
+
+    def _create_file(self, file_type: str, data: bytes) -> bytes:
+        files = self._files()
+        if files is None:
+            return self._respond(PERMISSION_DENIED)
+        file_id, size = data[0], int.from_bytes(data[4:7], 'little')
+        if len(data) != 7 or file_id >= MAX_FILES or not size:
+            return self._respond(PARAMETER_ERROR)
+        if file_id in files:
+            return self._respond(DUPLICATE_ERROR)
+        if _allocated(size) > self.free:
+            return self._respond(OUT_OF_EEPROM)
+        files[file_id] = _SimulatedFile(file_type, int.from_bytes(data[2:4], 'little'), size, bytearray(size))
+        return self._respond(OPERATION_OK)
+
+    def _locate(self, data: bytes) -> Tuple[int, Optional[_SimulatedFile], int, int]:
+        f = (self._files() or {}).get(data[0])
+        offset, length = int.from_bytes(data[1:4], 'little'), int.from_bytes(data[4:7], 'little')
+        if f is None:
+            return FILE_NOT_FOUND, None, 0, 0
+        if len(data) < WRITE_HEADER or offset + length > f.size or offset >= f.size:
+            return BOUNDARY_ERROR, f, 0, 0
+        return OPERATION_OK, f, offset, length
+
+    def _read(self, data: bytes) -> bytes:
+        status, f, offset, length = self._locate(data)
+        if status != OPERATION_OK:
+            return self._respond(status)
+        end = offset + length if length else f.size
+        return self._respond(OPERATION_OK, bytes(f.data[offset:end]))
+
+    def _start_write(self, data: bytes) -> bytes:
+        status, f, offset, length = self._locate(data)
+        if status != OPERATION_OK:
+            return self._respond(status)
+        self._write = {'file': f, 'offset': offset, 'length': length, 'buffer': bytearray()}
+        return self._receive(data[WRITE_HEADER:])
+
+    def _receive(self, data: bytes) -> bytes:
+        write = self._write
+        write['buffer'] += data
+        if len(write['buffer']) < write['length']:
+            return self._respond(ADDITIONAL_FRAME)
+        self._write = None
+        if len(write['buffer']) > write['length']:
+            return self._respond(LENGTH_ERROR)
+        f, offset = write['file'], write['offset']
+        if f.file_type == 'backup':
+            if f.shadow is None:
+                f.shadow = bytearray(f.data)
+            target = f.shadow
+        else:
+            target = f.data
+        target[offset:offset + write['length']] = write['buffer']
+        return self._respond(OPERATION_OK)
+
+    def _commit(self, data: bytes) -> bytes:
+        for f in (self._files() or {}).values():
+            if f.shadow is not None:
+                f.data, f.shadow = f.shadow, None
+        return self._respond(OPERATION_OK)
+
+    def _abort_transaction(self, data: bytes) -> bytes:
+        self._abort()
+        return self._respond(OPERATION_OK)
+
+    def _free_memory(self, data: bytes) -> bytes:
+        return self._respond(OPERATION_OK, _u24(self.free))
+
+    _HANDLERS = {
+        CMD_SELECT_APPLICATION: _select,
+        CMD_GET_APPLICATION_IDS: _application_ids,
+        CMD_CREATE_APPLICATION: _create_application,
+        CMD_DELETE_APPLICATION: _delete_application,
+        CMD_GET_FILE_IDS: _file_ids,
+        CMD_GET_FILE_SETTINGS: _file_settings,
+        CMD_CREATE_STD_DATA_FILE: lambda self, data: self._create_file('standard', data),
+        CMD_CREATE_BACKUP_DATA_FILE: lambda self, data: self._create_file('backup', data),
+        CMD_READ_DATA: _read,
+        CMD_WRITE_DATA: _start_write,
+        CMD_COMMIT_TRANSACTION: _commit,
+        CMD_ABORT_TRANSACTION: _abort_transaction,
+        CMD_FREE_MEMORY: _free_memory,
+    }
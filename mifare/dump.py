@@ -0,0 +1,286 @@
+"""
+MIFARE Card Dump Files
+
+Loads card images written by field readers and tools (raw .mfd/.bin/.dump
+files and .eml text dumps, loose or inside .zip/.tar archives), identifies
+the card they were taken from and converts Classic images to the
+sector_data program format.
+
+Raw images are memory-mapped and exposed as memoryviews, so decoding a
+dump does not copy it. Each archive is opened once and its members read in
+a single pass: uncompressed members are sliced straight out of the mapped
+archive, and compressed tars are streamed.
+"""
+
+import os
+import mmap
+import struct
+import tarfile
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Iterable, List, Optional, Tuple, Union
+
+from .card_types import MifareCardType, CardInfo, CardTypeDetector
+from .iso14443 import parse_classic_block0, validate_classic_block0
+from .utils import MifareUtils
+
+RAW_EXTENSIONS = ('.mfd', '.bin', '.dump')
+TEXT_EXTENSIONS = ('.eml',)
+DUMP_EXTENSIONS = RAW_EXTENSIONS + TEXT_EXTENSIONS
+ZIP_EXTENSIONS = ('.zip',)
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+ARCHIVE_EXTENSIONS = ZIP_EXTENSIONS + TAR_EXTENSIONS
+
+BLOCK_SIZE = 16
+ZIP_LOCAL_HEADER = struct.Struct('<4s22xHH')
+
+# Image size in bytes -> card type
+DUMP_SIZE_TYPES: Dict[int, MifareCardType] = {
+    1024: MifareCardType.CLASSIC_1K,
+    4096: MifareCardType.CLASSIC_4K,
+    64: MifareCardType.ULTRALIGHT,
+    192: MifareCardType.ULTRALIGHT_C,
+}
+
+
+def classic_layout(sector_count: int) -> List[Tuple[int, int]]:
+    """(first block, block count) per sector of a MIFARE Classic card
+
+    Sectors 0-31 have 4 blocks; the 8 large sectors of a 4K card have 16.
+    """
+    layout = []
+    for sector in range(sector_count):
+        if sector < 32:
+            layout.append((sector * 4, 4))
+        else:
+            layout.append((128 + (sector - 32) * 16, 16))
+    return layout
+
+
+def access_bits_valid(trailer: bytes) -> bool:
+    """Check the inverted copies of C1/C2/C3 in a sector trailer"""
+    b6, b7, b8 = trailer[6], trailer[7], trailer[8]
+    return ((b7 >> 4) == (~b6 & 0x0F)
+            and (b8 & 0x0F) == ((~b6 >> 4) & 0x0F)
+            and (b8 >> 4) == (~b7 & 0x0F))
+
+
+@dataclass
+class CardDump:
+    """A card image loaded from a dump file
+
+    data is bytes or a memoryview over a mapped file. Views of loose files
+    are only valid inside the open_dump() block that produced them; views
+    of archive members keep the archive mapped until they are released.
+    """
+    source: str
+    data: Union[bytes, memoryview]
+
+    @property
+    def card_type(self) -> MifareCardType:
+        return DUMP_SIZE_TYPES.get(len(self.data), MifareCardType.UNKNOWN)
+
+    @property
+    def is_classic(self) -> bool:
+        return self.card_type in (MifareCardType.CLASSIC_1K, MifareCardType.CLASSIC_4K)
+
+    @property
+    def uid(self) -> Optional[str]:
+        """UID from the manufacturer block, or None if the image is too short"""
+        data = self.data
+        if self.is_classic and len(data) >= 16:
+            return parse_classic_block0(data[:16])['uid'].hex().upper()
+        if len(data) >= 8:
+            # Ultralight: UID0-2, BCC0, UID3-6
+            return (bytes(data[0:3]) + bytes(data[4:8])).hex().upper()
+        return None
+
+    @property
+    def sak(self) -> Optional[int]:
+        if self.is_classic:
+            return parse_classic_block0(self.data[:16])['sak']
+        return None
+
+    def blocks(self, block_size: int = 16) -> Iterator[bytes]:
+        """Iterate over the image block by block"""
+        for offset in range(0, len(self.data), block_size):
+            yield self.data[offset:offset + block_size]
+
+    def card_info(self) -> CardInfo:
+        """CardInfo for the dumped card, with specs taken from its type"""
+        card_type = self.card_type
+        specs = CardTypeDetector.get_card_specs(card_type)
+        return CardInfo(
+            card_type=card_type,
+            uid=self.uid,
+            reader=self.source,
+            memory_size=len(self.data),
+            sector_count=specs.get('sector_count'),
+            block_count=specs.get('block_count')
+        )
+
+    def validate(self) -> List[str]:
+        """Return a list of problems that make the image unsafe to import"""
+        card_type = self.card_type
+        if card_type == MifareCardType.UNKNOWN:
+            return [f'unrecognised image size {len(self.data)} bytes']
+        if not self.is_classic:
+            return [f'{card_type.value} images are not supported by sector_data programs']
+
+        data = self.data
+        errors = [f'block 0: {error}' for error in validate_classic_block0(data[:BLOCK_SIZE], len(data))]
+        sector_count = CardTypeDetector.get_card_specs(card_type)['sector_count']
+        for sector, (first, count) in enumerate(classic_layout(sector_count)):
+            offset = (first + count - 1) * BLOCK_SIZE
+            if not access_bits_valid(data[offset:offset + BLOCK_SIZE]):
+                errors.append(f'sector {sector}: access bits fail their inverted-copy check')
+        return errors
+
+    def to_sector_data(self) -> Dict[str, Dict[str, Any]]:
+        """Convert a Classic image to the sector_data program format"""
+        if not self.is_classic:
+            raise ValueError(f'cannot convert {self.card_type.value} image to sector data')
+
+        data = self.data
+        sector_count = CardTypeDetector.get_card_specs(self.card_type)['sector_count']
+        sector_data = {}
+        for sector, (first, count) in enumerate(classic_layout(sector_count)):
+            start = first * BLOCK_SIZE
+            blocks = [data[o:o + BLOCK_SIZE].hex().upper()
+                      for o in range(start, start + count * BLOCK_SIZE, BLOCK_SIZE)]
+            trailer = blocks[-1]
+            sector_data[str(sector)] = {
+                'blocks': blocks,
+                'keys': {'keyA': trailer[0:12], 'keyB': trailer[20:32]},
+                'accessBits': trailer[14:20],
+            }
+        return sector_data
+
+
+def parse_eml(text: str) -> bytes:
+    """Decode an .eml dump: one block of hex per line"""
+    return b''.join(MifareUtils.hex_to_bytes(line.strip())
+                    for line in text.splitlines() if line.strip())
+
+
+def load_dump(path: str) -> CardDump:
+    """Load a dump file, decoding .eml text dumps to raw bytes"""
+    if path.lower().endswith(TEXT_EXTENSIONS):
+        with open(path, 'r') as f:
+            data = parse_eml(f.read())
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()
+    return CardDump(source=path, data=data)
+
+
+@contextmanager
+def _mapped(path: str) -> Iterator[memoryview]:
+    """Memory-map a file read-only and yield a view over it"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield memoryview(b'')
+            return
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapping)
+    try:
+        yield view
+    finally:
+        view.release()
+        try:
+            mapping.close()
+        except BufferError:
+            pass  # a caller still holds a slice; the mapping closes when it is collected
+
+
+@contextmanager
+def open_dump(source: Union[str, CardDump]) -> Iterator[CardDump]:
+    """Open a dump file without copying it (a CardDump read from an archive passes through)
+
+    The CardDump's data is a memoryview over the mapped file for raw
+    images; it must not be used after the with block ends.
+    """
+    if isinstance(source, CardDump):
+        yield source
+        return
+
+    if source.lower().endswith(TEXT_EXTENSIONS):
+        yield load_dump(source)
+        return
+
+    with _mapped(source) as view:
+        yield CardDump(source=source, data=view)
+
+
+def _member_dump(path: str, name: str, data: Union[bytes, memoryview]) -> CardDump:
+    if name.lower().endswith(TEXT_EXTENSIONS):
+        data = parse_eml(bytes(data).decode('ascii'))
+    return CardDump(source=f'{path}:{name}', data=data)
+
+
+def archive_dumps(path: str) -> Iterator[CardDump]:
+    """The dumps inside a .zip or .tar archive, read in one pass over it
+
+    The archive is opened and mapped once. Members stored uncompressed are
+    memoryviews over the mapping; compressed tars are streamed, so their
+    members are read in archive order without seeking.
+    """
+    lower = path.lower()
+    if lower.endswith(ZIP_EXTENSIONS):
+        with _mapped(path) as view, zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(DUMP_EXTENSIONS):
+                    continue
+                if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+                    data = archive.read(info)
+                else:
+                    offset = info.header_offset
+                    _, name_length, extra_length = ZIP_LOCAL_HEADER.unpack_from(view, offset)
+                    start = offset + ZIP_LOCAL_HEADER.size + name_length + extra_length
+                    data = view[start:start + info.file_size]
+                yield _member_dump(path, info.filename, data)
+        return
+
+    if lower.endswith('.tar'):
+        with _mapped(path) as view, tarfile.open(path) as archive:
+            for info in archive:
+                if info.isfile() and info.name.lower().endswith(DUMP_EXTENSIONS):
+                    yield _member_dump(path, info.name, view[info.offset_data:info.offset_data + info.size])
+        return
+
+    with tarfile.open(path, mode='r|*') as archive:
+        for info in archive:
+            if info.isfile() and info.name.lower().endswith(DUMP_EXTENSIONS):
+                yield _member_dump(path, info.name, archive.extractfile(info).read())
+
+
+def find_dumps(paths: Iterable[str]) -> Iterator[str]:
+    """Expand files and directories into dump file paths"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(DUMP_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def find_dump_sources(paths: Iterable[str]) -> Iterator[Union[str, CardDump]]:
+    """Expand files, directories and archives into dump sources for open_dump
+
+    Loose dump files are yielded as paths and opened later; the dumps inside
+    an archive are read as the iteration reaches it (see archive_dumps).
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    lower = name.lower()
+                    if lower.endswith(DUMP_EXTENSIONS) or lower.endswith(ARCHIVE_EXTENSIONS):
+                        yield from find_dump_sources([os.path.join(root, name)])
+        elif path.lower().endswith(ARCHIVE_EXTENSIONS):
+            yield from archive_dumps(path)
+        else:
+            yield path
@@ -0,0 +1,186 @@
+"""
+ISO/IEC 14443-3 Type A checks
+
+Table-driven CRC_A, UID check bytes (BCC) and validation of the
+manufacturer data that MIFARE cards keep in block 0 (Classic) or pages 0-2
+(Ultralight), for screening card images before they are stored or
+distributed.
+
+Classic block 0 layouts:
+    4-byte UID  UID0-3, BCC, SAK, ATQA (2 bytes, LSB first), manufacturer data
+    7-byte UID  UID0-6, SAK, ATQA (2 bytes, LSB first), manufacturer data
+"""
+
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+CRC_A_INIT = 0x6363
+CRC_A_POLY = 0x8408  # x^16 + x^12 + x^5 + 1, bit-reversed
+CASCADE_TAG = 0x88
+
+# ATQA bits 7-6: UID size
+ATQA_UID_SIZES = {0: 4, 1: 7, 2: 10}
+
+# SAK bits 4-3 distinguish Classic 1K (0x08, 0x88, 0x28) from 4K (0x18, 0x98, 0x38)
+SAK_SIZE_MASK = 0x18
+SAK_SIZE_BITS = {1024: 0x08, 4096: 0x18}
+SAK_CASCADE_BIT = 0x04
+
+
+def _crc_a_table() -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ CRC_A_POLY if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC_A_TABLE = _crc_a_table()
+
+
+def crc_a(data: Buffer) -> int:
+    """CRC_A of data as a 16-bit value (transmitted low byte first)"""
+    crc = CRC_A_INIT
+    table = CRC_A_TABLE
+    for byte in bytes(data):
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def crc_a_bytes(data: Buffer) -> bytes:
+    """The two CRC_A bytes in transmission order"""
+    return crc_a(data).to_bytes(2, 'little')
+
+
+def check_crc_a(frame: Buffer) -> bool:
+    """True if the last two bytes of frame are the CRC_A of the rest"""
+    return len(frame) > 2 and crc_a(frame[:-2]) == int.from_bytes(bytes(frame[-2:]), 'little')
+
+
+def check_crc_a_many(frames: Iterable[Buffer]) -> List[bool]:
+    """check_crc_a for many frames"""
+    return [check_crc_a(frame) for frame in frames]
+
+
+def bcc(uid_part: Buffer) -> int:
+    """Block check character: XOR of the bytes of one UID cascade level"""
+    result = 0
+    for byte in bytes(uid_part):
+        result ^= byte
+    return result
+
+
+def _uid_plausible(uid: bytes) -> Optional[str]:
+    if uid[0] == CASCADE_TAG:
+        return 'UID starts with the cascade tag 0x88'
+    if not any(uid) or all(byte == 0xFF for byte in uid):
+        return 'UID is blank'
+    return None
+
+
+def parse_classic_block0(block: Buffer) -> Dict:
+    """UID, SAK and ATQA from a Classic manufacturer block
+
+    A valid BCC after the first four bytes means a 4-byte UID; otherwise
+    the 7-byte layout is assumed.
+    """
+    block = bytes(block[:16])
+    if block[0] ^ block[1] ^ block[2] ^ block[3] == block[4]:
+        return {'uid': block[0:4], 'bcc': block[4], 'sak': block[5],
+                'atqa': int.from_bytes(block[6:8], 'little')}
+    return {'uid': block[0:7], 'bcc': None, 'sak': block[7],
+            'atqa': int.from_bytes(block[8:10], 'little')}
+
+
+def _check_classic(uid: bytes, sak: int, atqa: int, image_size: Optional[int]) -> List[str]:
+    errors = []
+    problem = _uid_plausible(uid)
+    if problem:
+        errors.append(problem)
+    uid_size = ATQA_UID_SIZES.get((atqa >> 6) & 0x03)
+    if uid_size != len(uid):
+        errors.append(f'ATQA {atqa:04X} announces a {uid_size or "reserved"}-byte UID, block 0 holds {len(uid)}')
+    if bin(atqa & 0x1F).count('1') != 1:
+        errors.append(f'ATQA {atqa:04X} must set exactly one bit-frame anticollision bit')
+    if sak & SAK_CASCADE_BIT:
+        errors.append(f'SAK {sak:02X} has the cascade bit set')
+    expected = SAK_SIZE_BITS.get(image_size)
+    if expected is not None and sak & SAK_SIZE_MASK != expected:
+        errors.append(f'SAK {sak:02X} does not match a {image_size // 1024}K card')
+    return errors
+
+
+def validate_classic_block0(block: Buffer, image_size: Optional[int] = None) -> List[str]:
+    """Problems with a Classic manufacturer block
+
+    image_size (1024 or 4096) additionally checks that the SAK matches
+    the size of the image the block came from.
+    """
+    if len(block) < 16:
+        return ['block 0 is shorter than 16 bytes']
+    fields = parse_classic_block0(block)
+    errors = _check_classic(fields['uid'], fields['sak'], fields['atqa'], image_size)
+    if fields['bcc'] is None and errors:
+        # Neither layout fits: the 4-byte BCC is the most likely corruption
+        return ['block 0 BCC does not match UID0-3 and the 7-byte UID layout does not fit either']
+    return errors
+
+
+def validate_ultralight_header(pages: Buffer) -> List[str]:
+    """Problems with Ultralight/NTAG pages 0-2 (UID0-2, BCC0, UID3-6, BCC1)"""
+    if len(pages) < 12:
+        return ['pages 0-2 are shorter than 12 bytes']
+    data = bytes(pages[:9])
+    errors = []
+    if CASCADE_TAG ^ data[0] ^ data[1] ^ data[2] != data[3]:
+        errors.append('BCC0 does not match the cascade tag and UID0-2')
+    if data[4] ^ data[5] ^ data[6] ^ data[7] != data[8]:
+        errors.append('BCC1 does not match UID3-6')
+    return errors
+
+
+# Leading fields of a Classic image: UID0-3, BCC, SAK(4B), ATQA(4B) / UID4-6, SAK(7B), ATQA(7B)
+_CLASSIC_HEAD = struct.Struct('<4sBBH3sBH')
+
+
+def validate_classic_images(data: Buffer, image_size: int) -> List[Tuple[int, List[str]]]:
+    """Screen a contiguous array of Classic images; returns (index, errors) of bad ones
+
+    The block 0 fields of every image are unpacked in a single pass over
+    the buffer, and only images failing the fast BCC/SAK/ATQA checks are
+    examined in detail.
+    """
+    if len(data) % image_size:
+        raise ValueError(f'buffer length {len(data)} is not a multiple of {image_size}')
+    view = memoryview(data)
+    layout = struct.Struct(_CLASSIC_HEAD.format + f'{image_size - _CLASSIC_HEAD.size}x')
+    expected = SAK_SIZE_BITS.get(image_size)
+    bad = []
+    for index, (uid4, check, sak4, atqa4, _, _, _) in enumerate(layout.iter_unpack(view)):
+        if (uid4[0] ^ uid4[1] ^ uid4[2] ^ uid4[3] == check
+                and uid4[0] != CASCADE_TAG
+                and not sak4 & SAK_CASCADE_BIT
+                and (expected is None or sak4 & SAK_SIZE_MASK == expected)
+                and atqa4 & 0xC0 == 0
+                and atqa4 & 0x1F in (1, 2, 4, 8, 16)
+                and uid4 not in (b'\x00\x00\x00\x00', b'\xff\xff\xff\xff')):
+            continue  # the common case: a well-formed 4-byte UID block
+        start = index * image_size
+        errors = validate_classic_block0(view[start:start + 16], image_size)
+        if errors:
+            bad.append((index, errors))
+    return bad
+
+
+def validate_block0_many(images: Iterable[Buffer]) -> List[Tuple[int, List[str]]]:
+    """Screen separate Classic images of any size; returns (index, errors) of bad ones"""
+    bad = []
+    for index, image in enumerate(images):
+        errors = validate_classic_block0(image[:16], len(image))
+        if errors:
+            bad.append((index, errors))
+    return bad
@@ -0,0 +1,209 @@
+"""
+NDEF Messages
+
+Compact encoder and parser for NFC Forum NDEF messages and the NDEF
+message TLV that Type 2 tags (Ultralight, NTAG) store in their user pages.
+Records use the short-record form whenever the payload fits in 255 bytes.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List
+
+# Type name formats
+TNF_EMPTY = 0x00
+TNF_WELL_KNOWN = 0x01
+TNF_MIME = 0x02
+TNF_ABSOLUTE_URI = 0x03
+TNF_EXTERNAL = 0x04
+
+# Record header flags
+MB = 0x80
+ME = 0x40
+CF = 0x20
+SR = 0x10
+IL = 0x08
+
+# TLV blocks
+TLV_NULL = 0x00
+TLV_NDEF = 0x03
+TLV_TERMINATOR = 0xFE
+
+# URI identifier codes (NFC Forum URI RTD), longest prefixes first where they overlap
+URI_PREFIXES = [
+    (0x01, 'http://www.'), (0x02, 'https://www.'), (0x03, 'http://'), (0x04, 'https://'),
+    (0x05, 'tel:'), (0x06, 'mailto:'), (0x07, 'ftp://anonymous:anonymous@'), (0x08, 'ftp://ftp.'),
+    (0x09, 'ftps://'), (0x0A, 'sftp://'), (0x0B, 'smb://'), (0x0C, 'nfs://'), (0x0D, 'ftp://'),
+    (0x0E, 'dav://'), (0x0F, 'news:'), (0x10, 'telnet://'), (0x11, 'imap:'), (0x12, 'rtsp://'),
+    (0x13, 'urn:'), (0x14, 'pop:'), (0x15, 'sip:'), (0x16, 'sips:'), (0x17, 'tftp:'),
+    (0x18, 'btspp://'), (0x19, 'btl2cap://'), (0x1A, 'btgoep://'), (0x1B, 'tcpobex://'),
+    (0x1C, 'irdaobex://'), (0x1D, 'file://'), (0x1E, 'urn:epc:id:'), (0x1F, 'urn:epc:tag:'),
+    (0x20, 'urn:epc:pat:'), (0x21, 'urn:epc:raw:'), (0x22, 'urn:epc:'), (0x23, 'urn:nfc:'),
+]
+_PREFIX_SEARCH = sorted(URI_PREFIXES, key=lambda item: -len(item[1]))
+_PREFIX_BY_CODE = dict(URI_PREFIXES)
+
+
+@dataclass
+class Record:
+    """One NDEF record"""
+    tnf: int
+    type: bytes = b''
+    payload: bytes = b''
+    id: bytes = b''
+
+
+def text_record(text: str, lang: str = 'en') -> Record:
+    """Well-known Text record, UTF-8 encoded"""
+    language = lang.encode('ascii')
+    return Record(TNF_WELL_KNOWN, b'T', bytes([len(language)]) + language + text.encode('utf-8'))
+
+
+def uri_record(uri: str) -> Record:
+    """Well-known URI record with the longest matching prefix abbreviated"""
+    for code, prefix in _PREFIX_SEARCH:
+        if uri.startswith(prefix):
+            return Record(TNF_WELL_KNOWN, b'U', bytes([code]) + uri[len(prefix):].encode('utf-8'))
+    return Record(TNF_WELL_KNOWN, b'U', b'\x00' + uri.encode('utf-8'))
+
+
+def mime_record(media_type: str, data: bytes) -> Record:
+    """MIME media record"""
+    return Record(TNF_MIME, media_type.encode('ascii'), bytes(data))
+
+
+def external_record(domain_type: str, data: bytes) -> Record:
+    """NFC Forum external type record (domain:type)"""
+    return Record(TNF_EXTERNAL, domain_type.encode('ascii'), bytes(data))
+
+
+def records_from_json(items: Iterable[Dict[str, Any]]) -> List[Record]:
+    """Build records from the JSON form stored with programs
+
+    Each item has a 'type' of text, uri, mime or external and a 'value';
+    text records may give 'lang' and mime/external records 'mediaType'.
+    """
+    records = []
+    for item in items:
+        kind = item.get('type')
+        value = item.get('value', '')
+        if kind == 'text':
+            records.append(text_record(value, item.get('lang', 'en')))
+        elif kind == 'uri':
+            records.append(uri_record(value))
+        elif kind == 'mime':
+            records.append(mime_record(item['mediaType'], value.encode('utf-8')))
+        elif kind == 'external':
+            records.append(external_record(item['mediaType'], value.encode('utf-8')))
+        else:
+            raise ValueError(f'Unknown NDEF record type: {kind}')
+    return records
+
+
+def encode_message(records: List[Record]) -> bytes:
+    """Serialise records into one NDEF message"""
+    if not records:
+        return bytes([MB | ME | TNF_EMPTY, 0, 0])
+    out = bytearray()
+    last = len(records) - 1
+    for index, record in enumerate(records):
+        header = record.tnf & 0x07
+        if index == 0:
+            header |= MB
+        if index == last:
+            header |= ME
+        short = len(record.payload) < 256
+        if short:
+            header |= SR
+        if record.id:
+            header |= IL
+        out.append(header)
+        out.append(len(record.type))
+        if short:
+            out.append(len(record.payload))
+        else:
+            out += len(record.payload).to_bytes(4, 'big')
+        if record.id:
+            out.append(len(record.id))
+        out += record.type
+        out += record.id
+        out += record.payload
+    return bytes(out)
+
+
+def parse_message(data: bytes) -> List[Record]:
+    """Parse an NDEF message (chunked records are not supported)"""
+    records = []
+    offset = 0
+    while offset < len(data):
+        header = data[offset]
+        if header & CF:
+            raise ValueError('Chunked NDEF records are not supported')
+        type_length = data[offset + 1]
+        offset += 2
+        if header & SR:
+            payload_length = data[offset]
+            offset += 1
+        else:
+            payload_length = int.from_bytes(data[offset:offset + 4], 'big')
+            offset += 4
+        id_length = 0
+        if header & IL:
+            id_length = data[offset]
+            offset += 1
+        record_type = bytes(data[offset:offset + type_length])
+        offset += type_length
+        record_id = bytes(data[offset:offset + id_length])
+        offset += id_length
+        payload = bytes(data[offset:offset + payload_length])
+        offset += payload_length
+        if len(payload) != payload_length:
+            raise ValueError('NDEF record is truncated')
+        records.append(Record(header & 0x07, record_type, payload, record_id))
+        if header & ME:
+            break
+    return records
+
+
+def record_text(record: Record) -> str:
+    """Readable value of a Text or URI record"""
+    if record.tnf == TNF_WELL_KNOWN and record.type == b'T':
+        lang_length = record.payload[0] & 0x3F
+        return record.payload[1 + lang_length:].decode('utf-8')
+    if record.tnf == TNF_WELL_KNOWN and record.type == b'U':
+        return _PREFIX_BY_CODE.get(record.payload[0], '') + record.payload[1:].decode('utf-8')
+    return record.payload.decode('utf-8', errors='replace')
+
+
+def tlv_size(message_length: int) -> int:
+    """Bytes used by an NDEF TLV holding a message of the given length, with terminator"""
+    return (2 if message_length < 0xFF else 4) + message_length + 1
+
+
+def wrap_tlv(message: bytes) -> bytes:
+    """NDEF message TLV followed by a terminator TLV"""
+    if len(message) < 0xFF:
+        header = bytes([TLV_NDEF, len(message)])
+    else:
+        header = bytes([TLV_NDEF, 0xFF]) + len(message).to_bytes(2, 'big')
+    return header + message + bytes([TLV_TERMINATOR])
+
+
+def find_message(area: bytes) -> bytes:
+    """NDEF message from the first NDEF TLV in a tag's data area"""
+    offset = 0
+    while offset < len(area):
+        tag = area[offset]
+        if tag == TLV_NULL:
+            offset += 1
+            continue
+        if tag == TLV_TERMINATOR:
+            break
+        length = area[offset + 1]
+        offset += 2
+        if length == 0xFF:
+            length = int.from_bytes(area[offset:offset + 2], 'big')
+            offset += 2
+        if tag == TLV_NDEF:
+            return bytes(area[offset:offset + length])
+        offset += length
+    raise ValueError('No NDEF message TLV found')
@@ -0,0 +1,193 @@
+"""
+Card Personalisation Templates
+
+A template is a program's sector_data plus typed fields bound to byte
+ranges of its data blocks:
+
+    [{"name": "employee", "type": "uint", "sector": 1, "block": 0, "offset": 0, "length": 4},
+     {"name": "site", "type": "bcd", "sector": 1, "block": 0, "offset": 4, "length": 2},
+     {"name": "expires", "type": "date", "sector": 1, "block": 1, "offset": 0, "length": 3}]
+
+Field types:
+    uint   unsigned integer, big-endian unless "endian" is "little"
+    bcd    decimal digits, two per byte, zero-padded on the left
+    ascii  text, NUL-padded on the right
+    date   YYYY-MM-DD as BCD YYMMDD (3 bytes) or YYYYMMDD (4 bytes)
+    hex    raw bytes of exactly the field length
+
+Compiling a template serialises everything no field touches to JSON once
+and keeps the patched blocks as bytes. Rendering a card copies only those
+blocks, patches the field ranges and joins the precomputed pieces, so the
+cost per card depends on the fields rather than on the size of the card.
+"""
+
+import json
+from dataclasses import asdict, dataclass
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+BLOCK_SIZE = 16
+FIELD_TYPES = ('uint', 'bcd', 'ascii', 'date', 'hex')
+_BLOCKS_PLACEHOLDER = '\x00blocks\x00'
+
+
+@dataclass(frozen=True)
+class TemplateField:
+    """A typed placeholder at a byte range of one block"""
+    name: str
+    type: str
+    sector: int
+    block: int
+    offset: int
+    length: int
+    endian: str = 'big'
+
+    @classmethod
+    def from_json(cls, item: Dict) -> 'TemplateField':
+        try:
+            field = cls(str(item['name']), item['type'], int(item['sector']), int(item['block']),
+                        int(item.get('offset', 0)), int(item['length']), item.get('endian', 'big'))
+        except KeyError as e:
+            raise ValueError(f'Template field is missing {e}') from None
+        if field.type not in FIELD_TYPES:
+            raise ValueError(f'Field {field.name}: unknown type {field.type}')
+        if field.endian not in ('big', 'little'):
+            raise ValueError(f'Field {field.name}: endian must be big or little')
+        if field.length < 1 or field.offset < 0 or field.offset + field.length > BLOCK_SIZE:
+            raise ValueError(f'Field {field.name}: bytes {field.offset}-{field.offset + field.length - 1} '
+                             f'are outside the block')
+        if field.type == 'date' and field.length not in (3, 4):
+            raise ValueError(f'Field {field.name}: dates are 3 (YYMMDD) or 4 (YYYYMMDD) bytes')
+        return field
+
+    def to_json(self) -> Dict:
+        return asdict(self)
+
+
+def _bcd(digits: str, length: int) -> bytes:
+    if not digits.isdigit() or len(digits) > 2 * length:
+        raise ValueError(f'needs up to {2 * length} decimal digits')
+    return bytes.fromhex(digits.zfill(2 * length))
+
+
+def encoder(field: TemplateField) -> Callable[[object], bytes]:
+    """Function turning a value into exactly field.length bytes"""
+    length = field.length
+    if field.type == 'uint':
+        return lambda value: int(value).to_bytes(length, field.endian)
+    if field.type == 'bcd':
+        return lambda value: _bcd(str(value), length)
+    if field.type == 'ascii':
+        def encode_ascii(value):
+            data = str(value).encode('ascii')
+            if len(data) > length:
+                raise ValueError(f'is longer than {length} characters')
+            return data + bytes(length - len(data))
+        return encode_ascii
+    if field.type == 'date':
+        def encode_date(value):
+            day = value if isinstance(value, date) else date.fromisoformat(str(value))
+            digits = day.strftime('%Y%m%d')
+            return _bcd(digits[8 - 2 * length:], length)
+        return encode_date
+
+    def encode_hex(value):
+        data = bytes.fromhex(str(value))
+        if len(data) != length:
+            raise ValueError(f'must be {length} bytes')
+        return data
+    return encode_hex
+
+
+def _trailer_index(sector: int) -> int:
+    return 15 if sector >= 32 else 3
+
+
+class Template:
+    """A program image compiled for fast per-card rendering"""
+
+    def __init__(self, sector_data: Dict, fields: List[TemplateField]):
+        self.fields = list(fields)
+        names = set()
+        by_block: Dict[Tuple[str, int], List[TemplateField]] = {}
+        for field in self.fields:
+            if field.name in names:
+                raise ValueError(f'Field {field.name} is defined twice')
+            names.add(field.name)
+            sector = sector_data.get(str(field.sector))
+            blocks = (sector or {}).get('blocks') or []
+            if field.block >= len(blocks) or not blocks[field.block]:
+                raise ValueError(f'Field {field.name}: sector {field.sector} block {field.block} '
+                                 f'is not part of the program')
+            if field.block == _trailer_index(field.sector) or (field.sector, field.block) == (0, 0):
+                raise ValueError(f'Field {field.name}: sector {field.sector} block {field.block} '
+                                 f'is not a data block')
+            by_block.setdefault((str(field.sector), field.block), []).append(field)
+
+        for (sector, block), block_fields in by_block.items():
+            spans = sorted((f.offset, f.offset + f.length, f.name) for f in block_fields)
+            for (_, end, name), (start, _, other) in zip(spans, spans[1:]):
+                if start < end:
+                    raise ValueError(f'Fields {name} and {other} overlap in sector {sector} block {block}')
+
+        # JSON pieces in sector_data order; patched blocks get a slot in the list
+        self._parts: List[str] = []
+        self._slots: List[Tuple[int, bytes, List[Tuple[int, int, str, Callable]]]] = []
+        plain: List[str] = ['{']
+        for index, (sector, data) in enumerate(sector_data.items()):
+            separator = ', ' if index else ''
+            touched = sorted(block for s, block in by_block if s == sector)
+            if not touched:
+                plain.append(separator + json.dumps(sector) + ': ' + json.dumps(data))
+                continue
+            head, tail = json.dumps(dict(data, blocks=_BLOCKS_PLACEHOLDER)).split(
+                json.dumps(_BLOCKS_PLACEHOLDER))
+            plain.append(separator + json.dumps(sector) + ': ' + head + '[')
+            for number, block in enumerate(data['blocks']):
+                if number:
+                    plain.append(', ')
+                if number not in touched:
+                    plain.append(json.dumps(block))
+                    continue
+                self._flush(plain)
+                patches = [(f.offset, f.offset + f.length, f.name, encoder(f))
+                           for f in by_block[(sector, number)]]
+                self._slots.append((len(self._parts), bytes.fromhex(block.replace(' ', '')), patches))
+                self._parts.append('')
+            plain.append(']' + tail)
+        plain.append('}')
+        self._flush(plain)
+
+    def _flush(self, plain: List[str]) -> None:
+        if plain:
+            self._parts.append(''.join(plain))
+            plain.clear()
+
+    def render_json(self, values: Dict) -> str:
+        """sector_data JSON with the field values patched in"""
+        parts = self._parts.copy()
+        for position, base, patches in self._slots:
+            block = bytearray(base)
+            for start, end, name, encode in patches:
+                if name not in values:
+                    raise ValueError(f'No value for field {name}')
+                try:
+                    block[start:end] = encode(values[name])
+                except (TypeError, ValueError, OverflowError) as e:
+                    raise ValueError(f'Field {name}: {e}') from None
+            parts[position] = '"' + block.hex().upper() + '"'
+        return ''.join(parts)
+
+    def render(self, values: Dict) -> Dict:
+        return json.loads(self.render_json(values))
+
+    def render_many(self, rows: Iterable[Dict]) -> Iterator[str]:
+        """render_json for many value sets"""
+        render = self.render_json
+        for values in rows:
+            yield render(values)
+
+
+def parse_fields(items: Iterable[Dict]) -> List[TemplateField]:
+    """Template fields from their JSON form"""
+    return [TemplateField.from_json(item) for item in items]
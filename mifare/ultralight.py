@@ -0,0 +1,255 @@
+"""
+MIFARE Ultralight / NTAG Page Images
+
+Type 2 tags store data in 4-byte pages:
+    page 0-1   UID and check bytes
+    page 2     BCC1, internal byte, static lock bytes
+    page 3     capability container (one-time programmable)
+    page 4-    user data (the NDEF TLV area)
+followed, depending on the variant, by dynamic lock bytes and
+configuration pages.
+
+PageImage keeps a whole tag in one bytearray. It lays NDEF messages out
+over the user pages, enforces lock bits and OTP semantics, and produces
+write plans that only touch pages that change.
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .card_types import MifareCardType
+from .iso14443 import CASCADE_TAG, validate_ultralight_header
+from . import ndef
+
+PAGE_SIZE = 4
+USER_START = 4
+CC_PAGE = 3
+LOCK_PAGE = 2
+NDEF_MAGIC = 0xE1
+NDEF_VERSION = 0x10
+
+
+class CapacityError(ValueError):
+    """The data does not fit in the tag's user memory"""
+
+
+class LockedPageError(ValueError):
+    """A write would change a locked page or clear OTP bits"""
+
+
+@dataclass(frozen=True)
+class TagSpec:
+    """Memory layout of one Type 2 tag variant"""
+    name: str
+    total_pages: int
+    user_pages: int
+    cc_size: int  # NDEF data area size / 8, as NXP programs it into the CC
+    dynamic_lock_page: Optional[int] = None
+    dynamic_lock_granularity: int = 0  # pages locked by one dynamic lock bit
+    card_type: MifareCardType = MifareCardType.UNKNOWN
+
+    @property
+    def user_end(self) -> int:
+        """First page after the user data area"""
+        return USER_START + self.user_pages
+
+    @property
+    def user_bytes(self) -> int:
+        return self.user_pages * PAGE_SIZE
+
+    @property
+    def ndef_bytes(self) -> int:
+        """Size of the NDEF data area announced by the capability container"""
+        return self.cc_size * 8
+
+    @property
+    def size(self) -> int:
+        return self.total_pages * PAGE_SIZE
+
+    @property
+    def cc(self) -> bytes:
+        """Capability container for an NDEF-formatted tag"""
+        return bytes([NDEF_MAGIC, NDEF_VERSION, self.cc_size, 0x00])
+
+
+TAG_SPECS: Dict[str, TagSpec] = {
+    'ULTRALIGHT': TagSpec('ULTRALIGHT', 16, 12, 0x06, card_type=MifareCardType.ULTRALIGHT),
+    'ULTRALIGHT_C': TagSpec('ULTRALIGHT_C', 48, 36, 0x12, 40, 4, MifareCardType.ULTRALIGHT_C),
+    'NTAG213': TagSpec('NTAG213', 45, 36, 0x12, 40, 2),
+    'NTAG215': TagSpec('NTAG215', 135, 126, 0x3E, 130, 16),
+    'NTAG216': TagSpec('NTAG216', 231, 222, 0x6D, 226, 16),
+}
+
+# Image size in bytes -> spec, for identifying dumps
+SPECS_BY_SIZE: Dict[int, TagSpec] = {spec.size: spec for spec in TAG_SPECS.values()}
+
+
+def get_spec(name: str) -> TagSpec:
+    """Tag spec by name (case-insensitive, e.g. 'ntag213')"""
+    try:
+        return TAG_SPECS[name.upper().replace(' ', '_').replace('-', '_')]
+    except KeyError:
+        raise ValueError(f'Unknown tag type: {name}') from None
+
+
+class PageImage:
+    """Array-backed image of a Type 2 tag's memory"""
+
+    def __init__(self, spec: TagSpec, data: Optional[bytes] = None):
+        self.spec = spec
+        if data is None:
+            self.data = bytearray(spec.size)
+        else:
+            if len(data) < USER_START * PAGE_SIZE:
+                raise ValueError('Image is shorter than the header pages')
+            self.data = bytearray(data[:spec.size])
+            self.data.extend(bytes(spec.size - len(self.data)))
+
+    @classmethod
+    def blank(cls, spec: TagSpec, uid: Optional[bytes] = None) -> 'PageImage':
+        """NDEF-formatted image with an empty message; uid fills pages 0-2 if given"""
+        image = cls(spec)
+        if uid is not None:
+            image.set_uid(uid)
+        image.data[CC_PAGE * PAGE_SIZE:(CC_PAGE + 1) * PAGE_SIZE] = spec.cc
+        image.write_user_area(ndef.wrap_tlv(b''))
+        return image
+
+    def page(self, number: int) -> bytes:
+        offset = number * PAGE_SIZE
+        return bytes(self.data[offset:offset + PAGE_SIZE])
+
+    def pages(self, start: int = 0, end: Optional[int] = None) -> List[bytes]:
+        end = self.spec.total_pages if end is None else end
+        data = bytes(self.data[start * PAGE_SIZE:end * PAGE_SIZE])
+        return [data[i:i + PAGE_SIZE] for i in range(0, len(data), PAGE_SIZE)]
+
+    def set_uid(self, uid: bytes) -> None:
+        """Write a 7-byte UID with its check bytes into pages 0-2"""
+        if len(uid) != 7:
+            raise ValueError('Type 2 tags have 7-byte UIDs')
+        self.data[0:3] = uid[0:3]
+        self.data[3] = CASCADE_TAG ^ uid[0] ^ uid[1] ^ uid[2]
+        self.data[4:8] = uid[3:7]
+        self.data[8] = uid[3] ^ uid[4] ^ uid[5] ^ uid[6]
+
+    @property
+    def uid(self) -> bytes:
+        return bytes(self.data[0:3]) + bytes(self.data[4:8])
+
+    @property
+    def cc(self) -> bytes:
+        return self.page(CC_PAGE)
+
+    def header_errors(self) -> List[str]:
+        """Problems with the UID check bytes"""
+        return validate_ultralight_header(self.data[:12])
+
+    def locked_pages(self) -> set:
+        """Pages whose lock bits are set
+
+        Static lock bytes (page 2, bytes 2-3) lock pages 3-15 one bit per
+        page; dynamic lock bits lock spec.dynamic_lock_granularity pages
+        each from page 16 onwards. Block-locking bits are not modelled.
+        """
+        locked = set()
+        static = self.data[LOCK_PAGE * PAGE_SIZE + 2] | (self.data[LOCK_PAGE * PAGE_SIZE + 3] << 8)
+        for page in range(3, 16):
+            if static & (1 << page):
+                locked.add(page)
+        spec = self.spec
+        if spec.dynamic_lock_page is not None:
+            offset = spec.dynamic_lock_page * PAGE_SIZE
+            dynamic = self.data[offset] | (self.data[offset + 1] << 8)
+            bit = 0
+            for group_start in range(16, spec.user_end, spec.dynamic_lock_granularity):
+                if dynamic & (1 << bit):
+                    locked.update(range(group_start, min(group_start + spec.dynamic_lock_granularity,
+                                                         spec.user_end)))
+                bit += 1
+        return locked
+
+    def write_user_area(self, content: bytes) -> None:
+        """Place content at the start of the user area, zero-filling the rest"""
+        spec = self.spec
+        if len(content) > spec.user_bytes:
+            raise CapacityError(f'{len(content)} bytes do not fit the {spec.user_bytes}-byte '
+                                f'user area of {spec.name}')
+        start = USER_START * PAGE_SIZE
+        self.data[start:start + len(content)] = content
+        self.data[start + len(content):spec.user_end * PAGE_SIZE] = bytes(spec.user_bytes - len(content))
+
+    def write_ndef(self, message: bytes) -> None:
+        """Format the tag for NDEF (if needed) and store message in the user area"""
+        self.write_user_area(ndef.wrap_tlv(message))
+        if self.cc[0] != NDEF_MAGIC:
+            self.data[CC_PAGE * PAGE_SIZE:(CC_PAGE + 1) * PAGE_SIZE] = self.spec.cc
+
+    def ndef_message(self) -> bytes:
+        return ndef.find_message(bytes(self.data[USER_START * PAGE_SIZE:self.spec.user_end * PAGE_SIZE]))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.data)
+
+
+def capacity(spec: TagSpec) -> int:
+    """Largest NDEF message the tag's NDEF data area can hold"""
+    room = spec.ndef_bytes - 3  # TLV header and terminator for short messages
+    return room if room < 0xFF else spec.ndef_bytes - 5
+
+
+def fits(spec: TagSpec, message: bytes) -> bool:
+    return ndef.tlv_size(len(message)) <= spec.ndef_bytes
+
+
+def smallest_spec(message: bytes, candidates: Optional[List[str]] = None) -> TagSpec:
+    """The tag type with the least user memory that holds the message"""
+    specs = [TAG_SPECS[name] for name in candidates] if candidates else list(TAG_SPECS.values())
+    for spec in sorted(specs, key=lambda s: s.ndef_bytes):
+        if fits(spec, message):
+            return spec
+    raise CapacityError(f'{len(message)}-byte NDEF message does not fit any of the tag types')
+
+
+def encode_ndef_image(spec: TagSpec, message: bytes, base: Optional[PageImage] = None) -> PageImage:
+    """Page image holding message, built on a copy of base (or a blank tag)"""
+    if not fits(spec, message):
+        raise CapacityError(f'{len(message)}-byte NDEF message exceeds the {capacity(spec)}-byte '
+                            f'capacity of {spec.name}')
+    image = PageImage(spec, base.data) if base is not None else PageImage.blank(spec)
+    image.write_ndef(message)
+    return image
+
+
+def write_plan(current: PageImage, target: PageImage) -> List[Tuple[int, bytes]]:
+    """(page, data) writes that turn current into target's CC and user pages
+
+    Unchanged pages are skipped. The first user page, which holds the NDEF
+    TLV length, is written last so that an interrupted write never leaves a
+    complete-looking message over partial data.
+    """
+    spec = target.spec
+    start, end = CC_PAGE * PAGE_SIZE, spec.user_end * PAGE_SIZE
+    old, new = bytes(current.data[start:end]), bytes(target.data[start:end])
+    if old == new:
+        return []
+
+    # Compare whole pages as 32-bit words instead of slicing each one
+    words = struct.Struct(f'>{len(old) // PAGE_SIZE}I')
+    locked = current.locked_pages()
+    plan = []
+    for page, before, after in zip(range(CC_PAGE, spec.user_end), words.unpack(old), words.unpack(new)):
+        if before == after:
+            continue
+        if page in locked:
+            raise LockedPageError(f'page {page} is locked')
+        if page == CC_PAGE and before & ~after:
+            raise LockedPageError('capability container bits are one-time programmable and cannot be cleared')
+        plan.append((page, after.to_bytes(PAGE_SIZE, 'big')))
+
+    if plan and plan[0][0] == USER_START:
+        plan.append(plan.pop(0))
+    elif len(plan) > 1 and plan[0][0] == CC_PAGE and plan[1][0] == USER_START:
+        plan.append(plan.pop(1))
+    return plan
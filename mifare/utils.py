@@ -8,6 +8,8 @@ import binascii
 from typing import Dict, Any, List, Optional
 from colorama import Fore, Style
 
+from . import iso14443
+
 class MifareUtils:
     """Utility functions for MIFARE operations"""
     
@@ -87,9 +89,19 @@ class MifareUtils:
     
     @staticmethod
     def calculate_checksum(data: bytes) -> int:
-        """Calculate simple checksum for data"""
+        """Calculate simple checksum for data (not a card checksum; see crc_a and bcc)"""
         return sum(data) & 0xFF
     
+    @staticmethod
+    def crc_a(data: bytes) -> bytes:
+        """ISO 14443-3 CRC_A of data, in transmission order"""
+        return iso14443.crc_a_bytes(data)
+    
+    @staticmethod
+    def bcc(uid_part: bytes) -> int:
+        """UID block check character (XOR of the UID bytes of one cascade level)"""
+        return iso14443.bcc(uid_part)
+    
     @staticmethod
     def split_hex_string(hex_string: str, chunk_size: int = 16) -> List[str]:
         """Split hex string into chunks for display"""
@@ -0,0 +1,146 @@
+"""
+Read-back Verification
+
+Compares what a programmed MIFARE Classic card holds with the sector_data
+image it was meant to receive, either from a read-back image of the card
+or from per-block hashes computed by the reader.
+
+Only bytes that can be read back reliably are compared. Block 0 is never
+compared because it holds the manufacturer data. In sector trailers only
+the access bits and the user byte (bytes 6-9) are compared: key A always
+reads back as zeros and key B is readable only under some access
+conditions. Blocks the program leaves out (None) are not compared either.
+
+A block hash is the first 8 bytes of the SHA-256 of the block, with the
+bytes that are not compared zeroed. The card digest is the first 16 bytes
+of the SHA-256 of the block hashes of every compared block, in block order.
+A card that matches its program therefore has the program's digest, and a
+full image and reported hashes of the same card give the same digest.
+
+ExpectedImage prepares a program once. A matching image is checked with a
+single masked comparison and no hashing, so one program can verify
+thousands of cards per second.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from .dump import BLOCK_SIZE, classic_layout
+
+BLOCK_HASH_SIZE = 8
+DIGEST_SIZE = 16
+MAX_SECTORS = 40
+
+FULL_MASK = b'\xff' * BLOCK_SIZE
+TRAILER_MASK = bytes(6) + b'\xff' * 4 + bytes(6)
+MISSING_HASH = bytes(BLOCK_HASH_SIZE)
+
+_LAYOUT = classic_layout(MAX_SECTORS)
+
+
+def block_hash(data: bytes) -> bytes:
+    """Hash of a block whose uncompared bytes are already zeroed"""
+    return hashlib.sha256(data).digest()[:BLOCK_HASH_SIZE]
+
+
+def card_digest(hashes: Iterable[bytes]) -> str:
+    """Digest of a card from the hashes of its compared blocks, in block order"""
+    return hashlib.sha256(b''.join(hashes)).digest()[:DIGEST_SIZE].hex()
+
+
+def _mask(value: bytes, mask: bytes) -> bytes:
+    return bytes(a & b for a, b in zip(value, mask))
+
+
+@dataclass
+class Verification:
+    """Outcome of comparing one card with its program"""
+    matched: bool
+    digest: str
+    mismatched: List[int] = field(default_factory=list)  # block numbers that differ
+    missing: List[int] = field(default_factory=list)  # block numbers with no hash reported
+
+    def to_dict(self) -> Dict:
+        return {'matched': self.matched, 'digest': self.digest,
+                'mismatched_blocks': self.mismatched, 'missing_blocks': self.missing}
+
+
+class ExpectedImage:
+    """The comparable bytes of a Classic program, prepared for many verifications"""
+
+    def __init__(self, sector_data: Dict):
+        blocks: List[Tuple[int, bytes, bytes]] = []
+        for sector, data in sector_data.items():
+            if not str(sector).isdigit():
+                raise ValueError('Only MIFARE Classic programs can be verified')
+            number = int(sector)
+            if not 0 <= number < MAX_SECTORS:
+                raise ValueError(f'Sector {sector} does not exist on a Classic card')
+            first, count = _LAYOUT[number]
+            sector_blocks = (data or {}).get('blocks') or []
+            if len(sector_blocks) > count:
+                raise ValueError(f'Sector {sector} has {len(sector_blocks)} blocks, at most {count} fit')
+            for index, block in enumerate(sector_blocks):
+                if not block or first + index == 0:
+                    continue
+                value = bytes.fromhex(block.replace(' ', ''))
+                if len(value) != BLOCK_SIZE:
+                    raise ValueError(f'Sector {sector} block {index} is not {BLOCK_SIZE} bytes')
+                mask = TRAILER_MASK if index == count - 1 else FULL_MASK
+                blocks.append((first + index, _mask(value, mask), mask))
+        if not blocks:
+            raise ValueError('The program has no blocks that can be verified')
+        blocks.sort()
+
+        self.blocks = [number for number, _, _ in blocks]
+        self.size = (self.blocks[-1] + 1) * BLOCK_SIZE
+        expected = bytearray(self.size)
+        mask = bytearray(self.size)
+        for number, value, block_mask in blocks:
+            offset = number * BLOCK_SIZE
+            expected[offset:offset + BLOCK_SIZE] = value
+            mask[offset:offset + BLOCK_SIZE] = block_mask
+        self._expected = int.from_bytes(expected, 'big')
+        self._mask = int.from_bytes(mask, 'big')
+        self.hashes: Dict[int, bytes] = {number: block_hash(value) for number, value, _ in blocks}
+        self.digest = card_digest(self.hashes[number] for number in self.blocks)
+
+    def compare_image(self, image: bytes) -> Verification:
+        """Compare a read-back image that starts at block 0"""
+        if len(image) < self.size:
+            raise ValueError(f'The image must cover blocks 0-{self.blocks[-1]} ({self.size} bytes)')
+        masked = int.from_bytes(image[:self.size], 'big') & self._mask
+        if masked == self._expected:
+            return Verification(True, self.digest)
+
+        actual = masked.to_bytes(self.size, 'big')
+        diff = (masked ^ self._expected).to_bytes(self.size, 'big')
+        zero = bytes(BLOCK_SIZE)
+        mismatched = []
+        hashes = []
+        for number in self.blocks:
+            offset = number * BLOCK_SIZE
+            if diff[offset:offset + BLOCK_SIZE] == zero:
+                hashes.append(self.hashes[number])
+            else:
+                mismatched.append(number)
+                hashes.append(block_hash(actual[offset:offset + BLOCK_SIZE]))
+        return Verification(False, card_digest(hashes), mismatched)
+
+    def compare_hashes(self, hashes: Dict[int, bytes]) -> Verification:
+        """Compare block hashes reported by the reader, keyed by block number"""
+        mismatched = []
+        missing = []
+        reported = []
+        for number in self.blocks:
+            value = hashes.get(number)
+            if value is None:
+                missing.append(number)
+                value = MISSING_HASH
+            elif value != self.hashes[number]:
+                mismatched.append(number)
+            reported.append(value)
+        if not mismatched and not missing:
+            return Verification(True, self.digest)
+        return Verification(False, card_digest(reported), mismatched, missing)
@@ -1,8 +1,10 @@
 import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from app import app
+from webapp import create_app
+
+app = create_app()
 
 def handler(event, context):
     """Netlify serverless function handler"""
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Distribution Statistics Reconciliation
+Stamps links that expired unused, then rebuilds the incrementally maintained
+distribution counters from the distributions table
+"""
+
+import click
+
+from app import app
+from webapp import stats
+
+
+@click.command()
+@click.option('--expire/--no-expire', default=True, show_default=True,
+              help='Count links that expired since they were last checked')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per batch')
+def reconcile(expire, batch_size):
+    """Recompute distribution statistics"""
+    with app.app_context():
+        if expire:
+            click.echo(f'Expired links counted: {stats.expire_due(batch_size=batch_size)}')
+        click.echo(f'Statistics rows written: {stats.reconcile_stats(batch_size)}')
+
+
+if __name__ == '__main__':
+    reconcile()
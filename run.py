@@ -7,14 +7,15 @@ Simple runner script to start the Flask application
 import os
 from dotenv import load_dotenv
 from app import app, db, create_admin_user
+from webapp.schema import upgrade_schema
 
 # Load environment variables
 load_dotenv()
 
 if __name__ == '__main__':
-    # Create database tables if they don't exist
+    # Create database tables and add any new columns
     with app.app_context():
-        db.create_all()
+        upgrade_schema()
         create_admin_user()
     
     # Get configuration from environment
@@ -0,0 +1,133 @@
+// Admin dashboard actions and live distribution counters (templates/admin_dashboard.html)
+const eventsUrl = document.currentScript.dataset.eventsUrl;
+function viewProgram(id) {
+    // Implement view program functionality
+    alert('View program ' + id);
+}
+
+function editProgram(id) {
+    // Implement edit program functionality
+    alert('Edit program ' + id);
+}
+
+function deleteProgram(id) {
+    if (confirm('Are you sure you want to delete this program?')) {
+        // Implement delete functionality
+        alert('Delete program ' + id);
+    }
+}
+
+// Live distribution progress
+const STATUS_BADGES = {
+    pending: ['bg-warning', 'Pending'],
+    fetched: ['bg-info', 'Programming'],
+    programmed: ['bg-success', 'Used'],
+    expired: ['bg-danger', 'Expired']
+};
+
+function setStatus(row, status) {
+    const [cls, label] = STATUS_BADGES[status];
+    row.dataset.status = status;
+    row.querySelector('.dist-status').innerHTML = '<span class="badge ' + cls + '">' + label + '</span>';
+    if (status === 'programmed') {
+        row.querySelector('.dist-actions').innerHTML = '';
+    }
+}
+
+function formatTime(iso) {
+    return iso ? iso.slice(0, 16).replace('T', ' ') : '';
+}
+
+function addDistributionRow(data) {
+    const body = document.getElementById('distributions-body');
+    if (!body) {
+        window.location.reload();  // first distribution: the table is not rendered yet
+        return;
+    }
+    const row = document.createElement('tr');
+    row.dataset.distributionId = data.distribution_id;
+    row.dataset.expires = data.expires_at;
+    row.innerHTML = '<td><strong></strong></td><td></td><td></td><td></td>' +
+        '<td class="dist-status"></td><td class="dist-actions"></td>';
+    row.cells[0].firstChild.textContent = data.program_name;
+    row.cells[1].textContent = data.username;
+    row.cells[2].textContent = formatTime(data.created_at);
+    row.cells[3].textContent = formatTime(data.expires_at);
+    const button = document.createElement('button');
+    button.className = 'btn btn-sm btn-outline-primary';
+    button.innerHTML = '<i class="fas fa-copy"></i> Copy Link';
+    button.addEventListener('click', () => copyLink(data.access_token));
+    row.cells[5].appendChild(button);
+    setStatus(row, 'pending');
+    body.prepend(row);
+    const counter = document.getElementById('stat-distributions');
+    counter.textContent = parseInt(counter.textContent, 10) + 1;
+}
+
+function handleDistributionEvent(type, data) {
+    if (type === 'created') {
+        if (!document.querySelector('[data-distribution-id="' + data.distribution_id + '"]')) {
+            addDistributionRow(data);
+        }
+        return;
+    }
+    const row = document.querySelector('[data-distribution-id="' + data.distribution_id + '"]');
+    if (!row || row.dataset.status === 'programmed') {
+        return;
+    }
+    setStatus(row, type);
+    if (type === 'programmed') {
+        const counter = document.getElementById('stat-used');
+        counter.textContent = parseInt(counter.textContent, 10) + 1;
+    }
+}
+
+function expireStaleRows() {
+    const now = Date.now();
+    document.querySelectorAll('[data-distribution-id]').forEach(row => {
+        const status = row.dataset.status;
+        if (status !== 'programmed' && status !== 'expired' && Date.parse(row.dataset.expires) < now) {
+            setStatus(row, 'expired');
+        }
+    });
+}
+
+function connectLiveUpdates() {
+    if (!window.EventSource) {
+        return;
+    }
+    const indicator = document.getElementById('live-status');
+    const source = new EventSource(eventsUrl);
+    source.onopen = () => {
+        indicator.className = 'badge bg-success';
+        indicator.textContent = 'Live';
+    };
+    source.onerror = () => {
+        indicator.className = 'badge bg-secondary';
+        indicator.textContent = 'Reconnecting';
+    };
+    ['created', 'fetched', 'programmed', 'expired'].forEach(type => {
+        source.addEventListener(type, event => handleDistributionEvent(type, JSON.parse(event.data)));
+    });
+    // Events were dropped while this page lagged behind: reload once to catch up
+    source.addEventListener('resync', () => window.location.reload());
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('[data-distribution-id]').forEach(row => {
+        const badge = row.querySelector('.dist-status .badge');
+        row.dataset.status = badge.classList.contains('bg-success') ? 'programmed'
+            : badge.classList.contains('bg-danger') ? 'expired' : 'pending';
+    });
+    connectLiveUpdates();
+    setInterval(expireStaleRows, 60000);
+});
+
+function copyLink(token) {
+    const link = window.location.origin + '/program/' + token;
+    navigator.clipboard.writeText(link).then(() => {
+        alert('Link copied to clipboard!');
+    }).catch(err => {
+        prompt('Copy this link:', link);
+    });
+}
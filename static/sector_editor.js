@@ -0,0 +1,396 @@
+// Sector editor (templates/sector_editor.html)
+let sectorData = {};
+let currentCardType = 'classic_1k';
+const loadedProgram = JSON.parse(document.getElementById('loadedProgram').textContent);
+let savedSectorData = null;  // last saved state of loadedProgram, to send only what changed
+
+// Initialize sector editor
+document.addEventListener('DOMContentLoaded', function() {
+    if (loadedProgram) {
+        loadProgram(loadedProgram);
+    } else {
+        generateSectorTable();
+    }
+});
+
+function loadProgram(program) {
+    const sectors = Object.keys(program.sector_data);
+    document.getElementById('cardType').value = sectors.some(s => Number(s) >= 16) ? 'classic_4k' : 'classic_1k';
+    generateSectorTable();
+    sectorData = JSON.parse(JSON.stringify(program.sector_data));
+    savedSectorData = JSON.parse(JSON.stringify(program.sector_data));
+    
+    for (const [sector, data] of Object.entries(sectorData)) {
+        (data.blocks || []).slice(0, 3).forEach((block, index) => {
+            const input = document.getElementById(`sector_${sector}_block_${index}`);
+            if (input && block) input.value = block;
+        });
+        const keyA = document.getElementById(`sector_${sector}_keyA`);
+        if (!keyA) continue;
+        keyA.value = (data.keys || {}).keyA || 'FFFFFFFFFFFF';
+        document.getElementById(`sector_${sector}_keyB`).value = (data.keys || {}).keyB || 'FFFFFFFFFFFF';
+        document.getElementById(`sector_${sector}_access`).value = (data.accessBits || '078069').substr(0, 6);
+    }
+    document.getElementById('programName').value = program.name;
+}
+
+function generateSectorTable() {
+    currentCardType = document.getElementById('cardType').value;
+    const sectorCount = currentCardType === 'classic_1k' ? 16 : 40;
+    const container = document.getElementById('sectorContainer');
+    
+    container.innerHTML = '';
+    sectorData = {};
+    
+    for (let sector = 0; sector < sectorCount; sector++) {
+        const sectorDiv = createSectorEditor(sector);
+        container.appendChild(sectorDiv);
+        
+        // Initialize sector data
+        sectorData[sector] = {
+            blocks: Array(sector >= 32 ? 15 : 3).fill('00000000000000000000000000000000')
+                .concat(['FFFFFFFFFFFFFF078069FFFFFFFFFFFF']),
+            keys: { keyA: 'FFFFFFFFFFFF', keyB: 'FFFFFFFFFFFF' },
+            accessBits: '078069'
+        };
+    }
+}
+
+function createSectorEditor(sectorNum) {
+    const sectorDiv = document.createElement('div');
+    sectorDiv.className = 'mb-4';
+    sectorDiv.innerHTML = `
+        <div class="card">
+            <div class="card-header">
+                <div class="d-flex justify-content-between align-items-center">
+                    <h6 class="mb-0">Sector ${sectorNum}</h6>
+                    <div class="btn-group btn-group-sm">
+                        <button class="btn btn-outline-secondary" onclick="copySector(${sectorNum})">
+                            <i class="fas fa-copy"></i>
+                        </button>
+                        <button class="btn btn-outline-danger" onclick="clearSector(${sectorNum})">
+                            <i class="fas fa-trash"></i>
+                        </button>
+                    </div>
+                </div>
+            </div>
+            <div class="card-body">
+                <div class="table-responsive">
+                    <table class="table table-sm table-bordered">
+                        <thead>
+                            <tr>
+                                <th width="80">Block</th>
+                                <th>Data (32 hex characters)</th>
+                                <th width="100">Actions</th>
+                            </tr>
+                        </thead>
+                        <tbody>
+                            <tr>
+                                <td class="align-middle">Block 0</td>
+                                <td>
+                                    <input type="text" class="form-control form-control-sm font-monospace" 
+                                           id="sector_${sectorNum}_block_0" maxlength="32" 
+                                           placeholder="00000000000000000000000000000000"
+                                           onchange="updateSectorData(${sectorNum}, 0, this.value)">
+                                </td>
+                                <td>
+                                    <button class="btn btn-sm btn-outline-info" onclick="generateUID(${sectorNum})">
+                                        <i class="fas fa-random"></i>
+                                    </button>
+                                </td>
+                            </tr>
+                            <tr>
+                                <td class="align-middle">Block 1</td>
+                                <td>
+                                    <input type="text" class="form-control form-control-sm font-monospace" 
+                                           id="sector_${sectorNum}_block_1" maxlength="32" 
+                                           placeholder="00000000000000000000000000000000"
+                                           onchange="updateSectorData(${sectorNum}, 1, this.value)">
+                                </td>
+                                <td>
+                                    <button class="btn btn-sm btn-outline-secondary" onclick="fillPattern(${sectorNum}, 1)">
+                                        <i class="fas fa-fill"></i>
+                                    </button>
+                                </td>
+                            </tr>
+                            <tr>
+                                <td class="align-middle">Block 2</td>
+                                <td>
+                                    <input type="text" class="form-control form-control-sm font-monospace" 
+                                           id="sector_${sectorNum}_block_2" maxlength="32" 
+                                           placeholder="00000000000000000000000000000000"
+                                           onchange="updateSectorData(${sectorNum}, 2, this.value)">
+                                </td>
+                                <td>
+                                    <button class="btn btn-sm btn-outline-secondary" onclick="fillPattern(${sectorNum}, 2)">
+                                        <i class="fas fa-fill"></i>
+                                    </button>
+                                </td>
+                            </tr>
+                            <tr class="table-warning">
+                                <td class="align-middle">Trailer</td>
+                                <td>
+                                    <div class="row g-1">
+                                        <div class="col-4">
+                                            <input type="text" class="form-control form-control-sm font-monospace" 
+                                                   id="sector_${sectorNum}_keyA" maxlength="12" 
+                                                   placeholder="FFFFFFFFFFFF" value="FFFFFFFFFFFF"
+                                                   onchange="updateKeys(${sectorNum})">
+                                            <small class="text-muted">Key A</small>
+                                        </div>
+                                        <div class="col-4">
+                                            <input type="text" class="form-control form-control-sm font-monospace" 
+                                                   id="sector_${sectorNum}_access" maxlength="6" 
+                                                   placeholder="078069" value="078069"
+                                                   onchange="updateKeys(${sectorNum})">
+                                            <small class="text-muted">Access</small>
+                                        </div>
+                                        <div class="col-4">
+                                            <input type="text" class="form-control form-control-sm font-monospace" 
+                                                   id="sector_${sectorNum}_keyB" maxlength="12" 
+                                                   placeholder="FFFFFFFFFFFF" value="FFFFFFFFFFFF"
+                                                   onchange="updateKeys(${sectorNum})">
+                                            <small class="text-muted">Key B</small>
+                                        </div>
+                                    </div>
+                                </td>
+                                <td>
+                                    <button class="btn btn-sm btn-outline-warning" onclick="resetKeys(${sectorNum})">
+                                        <i class="fas fa-key"></i>
+                                    </button>
+                                </td>
+                            </tr>
+                        </tbody>
+                    </table>
+                </div>
+            </div>
+        </div>
+    `;
+    return sectorDiv;
+}
+
+function updateSectorData(sector, block, value) {
+    if (!sectorData[sector]) sectorData[sector] = { blocks: [] };
+    sectorData[sector].blocks[block] = value.toUpperCase().padEnd(32, '0');
+}
+
+function updateKeys(sector) {
+    const keyA = document.getElementById(`sector_${sector}_keyA`).value.toUpperCase();
+    const access = document.getElementById(`sector_${sector}_access`).value.toUpperCase();
+    const keyB = document.getElementById(`sector_${sector}_keyB`).value.toUpperCase();
+    
+    if (!sectorData[sector]) sectorData[sector] = {};
+    sectorData[sector].keys = { keyA, keyB };
+    sectorData[sector].accessBits = access;
+    
+    // Update trailer block; byte 6 holds the inverted C1/C2 nibbles of bytes 7-8
+    const b7 = parseInt(access.substr(0, 2), 16) || 0;
+    const b8 = parseInt(access.substr(2, 2), 16) || 0;
+    const b6 = ((~b8 & 0x0F) << 4 | (~(b7 >> 4) & 0x0F)).toString(16).padStart(2, '0').toUpperCase();
+    const trailer = keyA.padEnd(12, 'F') + b6 + access.padEnd(6, '0') + keyB.padEnd(12, 'F');
+    const blocks = sectorData[sector].blocks || (sectorData[sector].blocks = []);
+    blocks[Math.max(blocks.length - 1, 3)] = trailer;
+}
+
+function generateUID(sector) {
+    if (sector === 0) {
+        const uid = Array.from({length: 8}, () => Math.floor(Math.random() * 256).toString(16).padStart(2, '0')).join('').toUpperCase();
+        document.getElementById(`sector_${sector}_block_0`).value = uid + '000000000000000000000000';
+        updateSectorData(sector, 0, uid + '000000000000000000000000');
+    }
+}
+
+function fillPattern(sector, block) {
+    const patterns = ['00000000000000000000000000000000', 'FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF', 'DEADBEEFDEADBEEFDEADBEEFDEADBEEF'];
+    const pattern = patterns[Math.floor(Math.random() * patterns.length)];
+    document.getElementById(`sector_${sector}_block_${block}`).value = pattern;
+    updateSectorData(sector, block, pattern);
+}
+
+function clearSector(sector) {
+    for (let block = 0; block < 3; block++) {
+        document.getElementById(`sector_${sector}_block_${block}`).value = '';
+        updateSectorData(sector, block, '00000000000000000000000000000000');
+    }
+    resetKeys(sector);
+}
+
+function resetKeys(sector) {
+    document.getElementById(`sector_${sector}_keyA`).value = 'FFFFFFFFFFFF';
+    document.getElementById(`sector_${sector}_access`).value = '078069';
+    document.getElementById(`sector_${sector}_keyB`).value = 'FFFFFFFFFFFF';
+    updateKeys(sector);
+}
+
+function clearAllSectors() {
+    if (confirm('Clear all sector data?')) {
+        generateSectorTable();
+    }
+}
+
+function loadTemplate() {
+    // Load a basic template
+    const templates = {
+        'blank': 'Blank Card',
+        'access': 'Access Control Card',
+        'transport': 'Transport Card'
+    };
+    
+    // For now, just show available templates
+    alert('Templates: ' + Object.values(templates).join(', '));
+}
+
+function exportJson() {
+    const json = JSON.stringify(sectorData, null, 2);
+    const blob = new Blob([json], { type: 'application/json' });
+    const url = URL.createObjectURL(blob);
+    const a = document.createElement('a');
+    a.href = url;
+    a.download = 'mifare_program.json';
+    a.click();
+    URL.revokeObjectURL(url);
+}
+
+function scanCard() {
+    fetch('/api/scan_card')
+        .then(response => response.json())
+        .then(data => {
+            if (data.success && data.cards.length > 0) {
+                const card = data.cards[0];
+                document.getElementById('cardInfoPanel').style.display = 'block';
+                document.getElementById('cardInfo').innerHTML = `
+                    <div class="row">
+                        <div class="col-md-6">
+                            <strong>Reader:</strong> ${card.reader}<br>
+                            <strong>ATR:</strong> <code>${card.atr}</code>
+                        </div>
+                        <div class="col-md-6">
+                            <strong>Type:</strong> ${card.type || 'Unknown'}<br>
+                            <strong>UID:</strong> <code>${card.uid || 'Unknown'}</code>
+                        </div>
+                    </div>
+                `;
+            } else {
+                alert('No cards found. Please ensure a card is placed on the reader.');
+            }
+        })
+        .catch(error => {
+            alert('Error scanning card: ' + error.message);
+        });
+}
+
+function computeDelta(saved, current) {
+    // Same shape as mifare.delta: unchanged blocks are null, removed sectors null
+    const delta = {};
+    for (const [sector, data] of Object.entries(current)) {
+        const before = saved[sector] || {};
+        const beforeBlocks = before.blocks || [];
+        let changed = JSON.stringify(data.keys) !== JSON.stringify(before.keys)
+            || data.accessBits !== before.accessBits;
+        const blocks = (data.blocks || []).map((block, index) => {
+            if ((beforeBlocks[index] || '').toUpperCase() === (block || '').toUpperCase()) return null;
+            changed = true;
+            return block;
+        });
+        if (changed) delta[sector] = Object.assign({}, data, { blocks });
+    }
+    for (const sector of Object.keys(saved)) {
+        if (!(sector in current)) delta[sector] = null;
+    }
+    return delta;
+}
+
+function patchProgram() {
+    const delta = computeDelta(savedSectorData, sectorData);
+    if (Object.keys(delta).length === 0) {
+        alert('No changes to save');
+        return;
+    }
+    
+    fetch(`/api/programs/${loadedProgram.id}/sector_data`, {
+        method: 'PATCH',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ base_version: loadedProgram.version, delta })
+    })
+        .then(response => response.json().then(data => ({ status: response.status, data })))
+        .then(({ status, data }) => {
+            if (status === 409) {
+                alert(`This program was changed elsewhere${data.version ? ' (now version ' + data.version + ')' : ''}. ` +
+                      'Reload the editor to continue from the latest version.');
+                return;
+            }
+            if (!data.success) {
+                alert('Save failed:\n' + (data.errors || [data.error]).join('\n'));
+                return;
+            }
+            loadedProgram.version = data.version;
+            savedSectorData = JSON.parse(JSON.stringify(sectorData));
+            document.getElementById('editingLabel').textContent = `${loadedProgram.name} (version ${data.version})`;
+            alert(`Saved version ${data.version} (${data.changed_blocks} blocks changed)`);
+        })
+        .catch(error => {
+            alert('Error saving program: ' + error.message);
+        });
+}
+
+function saveProgram() {
+    if (loadedProgram) {
+        patchProgram();
+        return;
+    }
+    const modal = new bootstrap.Modal(document.getElementById('saveProgramModal'));
+    modal.show();
+}
+
+function submitProgram() {
+    const name = document.getElementById('programName').value;
+    const description = document.getElementById('programDescription').value;
+    
+    if (!name) {
+        alert('Please enter a program name');
+        return;
+    }
+    
+    if (Object.keys(sectorData).length === 0) {
+        alert('Please create some sector data first');
+        return;
+    }
+    
+    // Create a form and submit it properly
+    const form = document.createElement('form');
+    form.method = 'POST';
+    form.action = '/create_program';
+    
+    // Add CSRF token
+    const csrfToken = document.querySelector('meta[name=csrf-token]')?.getAttribute('content') || '';
+    const csrfInput = document.createElement('input');
+    csrfInput.type = 'hidden';
+    csrfInput.name = 'csrf_token';
+    csrfInput.value = csrfToken;
+    form.appendChild(csrfInput);
+    
+    // Add name
+    const nameInput = document.createElement('input');
+    nameInput.type = 'hidden';
+    nameInput.name = 'name';
+    nameInput.value = name;
+    form.appendChild(nameInput);
+    
+    // Add description
+    const descInput = document.createElement('input');
+    descInput.type = 'hidden';
+    descInput.name = 'description';
+    descInput.value = description;
+    form.appendChild(descInput);
+    
+    // Add sector data
+    const sectorInput = document.createElement('input');
+    sectorInput.type = 'hidden';
+    sectorInput.name = 'sector_data';
+    sectorInput.value = JSON.stringify(sectorData);
+    form.appendChild(sectorInput);
+    
+    // Submit form
+    document.body.appendChild(form);
+    form.submit();
+}
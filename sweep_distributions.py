@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Distribution Sweeper
+Moves used and long-expired distribution links to the archive table in
+small, rate-limited batches, once or every --every seconds
+"""
+
+import json
+import time
+
+import click
+
+from app import app
+from webapp import sweeper
+
+
+@click.command()
+@click.option('--used-days', default=sweeper.USED_DAYS, show_default=True,
+              help='Archive used links this many days after programming')
+@click.option('--expired-days', default=sweeper.EXPIRED_DAYS, show_default=True,
+              help='Archive unused links this many days after expiry')
+@click.option('--batch-size', default=sweeper.DEFAULT_BATCH_SIZE, show_default=True, help='Rows per transaction')
+@click.option('--max-rate', default=sweeper.DEFAULT_MAX_RATE, show_default=True,
+              help='Rows archived per second at most (0: no limit)')
+@click.option('--max-rows', type=int, help='Stop after archiving this many rows')
+@click.option('--every', type=int, help='Keep running, sweeping every N seconds')
+@click.option('--json', 'as_json', is_flag=True, help='Print each report as a JSON line')
+def sweep(used_days, expired_days, batch_size, max_rate, max_rows, every, as_json):
+    """Archive dead distribution links"""
+    while True:
+        with app.app_context():
+            report = sweeper.sweep(used_days=used_days, expired_days=expired_days, batch_size=batch_size,
+                                   max_rate=max_rate, max_rows=max_rows)
+        if as_json:
+            click.echo(json.dumps(report))
+        else:
+            click.echo(f"Archived {report['archived']} links ({report['used']} used, {report['unused']} unused) "
+                       f"in {report['batches']} batches, {report['seconds']} s; "
+                       f"newly expired: {report['expired']}; live links left: {report['remaining']}")
+            for program_id, count in sorted(report['programs'].items()):
+                click.echo(f'  program {program_id}: {count}')
+        if not every:
+            break
+        time.sleep(every)
+
+
+if __name__ == '__main__':
+    sweep()
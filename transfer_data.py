@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Bulk Export / Import
+Streams users, programs, distributions and their history to NDJSON (optionally gzip) and
+upserts them back, with constant memory regardless of table size
+"""
+
+import sys
+import gzip
+
+import click
+
+from app import app
+from webapp import stats, transfer
+
+KINDS = list(transfer.MODELS) + ['all']
+
+
+@click.group()
+def cli():
+    """Export and import MIFARE system data"""
+    pass
+
+@cli.command('export')
+@click.argument('kind', type=click.Choice(KINDS))
+@click.option('-o', '--output', default='-', help='Output file (default stdout); a .gz name compresses')
+@click.option('--batch-size', default=transfer.DEFAULT_BATCH_SIZE, show_default=True,
+              help='Rows fetched per server-side cursor batch')
+def export_command(kind, output, batch_size):
+    """Export KIND as NDJSON"""
+    kinds = list(transfer.MODELS) if kind == 'all' else [kind]
+    compress = output.endswith('.gz')
+    with app.app_context():
+        lines = transfer.iter_export(kinds, batch_size, tagged=(kind == 'all'))
+        out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in transfer.iter_chunks(lines, compress):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+
+@cli.command('import')
+@click.argument('source', default='-')
+@click.option('--kind', type=click.Choice(list(transfer.MODELS)),
+              help='Table for untagged single-table exports')
+@click.option('--batch-size', default=transfer.DEFAULT_BATCH_SIZE, show_default=True,
+              help='Rows upserted per transaction')
+def import_command(source, kind, batch_size):
+    """Upsert records from an NDJSON export (a .gz file is decompressed)"""
+    if source == '-':
+        stream = sys.stdin.buffer
+    elif source.endswith('.gz'):
+        stream = gzip.open(source, 'rb')
+    else:
+        stream = open(source, 'rb')
+    with app.app_context(), stream:
+        counts = transfer.import_records(stream, default_kind=kind, batch_size=batch_size)
+        if counts.get('distributions') or counts.get('archived_distributions'):
+            stats.reconcile_stats(batch_size)
+    for name, count in counts.items():
+        click.echo(f'{name}: {count}', err=True)
+
+if __name__ == '__main__':
+    cli()
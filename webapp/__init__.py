@@ -0,0 +1,65 @@
+"""
+MIFARE Card Programming and Distribution System - web application
+
+create_app() assembles the Flask application from blueprints. Modules that
+are slow to import (wtforms, the mifare package) are imported by the views
+that use them, and database engines are created on first use, so building
+the app stays cheap on serverless cold starts.
+"""
+
+import os
+import json
+from datetime import datetime
+
+from flask import Flask
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_app(config=None):
+    """Create and configure the Flask application"""
+    from flask_cors import CORS
+
+    from .extensions import db, login_manager
+    from . import models  # noqa: F401 - registers the models and user loader
+    from . import main, auth, admin, programming, routing, assets, templating
+
+    app = Flask(__name__, root_path=PROJECT_ROOT)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///mifare_system.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['MIFARE_MASTER_KEY'] = os.environ.get('MIFARE_MASTER_KEY')  # hex AES-128 key
+    app.config['MIFARE_SYSTEM_ID'] = os.environ.get('MIFARE_SYSTEM_ID', '')  # hex
+    # On SQLite, commit programming-time updates from a single writer thread
+    app.config['SQLITE_WRITER'] = os.environ.get('SQLITE_WRITER', '1') != '0'
+    # Read-only queries of GET requests go to these, see webapp.routing
+    app.config['DATABASE_REPLICAS'] = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+    # Programming successes must carry a read-back of the card, see webapp.verification
+    app.config['REQUIRE_CARD_VERIFICATION'] = os.environ.get('REQUIRE_CARD_VERIFICATION', '0') == '1'
+    if 'JINJA_CACHE_DIR' in os.environ:  # compiled templates; empty disables the cache
+        app.config['JINJA_CACHE_DIR'] = os.environ['JINJA_CACHE_DIR']
+    if config:
+        app.config.update(config)
+    templating.configure(app)
+
+    # Make datetime available in templates
+    @app.context_processor
+    def inject_datetime():
+        return {'datetime': datetime}
+
+    @app.template_filter('from_json')
+    def from_json(value):
+        return json.loads(value)
+
+    routing.init_app(app)
+    db.init_app(app)
+    login_manager.init_app(app)
+    CORS(app)
+
+    app.register_blueprint(main.bp)
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(admin.bp)
+    app.register_blueprint(programming.bp)
+    assets.init_app(app)
+
+    return app
@@ -0,0 +1,485 @@
+"""
+Admin pages: program authoring, distribution and user management
+"""
+
+import gzip
+import json
+import zlib
+from datetime import datetime
+
+from flask import (Blueprint, Response, render_template, request, jsonify, redirect, url_for, flash,
+                   stream_with_context)
+from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from .extensions import db
+from .models import User, CardProgram, ProgramDistribution, ArchivedDistribution
+from .events import broker, format_sse
+from . import audit, distributions, personalization, stats, transfer, versions
+
+bp = Blueprint('admin', __name__)
+
+EVENT_KEEPALIVE = 15  # seconds between comments that keep idle streams open
+RECENT_DISTRIBUTIONS = 100  # rows listed on the dashboard; totals come from stats
+
+
+@bp.route('/admin')
+@login_required
+def admin_dashboard():
+    if not current_user.is_admin:
+        flash('Access denied')
+        return redirect(url_for('main.user_dashboard'))
+    
+    programs = CardProgram.query.filter_by(created_by=current_user.id).all()
+    user_count = User.query.filter_by(is_admin=False).count()
+    distributions = (ProgramDistribution.query.join(CardProgram)
+                     .filter(CardProgram.created_by == current_user.id)
+                     .order_by(ProgramDistribution.created_at.desc())
+                     .limit(RECENT_DISTRIBUTIONS).all())
+    
+    return render_template('admin_dashboard.html', 
+                         programs=programs, user_count=user_count, distributions=distributions,
+                         program_versions={program.id: program.version for program in programs},
+                         summary=stats.owner_summary(current_user.id),
+                         program_stats=stats.program_summaries(current_user.id))
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.rstrip('Z')) if value else None
+
+@bp.route('/api/stats')
+@login_required
+def distribution_stats():
+    """All-time distribution counters for the admin and each of their programs"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    return jsonify({
+        'summary': stats.owner_summary(current_user.id),
+        'programs': stats.program_summaries(current_user.id)
+    })
+
+@bp.route('/api/stats/rollup')
+@login_required
+def distribution_rollup():
+    """Counters per hour or day: ?granularity=hour|day&program_id=&since=&until= (ISO times)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    try:
+        since, until = (_parse_time(request.args.get(name)) for name in ('since', 'until'))
+        buckets = stats.rollup(current_user.id,
+                               program_id=request.args.get('program_id', type=int),
+                               granularity=request.args.get('granularity', 'day'),
+                               since=since, until=until)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'buckets': buckets})
+
+@bp.route('/api/events/distributions')
+@login_required
+def distribution_events():
+    """Server-sent event stream of the admin's distribution state changes"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    owner_id = current_user.id
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    
+    def stream():
+        subscription = broker.subscribe(owner_id, last_event_id)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                events = subscription.get(timeout=EVENT_KEEPALIVE)
+                if events:
+                    yield ''.join(format_sse(event) for event in events)
+                else:
+                    yield ': keepalive\n\n'
+        finally:
+            subscription.close()
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/create_program', methods=['GET', 'POST'])
+@login_required
+def create_program():
+    if not current_user.is_admin:
+        flash('Access denied')
+        return redirect(url_for('main.user_dashboard'))
+    
+    from .forms import CardProgramForm
+
+    form = CardProgramForm()
+    if form.validate_on_submit():
+        try:
+            # Validate JSON format
+            json.loads(form.sector_data.data)
+            
+            program = CardProgram(
+                name=form.name.data,
+                description=form.description.data,
+                sector_data=form.sector_data.data,
+                created_by=current_user.id,
+                version=1
+            )
+            db.session.add(program)
+            db.session.flush()
+            versions.ensure_snapshot(program)
+            db.session.commit()
+            flash('Card program created successfully')
+            return redirect(url_for('admin.admin_dashboard'))
+        except json.JSONDecodeError:
+            flash('Invalid JSON format in sector data')
+    
+    return render_template('create_program.html', form=form)
+
+@bp.route('/distribute', methods=['GET', 'POST'])
+@login_required
+def distribute_program():
+    if not current_user.is_admin:
+        flash('Access denied')
+        return redirect(url_for('main.user_dashboard'))
+    
+    from .forms import DistributeForm
+
+    form = DistributeForm()
+    form.program_id.choices = [(p.id, p.name) for p in CardProgram.query.filter_by(created_by=current_user.id).all()]
+    form.user_id.choices = [(u.id, u.username) for u in User.query.filter_by(is_admin=False).all()]
+    
+    if form.validate_on_submit():
+        program = CardProgram.query.get(form.program_id.data)
+        distribution = distributions.create_distribution(program, form.user_id.data,
+                                                         hours=168)  # 7-day expiry for testing
+        expires_at = distribution.expires_at
+        access_token = distribution.access_token
+        
+        # Debug logging
+        print(f"Created distribution: token={access_token[:8]}..., expires_at={expires_at}")
+        
+        # Verify token was saved
+        saved_dist = ProgramDistribution.query.filter_by(access_token=access_token).first()
+        print(f"Token saved: {saved_dist is not None}, expires: {saved_dist.expires_at if saved_dist else 'None'}")
+        
+        flash(f'Program distributed successfully. Link expires: {expires_at.strftime("%Y-%m-%d %H:%M UTC")}')
+        return redirect(url_for('admin.admin_dashboard'))
+    
+    return render_template('distribute.html', form=form)
+
+@bp.route('/api/scan_card')
+@login_required
+def scan_card():
+    """API endpoint to scan for MIFARE cards"""
+    try:
+        from mifare import CardReader
+
+        reader = CardReader()
+        cards = reader.scan_cards()
+        return jsonify({'success': True, 'cards': cards})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@bp.route('/sector_editor')
+@login_required
+def sector_editor():
+    """Interactive sector editor for MIFARE Classic cards"""
+    if not current_user.is_admin:
+        flash('Access denied')
+        return redirect(url_for('main.user_dashboard'))
+    
+    program = None
+    program_id = request.args.get('program_id', type=int)
+    if program_id is not None:
+        record = CardProgram.query.get_or_404(program_id)
+        if record.created_by != current_user.id:
+            flash('Only the program owner can edit it')
+            return redirect(url_for('admin.manage_programs'))
+        program = {'id': record.id, 'name': record.name, 'version': record.version,
+                   'sector_data': json.loads(record.sector_data)}
+    
+    return render_template('sector_editor.html', program=program)
+
+@bp.route('/users')
+@login_required
+def manage_users():
+    """User management page"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.user_dashboard'))
+    
+    users = User.query.all()
+    return render_template('manage_users.html', users=users)
+
+@bp.route('/manage_programs')
+@login_required
+def manage_programs():
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.user_dashboard'))
+    
+    programs = CardProgram.query.all()
+    return render_template('manage_programs.html', programs=programs,
+                         programs_json=[p.to_dict() for p in programs])
+
+@bp.route('/redistribute_program/<int:program_id>', methods=['GET', 'POST'])
+@login_required
+def redistribute_program(program_id):
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.user_dashboard'))
+    
+    program = CardProgram.query.get_or_404(program_id)
+    
+    if request.method == 'POST':
+        user_id = request.form.get('user_id')
+        user = User.query.get(user_id)
+        
+        if not user:
+            flash('User not found', 'error')
+            return redirect(url_for('admin.redistribute_program', program_id=program_id))
+        
+        # Create new distribution for existing program
+        distribution = distributions.create_distribution(program, user.id, hours=24,
+                                                         full=request.form.get('full') == '1')
+        
+        if distribution.base_version:
+            flash(f'Program "{program.name}" v{program.version} redistributed to {user.username} '
+                  f'as an update from v{distribution.base_version}', 'success')
+        else:
+            flash(f'Program "{program.name}" redistributed to {user.username}', 'success')
+        return redirect(url_for('admin.manage_programs'))
+    
+    users = User.query.filter_by(is_admin=False).all()
+    return render_template('redistribute_program.html', program=program, users=users)
+
+@bp.route('/create_user', methods=['GET', 'POST'])
+@login_required
+def create_user():
+    """Create new user"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('main.user_dashboard'))
+    
+    if request.method == 'POST':
+        username = request.form.get('username')
+        email = request.form.get('email')
+        password = request.form.get('password')
+        
+        # Check if user already exists
+        if User.query.filter_by(username=username).first():
+            flash('Username already exists')
+            return render_template('create_user.html')
+        
+        if User.query.filter_by(email=email).first():
+            flash('Email already exists')
+            return render_template('create_user.html')
+        
+        # Create new user
+        new_user = User(
+            username=username,
+            email=email,
+            password_hash=generate_password_hash(password),
+            is_admin=False
+        )
+        
+        db.session.add(new_user)
+        db.session.commit()
+        
+        flash(f'User {username} created successfully')
+        return redirect(url_for('admin.manage_users'))
+    
+    return render_template('create_user.html')
+
+@bp.route('/api/programs/<int:program_id>', methods=['PUT'])
+@login_required
+def update_program(program_id):
+    """Replace a program's sector data, publishing it as a new version"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    program = CardProgram.query.get_or_404(program_id)
+    if program.created_by != current_user.id:
+        return jsonify({'error': 'Only the program owner can change it'}), 403
+    
+    payload = request.get_json(silent=True) or {}
+    sector_data = payload.get('sector_data')
+    if not isinstance(sector_data, dict):
+        return jsonify({'error': 'sector_data must be a JSON object'}), 400
+    if 'desfire' in sector_data:
+        from mifare.desfire import DesfireProgram
+        try:
+            DesfireProgram.from_json(sector_data['desfire'])
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid DESFire program: {e}'}), 400
+    
+    # Template fields must still fit the new data, whether or not they are replaced
+    fields = payload['template_fields'] if 'template_fields' in payload else \
+        json.loads(program.template_fields or 'null')
+    try:
+        template_fields = personalization.parse_template_fields(sector_data, fields)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid template fields: {e}'}), 400
+    
+    program.template_fields = template_fields
+    if 'name' in payload:
+        program.name = payload['name']
+    if 'description' in payload:
+        program.description = payload['description']
+    version = versions.publish_version(program, json.dumps(sector_data))
+    db.session.commit()
+    
+    return jsonify({'success': True, 'program_id': program.id, 'version': version})
+
+@bp.route('/api/programs/<int:program_id>/sector_data', methods=['PATCH'])
+@login_required
+def patch_program(program_id):
+    """Apply block-level edits to the program version they were made against
+
+    Body: {"base_version": 3, "delta": {"1": {"blocks": [null, "<hex>", null, null]}, "20": null}}
+    in the shape of mifare.delta; only the touched sectors are validated.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    program = CardProgram.query.get_or_404(program_id)
+    if program.created_by != current_user.id:
+        return jsonify({'error': 'Only the program owner can change it'}), 403
+    
+    payload = request.get_json(silent=True) or {}
+    delta = payload.get('delta')
+    if not isinstance(delta, dict) or not all(v is None or isinstance(v, dict) for v in delta.values()):
+        return jsonify({'error': 'delta must map sectors to objects or null'}), 400
+    if payload.get('base_version') != program.version:
+        return jsonify({'error': 'The program was changed since it was loaded',
+                        'version': program.version}), 409
+    
+    from mifare.delta import apply_delta, changed_block_count, validate_sectors
+
+    try:
+        sector_data = apply_delta(versions.version_sector_data(program, None), delta)
+    except (AttributeError, TypeError) as e:
+        return jsonify({'error': f'Invalid delta: {e}'}), 400
+    errors = validate_sectors(sector_data, delta)
+    if errors:
+        return jsonify({'error': 'Invalid sector data', 'errors': errors}), 400
+    try:
+        personalization.parse_template_fields(sector_data, json.loads(program.template_fields or 'null'))
+    except ValueError as e:
+        return jsonify({'error': f'The edit breaks the template fields: {e}'}), 400
+    
+    if 'name' in payload:
+        program.name = payload['name']
+    if 'description' in payload:
+        program.description = payload['description']
+    try:
+        version = versions.publish_version(program, json.dumps(sector_data))
+        db.session.commit()
+    except IntegrityError:
+        # Another save published the same version number first
+        db.session.rollback()
+        return jsonify({'error': 'The program was changed since it was loaded'}), 409
+    
+    return jsonify({'success': True, 'program_id': program.id, 'version': version,
+                    'changed_blocks': changed_block_count({k: v for k, v in delta.items() if v})})
+
+@bp.route('/api/programs/<int:program_id>/personalize', methods=['POST'])
+@login_required
+def personalize_program(program_id):
+    """Render and distribute one card per row: {"hours": 168, "rows": [{"user_id", "values"}]}"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    program = CardProgram.query.get_or_404(program_id)
+    if program.created_by != current_user.id:
+        return jsonify({'error': 'Only the program owner can distribute it'}), 403
+    
+    payload = request.get_json(silent=True) or {}
+    rows = payload.get('rows')
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'error': 'rows must be a non-empty list'}), 400
+    try:
+        hours = int(payload.get('hours', 168))
+        created = personalization.personalize(program, rows, hours)
+    except personalization.PersonalizationError as e:
+        return jsonify({'error': str(e), 'rows': e.errors}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'created': len(created),
+        'distributions': [
+            {'distribution_id': d.id, 'user_id': d.user_id, 'access_token': d.access_token}
+            for d in created
+        ],
+    }), 201
+
+@bp.route('/api/distributions/<int:distribution_id>/events')
+@login_required
+def distribution_audit_log(distribution_id):
+    """Audit trail of one distribution, live or archived"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    distribution = db.session.get(ProgramDistribution, distribution_id) or \
+        db.session.get(ArchivedDistribution, distribution_id)
+    if distribution is None:
+        return jsonify({'error': 'Distribution not found'}), 404
+    program = db.session.get(CardProgram, distribution.program_id)
+    if program is None or program.created_by != current_user.id:
+        return jsonify({'error': 'Only the program owner can view its audit log'}), 403
+    
+    return jsonify({
+        'distribution_id': distribution_id,
+        'program_id': distribution.program_id,
+        'events': [event.to_dict() for event in audit.events_for(distribution_id)],
+    })
+
+@bp.route('/api/export/<kind>')
+@login_required
+def export_data(kind):
+    """Stream the caller's rows of a table (or of all of them) as NDJSON, gzip-compressed with ?format=gz"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    if kind != 'all' and kind not in transfer.OWNED_KINDS:
+        return jsonify({'error': f'Unknown export: {kind}'}), 404
+    
+    compress = request.args.get('format') == 'gz'
+    kinds = transfer.OWNED_KINDS if kind == 'all' else [kind]
+    lines = transfer.iter_export(kinds, tagged=(kind == 'all'), owner_id=current_user.id)
+    filename = f"mifare_{kind}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.ndjson"
+    
+    response = Response(stream_with_context(transfer.iter_chunks(lines, compress)),
+                        mimetype='application/gzip' if compress else 'application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}{".gz" if compress else ""}'
+    return response
+
+@bp.route('/api/import', methods=['POST'])
+@login_required
+def import_data():
+    """Upsert an NDJSON export of the caller's own programs streamed in the request body"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    kind = request.args.get('kind')
+    if kind is not None and kind not in transfer.OWNED_KINDS:
+        return jsonify({'error': f'Unknown import kind: {kind}'}), 400
+    
+    stream = request.stream
+    if request.content_encoding == 'gzip' or request.mimetype == 'application/gzip':
+        stream = gzip.GzipFile(fileobj=stream)
+    
+    try:
+        counts = transfer.import_records(stream, default_kind=kind, owner_id=current_user.id)
+        if counts.get('distributions') or counts.get('archived_distributions'):
+            stats.reconcile_stats()
+    except (ValueError, KeyError, IntegrityError) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Invalid import data: {e}'}), 400
+    except (OSError, EOFError, zlib.error) as e:  # a corrupt or truncated gzip body
+        db.session.rollback()
+        return jsonify({'error': f'Invalid gzip data: {e}'}), 400
+    
+    return jsonify({'success': True, 'imported': counts})
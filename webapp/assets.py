@@ -0,0 +1,147 @@
+"""
+Fingerprinted static assets
+
+url_for('static', filename='app.js') produces /static/app.3f9a1c2e7b.js,
+a name that contains a hash of the file's content. Those URLs are served
+with a one-year immutable Cache-Control, so browsers keep the file until
+a deploy changes it and the URL with it. Responses are gzip-compressed, or
+brotli-compressed when the brotli module is installed and the client
+accepts it. Each variant is compressed once and kept in memory. Plain
+names still work and are served by Flask as usual.
+
+Files are hashed the first time a static URL is built. Fingerprinting is
+off in debug mode and when ASSET_FINGERPRINTS is False.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, Optional
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+HASH_LENGTH = 10
+IMMUTABLE = 'public, max-age=31536000, immutable'
+MIN_COMPRESS_SIZE = 512
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+_FINGERPRINTED = re.compile(r'\.[0-9a-f]{%d}\.[^./]+$' % HASH_LENGTH)
+
+
+class Asset:
+    """One static file, its fingerprinted name and its encoded variants"""
+
+    def __init__(self, filename: str, data: bytes):
+        self.digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        stem, ext = os.path.splitext(filename)
+        self.url_name = f'{stem}.{self.digest}{ext}'
+        self.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.compressible = len(data) >= MIN_COMPRESS_SIZE and self.mimetype.startswith(COMPRESSIBLE)
+        self._variants: Dict[str, bytes] = {'identity': data}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding: str) -> bytes:
+        if encoding not in self._variants:
+            with self._lock:
+                if encoding not in self._variants:
+                    data = self._variants['identity']
+                    if encoding == 'br':
+                        self._variants[encoding] = brotli.compress(data, quality=11)
+                    else:
+                        self._variants[encoding] = gzip.compress(data, 9, mtime=0)
+        return self._variants[encoding]
+
+    def encoding_for(self, accept_encoding: str) -> str:
+        if not self.compressible:
+            return 'identity'
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.split(',')}
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return 'identity'
+
+
+class AssetManifest:
+    """Fingerprints of every file in a static folder"""
+
+    def __init__(self, folder: str):
+        self.by_name: Dict[str, Asset] = {}
+        self.by_url_name: Dict[str, Asset] = {}
+        for root, _, files in os.walk(folder):
+            for name in files:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    asset = Asset(filename, f.read())
+                self.by_name[filename] = asset
+                self.by_url_name[asset.url_name] = asset
+
+    def url_name(self, filename: str) -> str:
+        asset = self.by_name.get(filename)
+        return asset.url_name if asset else filename
+
+    def lookup(self, url_name: str) -> Optional[Asset]:
+        if not _FINGERPRINTED.search(url_name):
+            return None
+        return self.by_url_name.get(url_name)
+
+
+_lock = threading.Lock()
+
+
+def manifest(app) -> AssetManifest:
+    if 'asset_manifest' not in app.extensions:
+        with _lock:
+            if 'asset_manifest' not in app.extensions:
+                app.extensions['asset_manifest'] = AssetManifest(app.static_folder)
+    return app.extensions['asset_manifest']
+
+
+def _enabled(app) -> bool:
+    return app.config.get('ASSET_FINGERPRINTS', True) and not app.debug and app.static_folder is not None
+
+
+def _fingerprint_url(endpoint: str, values: Dict) -> None:
+    if endpoint != 'static' or 'filename' not in values:
+        return
+    app = current_app._get_current_object()
+    if _enabled(app):
+        values['filename'] = manifest(app).url_name(values['filename'])
+
+
+def init_app(app) -> None:
+    """Fingerprint static URLs and serve them with far-future caching"""
+    app.url_defaults(_fingerprint_url)
+    send_static = app.view_functions['static']
+
+    def static(filename):
+        asset = manifest(app).lookup(filename) if _enabled(app) else None
+        if asset is None:
+            return send_static(filename=filename)
+        return _serve(app, asset)
+
+    app.view_functions['static'] = static
+
+
+def _serve(app, asset: Asset):
+    encoding = asset.encoding_for(request.headers.get('Accept-Encoding', ''))
+    etag = f'{asset.digest}-{encoding}'
+    response = app.response_class(mimetype=asset.mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(etag)
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+    response.set_data(asset.variant(encoding))
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    return response
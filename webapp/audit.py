@@ -0,0 +1,172 @@
+"""
+Programming audit log
+
+Every fetch, programming attempt, success, error and expiry of a
+distribution is kept as a ProgrammingEvent row, with the client's
+User-Agent and address and a duration where one is known: the time from
+fetch to success, or the write time the receive page measured.
+
+Requests never write events themselves. record() appends to an in-memory
+ring buffer per app, and a background thread inserts the buffered events
+in bulk every AUDIT_FLUSH_SECONDS, or sooner once AUDIT_FLUSH_SIZE have
+queued up (through the SQLite write queue when there is one). If the
+database falls behind, the buffer keeps the newest AUDIT_BUFFER_SIZE
+events and counts the ones it dropped. Set AUDIT_LOG to False to turn
+the log off.
+"""
+
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import current_app, has_request_context, request
+
+from .extensions import db
+from .models import ProgrammingEvent
+from . import writer
+
+KINDS = ('fetched', 'attempt', 'programmed', 'error', 'expired')
+CLIENT_KINDS = ('attempt', 'error')  # the kinds the receive page may report
+DEFAULT_BUFFER_SIZE = 10000
+DEFAULT_FLUSH_SIZE = 500
+DEFAULT_FLUSH_SECONDS = 2.0
+
+_lock = threading.Lock()
+
+
+def _insert(connection, rows: List[Dict]) -> None:
+    connection.execute(ProgrammingEvent.__table__.insert(), rows)
+
+
+class AuditBuffer:
+    """Ring buffer of pending events with a background thread that bulk-inserts them"""
+
+    def __init__(self, app, capacity: int = DEFAULT_BUFFER_SIZE, flush_size: int = DEFAULT_FLUSH_SIZE,
+                 flush_seconds: float = DEFAULT_FLUSH_SECONDS):
+        self.app = app
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.written = 0
+        self.dropped = 0
+        self._events: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def append(self, event: Dict) -> None:
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            pending = len(self._events)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-flush', daemon=True)
+                self._thread.start()
+                atexit.register(self._flush_quietly)
+        if pending >= self.flush_size:
+            self._wake.set()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def flush(self) -> int:
+        """Insert every buffered event now; returns how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._events)
+                self._events.clear()
+            if not events:
+                return 0
+            try:
+                with self.app.app_context():
+                    queue = writer.get_writer()
+                    if queue is not None:
+                        queue.run(_insert, events)
+                    else:
+                        with db.engine.begin() as connection:
+                            _insert(connection, events)
+            except Exception:
+                with self._lock:  # keep them for the next flush, newest first if space is short
+                    room = self._events.maxlen - len(self._events)
+                    self._events.extendleft(reversed(events[-room:] if room else []))
+                    self.dropped += len(events) - min(room, len(events))
+                raise
+            self.written += len(events)
+            return len(events)
+
+    def stop(self) -> None:
+        """Stop the flush thread and write the events still buffered"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            atexit.unregister(self._flush_quietly)
+            self._stopping.set()
+            self._wake.set()
+            thread.join()
+            self._stopping.clear()
+        self.flush()
+
+    def _flush_quietly(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            self.app.logger.exception('Could not write %d audit events', len(self))
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self._flush_quietly()
+
+
+def get_buffer(app=None) -> AuditBuffer:
+    app = app or current_app._get_current_object()
+    if 'audit_log' not in app.extensions:
+        with _lock:
+            if 'audit_log' not in app.extensions:
+                app.extensions['audit_log'] = AuditBuffer(
+                    app,
+                    app.config.get('AUDIT_BUFFER_SIZE', DEFAULT_BUFFER_SIZE),
+                    app.config.get('AUDIT_FLUSH_SIZE', DEFAULT_FLUSH_SIZE),
+                    app.config.get('AUDIT_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS),
+                )
+    return app.extensions['audit_log']
+
+
+def record(kind: str, distribution, duration_ms: Optional[int] = None, detail: Optional[str] = None,
+           at: Optional[datetime] = None) -> None:
+    """Queue an event for a distribution, with the client of the current request"""
+    if not current_app.config.get('AUDIT_LOG', True):
+        return
+    event = {
+        'distribution_id': distribution.id,
+        'program_id': distribution.program_id,
+        'kind': kind,
+        'occurred_at': at or datetime.utcnow(),
+        'duration_ms': duration_ms,
+        'client': None,
+        'remote_addr': None,
+        'detail': detail[:500] if detail else None,
+    }
+    if has_request_context():
+        event['client'] = request.user_agent.string[:200] or None
+        event['remote_addr'] = request.remote_addr
+    get_buffer().append(event)
+
+
+def since(start: Optional[datetime], end: Optional[datetime] = None) -> Optional[int]:
+    """Milliseconds from start until end (or now), if start is known"""
+    if start is None:
+        return None
+    return max(int(((end or datetime.utcnow()) - start).total_seconds() * 1000), 0)
+
+
+def events_for(distribution_id: int) -> List[ProgrammingEvent]:
+    """Events of one distribution in order, including ones not flushed yet"""
+    get_buffer().flush()
+    return (ProgrammingEvent.query.filter_by(distribution_id=distribution_id)
+            .order_by(ProgrammingEvent.occurred_at, ProgrammingEvent.id).all())
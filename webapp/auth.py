@@ -0,0 +1,66 @@
+"""
+Login, registration and logout
+"""
+
+from flask import Blueprint, render_template, redirect, url_for, flash
+from flask_login import login_user, logout_user, login_required
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from .extensions import db
+from .models import User
+
+bp = Blueprint('auth', __name__)
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    from .forms import LoginForm
+
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(username=form.username.data).first()
+        print(f"Login attempt for user: {form.username.data}")
+        if user:
+            print(f"User found: {user.username}, is_admin: {user.is_admin}")
+            if check_password_hash(user.password_hash, form.password.data):
+                print("Password verified successfully")
+                login_user(user)
+                return redirect(url_for('main.index'))
+            else:
+                print("Password verification failed")
+        else:
+            print("User not found")
+        flash('Invalid username or password')
+    return render_template('login.html', form=form)
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    from .forms import RegisterForm
+
+    form = RegisterForm()
+    if form.validate_on_submit():
+        if User.query.filter_by(username=form.username.data).first():
+            flash('Username already exists')
+            return render_template('register.html', form=form)
+        
+        if User.query.filter_by(email=form.email.data).first():
+            flash('Email already registered')
+            return render_template('register.html', form=form)
+        
+        user = User(
+            username=form.username.data,
+            email=form.email.data,
+            password_hash=generate_password_hash(form.password.data)
+        )
+        db.session.add(user)
+        db.session.commit()
+        flash('Registration successful')
+        return redirect(url_for('auth.login'))
+    
+    return render_template('register.html', form=form)
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('main.index'))
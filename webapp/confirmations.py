@@ -0,0 +1,153 @@
+"""
+Bulk programming confirmations
+
+Companion apps that program cards offline queue their successes and send
+them later in one request:
+
+    {"results": [{"token": "...", "op_id": "<client-generated id>",
+                  "programmed_at": "2024-05-01T09:30:00Z"}, ...]}
+
+Every result gets its own outcome and the successful ones are applied in a
+single commit. op_id makes a result idempotent: sending it again, in the
+same batch or after a lost response, returns "duplicate" instead of
+programming or failing twice. programmed_at is optional; it is used when
+it falls between the program download and now, so a card written before
+its link expired still counts after the link has expired.
+
+A result may carry a read-back of the card ("image" or "block_hashes", see
+webapp.verification). It is checked like a single programming success: a
+card that does not match is reported as mismatched and stays unprogrammed,
+and with REQUIRE_CARD_VERIFICATION a result without a read-back is
+unverified.
+
+Outcomes: programmed, duplicate, conflict (op_id already used for another
+token), not_found, already_used, expired, mismatched, unverified, invalid.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import ArchivedConfirmation, ArchivedDistribution, ProgramDistribution, ProgrammingConfirmation
+from . import distributions, verification
+
+MAX_RESULTS = 1000
+MAX_OP_ID = 100
+
+
+def _parse_time(value) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _item_error(item) -> Optional[str]:
+    if not isinstance(item, dict):
+        return 'Result must be an object'
+    if not isinstance(item.get('token'), str) or not item['token']:
+        return 'token is required'
+    op_id = item.get('op_id')
+    if not isinstance(op_id, str) or not 0 < len(op_id) <= MAX_OP_ID:
+        return f'op_id must be a string of 1 to {MAX_OP_ID} characters'
+    return None
+
+
+def _apply(items: List) -> List[Dict]:
+    valid = [item for item in items if _item_error(item) is None]
+    op_ids = {item['op_id'] for item in valid}
+    tokens = {item['token'] for item in valid}
+    seen = {}
+    if op_ids:  # confirmations of archived links keep answering as duplicates
+        for model in (ProgrammingConfirmation, ArchivedConfirmation):
+            seen.update(model.query.with_entities(model.op_id, model.distribution_id)
+                        .filter(model.op_id.in_(op_ids)))
+    by_token = {}
+    if tokens:
+        by_token = {d.access_token: d for d in
+                    ProgramDistribution.query.filter(ProgramDistribution.access_token.in_(tokens))}
+    token_of = {d.id: token for token, d in by_token.items()}
+    archived = set(seen.values()) - set(token_of)
+    if archived:
+        token_of.update(ArchivedDistribution.query
+                        .with_entities(ArchivedDistribution.id, ArchivedDistribution.access_token)
+                        .filter(ArchivedDistribution.id.in_(archived)))
+
+    now = datetime.utcnow()
+    required = current_app.config.get('REQUIRE_CARD_VERIFICATION')
+    outcomes = []
+    programmed = []
+    expired = []
+    for item in items:
+        error = _item_error(item)
+        if error:
+            outcomes.append({'op_id': item.get('op_id') if isinstance(item, dict) else None,
+                             'outcome': 'invalid', 'error': error})
+            continue
+        op_id = item['op_id']
+        distribution = by_token.get(item['token'])
+        outcome = {'op_id': op_id, 'token': item['token']}
+        outcomes.append(outcome)
+        if op_id in seen:
+            same = token_of.get(seen[op_id]) == item['token']
+            outcome['outcome'] = 'duplicate' if same else 'conflict'
+            continue
+        if distribution is None:
+            outcome['outcome'] = 'not_found'
+            continue
+        if distribution.is_used:
+            outcome['outcome'] = 'already_used'
+            continue
+
+        at = now
+        reported = _parse_time(item.get('programmed_at'))
+        if reported and distribution.used_at and distribution.used_at <= reported <= now:
+            at = reported
+        if at >= distribution.expires_at:
+            outcome['outcome'] = 'expired'
+            expired.append(distribution)
+            continue
+
+        if verification.has_readback(item):
+            try:
+                result = verification.verify(distribution, item)
+            except (LookupError, TypeError, ValueError) as e:
+                outcome.update(outcome='invalid', error=f'Invalid read-back: {e}')
+                continue
+            for name, value in verification.card_values(result).items():
+                setattr(distribution, name, value)
+            if not result.matched:
+                outcome.update(result.to_dict(), outcome='mismatched')
+                continue
+        elif required:
+            outcome['outcome'] = 'unverified'
+            continue
+
+        outcome['outcome'] = 'programmed'
+        programmed.append((distribution, at))
+        distribution.is_used = True  # later results for this token see it used
+        seen[op_id] = distribution.id
+        db.session.add(ProgrammingConfirmation(op_id=op_id, distribution_id=distribution.id, programmed_at=at))
+
+    distributions.record_results(programmed, expired)
+    return outcomes
+
+
+def confirm(items: List) -> List[Dict]:
+    """Apply a batch of programming results; one outcome per item, in order"""
+    if len(items) > MAX_RESULTS:
+        raise ValueError(f'At most {MAX_RESULTS} results per request')
+    try:
+        return _apply(items)
+    except IntegrityError:
+        # Another request stored one of these op_ids first; its results are duplicates now
+        db.session.rollback()
+        return _apply(items)
@@ -0,0 +1,176 @@
+"""
+Distribution lifecycle
+
+Every state change of a ProgramDistribution goes through these functions,
+which update the distribution statistics in the same transaction, commit,
+and publish the change to the live progress stream. On SQLite the
+programming-time changes (fetched, programmed, expired) are committed by
+the single writer thread of webapp.writer.
+"""
+
+import secrets
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .extensions import db
+from .models import CardProgram, ProgramDistribution
+from .events import broker
+from . import audit, routing, stats, versions, writer
+
+
+def _utc(value):
+    return value.isoformat() + 'Z' if value else None
+
+
+def _publish(event_type: str, distribution: ProgramDistribution) -> None:
+    program = distribution.program
+    extra = {'access_token': distribution.access_token} if event_type == 'created' else {}
+    broker.publish(
+        event_type,
+        owner_id=program.created_by,
+        distribution_id=distribution.id,
+        program_id=program.id,
+        program_name=program.name,
+        user_id=distribution.user_id,
+        username=distribution.user.username if distribution.user else None,
+        created_at=_utc(distribution.created_at),
+        expires_at=_utc(distribution.expires_at),
+        **extra
+    )
+
+
+def create_distribution(program: CardProgram, user_id: int, hours: int,
+                        full: bool = False) -> ProgramDistribution:
+    """Create a one-time link delivering the program's current version"""
+    return create_distributions(program, [(user_id, None)], hours, full=full)[0]
+
+
+def create_distributions(program: CardProgram, recipients: List[Tuple[int, Optional[str]]],
+                         hours: int, full: bool = False) -> List[ProgramDistribution]:
+    """Create links for many (user_id, personalized sector_data JSON) pairs in one commit
+
+    Personalized links always deliver the full image.
+    """
+    expires_at = datetime.utcnow() + timedelta(hours=hours)
+    created = []
+    full_versions = None
+    for user_id, personalized_data in recipients:
+        if full or personalized_data is not None:
+            if full_versions is None:  # the same for every full link
+                full_versions = versions.distribution_versions(program, user_id, full=True)
+            pinned = full_versions
+        else:
+            pinned = versions.distribution_versions(program, user_id)
+        distribution = ProgramDistribution(
+            program_id=program.id,
+            user_id=user_id,
+            access_token=secrets.token_urlsafe(32),
+            expires_at=expires_at,
+            is_used=False,
+            personalized_data=personalized_data,
+            **pinned
+        )
+        db.session.add(distribution)
+        created.append(distribution)
+    if created:
+        stats.record('created', program, amount=len(created))
+    db.session.commit()
+    for distribution in created:
+        _publish('created', distribution)
+    return created
+
+
+def _update(connection, distribution_id: int, owner_id: int, program_id: int,
+            values: dict, counter: Optional[str], at: datetime) -> None:
+    """Write-queue job: update one distribution and count the transition"""
+    table = ProgramDistribution.__table__
+    connection.execute(table.update().where(table.c.id == distribution_id).values(**values))
+    if counter:
+        stats.record_ids(counter, owner_id, program_id, at, connection=connection)
+
+
+def _apply(distribution: ProgramDistribution, values: dict, counter: Optional[str] = None) -> None:
+    """Store a state change and count it, through the write queue when there is one"""
+    at = datetime.utcnow()
+    queue = writer.get_writer()
+    if queue is None:
+        for name, value in values.items():
+            setattr(distribution, name, value)
+        if counter:
+            stats.record(counter, distribution.program, at)
+        db.session.commit()
+        return
+
+    program = distribution.program
+    queue.run(_update, distribution.id, program.created_by, program.id, values, counter, at)
+    routing.mark_written(db.session)
+    for name, value in values.items():
+        set_committed_value(distribution, name, value)
+
+
+def mark_fetched(distribution: ProgramDistribution) -> None:
+    """The program data was downloaded; programming has started"""
+    counter = 'fetched' if distribution.used_at is None else None
+    _apply(distribution, {'used_at': datetime.utcnow()}, counter)
+    _publish('fetched', distribution)
+    audit.record('fetched', distribution)
+
+
+def mark_programmed(distribution: ProgramDistribution, card: Optional[dict] = None) -> None:
+    """The card was written successfully; the link is now used up
+
+    card holds the verification columns when the card was read back.
+    """
+    fetched_at = distribution.used_at
+    _apply(distribution, dict(card or {}, is_used=True, used_at=datetime.utcnow()), 'programmed')
+    _publish('programmed', distribution)
+    audit.record('programmed', distribution, duration_ms=audit.since(fetched_at))
+
+
+def record_verification(distribution: ProgramDistribution, card: dict) -> None:
+    """Store the verification of a card that did not match; the link stays usable"""
+    _apply(distribution, card)
+
+
+def mark_expired(distribution: ProgramDistribution) -> None:
+    """An expired, unused link was presented; counted the first time only"""
+    if distribution.expired_at is not None or distribution.is_used:
+        return
+    _apply(distribution, {'expired_at': datetime.utcnow()}, 'expired')
+    _publish('expired', distribution)
+    audit.record('expired', distribution)
+
+
+def record_results(programmed: List[Tuple[ProgramDistribution, datetime]],
+                   expired: List[ProgramDistribution]) -> None:
+    """Mark many cards programmed (at the given times) and links expired in one commit"""
+    counts = Counter()
+    durations = []
+    for distribution, at in programmed:
+        durations.append(audit.since(distribution.used_at, at))
+        distribution.is_used = True
+        distribution.used_at = at
+        counts['programmed', distribution.program, stats.hour_bucket(at)] += 1
+    now = datetime.utcnow()
+    expired = [d for d in expired if d.expired_at is None and not d.is_used]
+    for distribution in expired:
+        distribution.expired_at = now
+        counts['expired', distribution.program, stats.hour_bucket(now)] += 1
+    for (counter, program, bucket), amount in counts.items():
+        stats.record(counter, program, bucket, amount)
+    ids = [d.id for d, _ in programmed] + [d.id for d in expired]
+    db.session.commit()
+    if ids:  # reload the committed rows for the events in one query
+        (ProgramDistribution.query
+         .options(joinedload(ProgramDistribution.program), joinedload(ProgramDistribution.user))
+         .filter(ProgramDistribution.id.in_(ids)).all())
+    for (distribution, at), duration_ms in zip(programmed, durations):
+        _publish('programmed', distribution)
+        audit.record('programmed', distribution, duration_ms=duration_ms, detail='batch', at=at)
+    for distribution in expired:
+        _publish('expired', distribution)
+        audit.record('expired', distribution, at=now)
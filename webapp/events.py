@@ -0,0 +1,118 @@
+"""
+In-process event broker for live distribution progress
+
+Distribution state changes (created, fetched, programmed, expired) are
+published once and fanned out to every subscriber. Each subscriber has a
+bounded backlog: a slow or stalled reader loses its oldest events rather
+than growing without limit, and is told to resynchronise instead. The
+broker only reaches subscribers in the same process.
+"""
+
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+BACKLOG = 100
+HISTORY = 256
+
+
+class Subscription:
+    """One subscriber's bounded queue of pending events"""
+
+    def __init__(self, broker: 'EventBroker', owner_id: Optional[int], backlog: int):
+        self.broker = broker
+        self.owner_id = owner_id
+        self.events = deque(maxlen=backlog)
+        self.dropped = False
+        self.condition = threading.Condition(broker.lock)
+
+    def _push(self, event: Dict) -> None:
+        if len(self.events) == self.events.maxlen:
+            self.dropped = True
+        self.events.append(event)
+        self.condition.notify()
+
+    def get(self, timeout: float) -> List[Dict]:
+        """Wait up to timeout seconds and return every pending event
+
+        If events were dropped because the backlog was full, the rest are
+        discarded too and a single 'resync' event is returned instead.
+        """
+        with self.broker.lock:
+            if not self.events and not self.dropped:
+                self.condition.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            if self.dropped:
+                self.dropped = False
+                return [{'id': self.broker.last_id, 'type': 'resync'}]
+            return events
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Fans published events out to subscribers, filtered by program owner"""
+
+    def __init__(self, backlog: int = BACKLOG, history: int = HISTORY):
+        self.lock = threading.Lock()
+        self.backlog = backlog
+        self.subscribers = set()
+        self.history = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self.last_id = 0
+
+    def subscribe(self, owner_id: Optional[int] = None, last_event_id: Optional[int] = None) -> Subscription:
+        """Register a subscriber; owner_id limits it to one admin's programs
+
+        When last_event_id is given (a reconnecting EventSource), events
+        published since then are replayed from the recent history, or a
+        resync is requested if they are no longer there.
+        """
+        with self.lock:
+            subscription = Subscription(self, owner_id, self.backlog)
+            if last_event_id is not None and last_event_id < self.last_id:
+                oldest = self.history[0]['id'] if self.history else self.last_id + 1
+                if last_event_id + 1 < oldest:
+                    subscription.dropped = True
+                for event in self.history:
+                    if event['id'] > last_event_id and self._wants(subscription, event):
+                        subscription._push(event)
+            self.subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    @staticmethod
+    def _wants(subscription: Subscription, event: Dict) -> bool:
+        return subscription.owner_id is None or subscription.owner_id == event.get('owner_id')
+
+    def publish(self, event_type: str, **data) -> Dict:
+        """Publish an event to every interested subscriber"""
+        with self.lock:
+            self.last_id = next(self._ids)
+            event = dict(data, id=self.last_id, type=event_type, at=time.time())
+            self.history.append(event)
+            for subscription in self.subscribers:
+                if self._wants(subscription, event):
+                    subscription._push(event)
+            return event
+
+    def subscriber_count(self) -> int:
+        with self.lock:
+            return len(self.subscribers)
+
+
+def format_sse(event: Dict) -> str:
+    """Serialise an event in text/event-stream framing"""
+    payload = {key: value for key, value in event.items() if key not in ('id', 'type', 'owner_id')}
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+broker = EventBroker()
@@ -0,0 +1,64 @@
+"""
+Flask extension instances
+
+Created unbound here and attached to the application in create_app(), so
+that models and blueprints can import them without importing the app.
+"""
+
+import functools
+
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+
+from .routing import RoutingSession
+
+
+class _DeferredEngines(dict):
+    """Engine mapping that builds each engine the first time it is looked up"""
+
+    def __getitem__(self, key):
+        engine = super().__getitem__(key)
+        if isinstance(engine, functools.partial):
+            engine = engine()
+            super().__setitem__(key, engine)
+        return engine
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+
+class LazySQLAlchemy(SQLAlchemy):
+    """SQLAlchemy extension that defers engine creation until first use
+
+    Creating an engine loads the database dialect and its DBAPI driver.
+    On serverless cold starts most first requests never touch the
+    database, so engines are built on first lookup instead of in init_app.
+    SQLite engines get the pragmas of webapp.sqlite when they are built.
+    """
+
+    def init_app(self, app):
+        self._app_engines[app] = _DeferredEngines()
+        super().init_app(app)
+
+    def _make_engine(self, bind_key, options, app):
+        return functools.partial(self._build_engine, bind_key, options, app)
+
+    def _build_engine(self, bind_key, options, app):
+        engine = super()._make_engine(bind_key, options, app)
+        if engine.dialect.name == 'sqlite':
+            from .sqlite import DEFAULT_PRAGMAS, configure_engine
+
+            configure_engine(engine, app.config.get('SQLITE_PRAGMAS', DEFAULT_PRAGMAS))
+        return engine
+
+
+db = LazySQLAlchemy(session_options={'class_': RoutingSession})
+
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
@@ -0,0 +1,29 @@
+"""
+WTForms definitions
+
+Imported by the views that render or validate a form rather than at
+application start-up, since wtforms and flask_wtf are slow to import.
+"""
+
+from flask_wtf import FlaskForm
+from wtforms import StringField, PasswordField, TextAreaField, SelectField
+from wtforms.validators import DataRequired, Email, Length
+
+
+class LoginForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired()])
+    password = PasswordField('Password', validators=[DataRequired()])
+
+class RegisterForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired(), Length(min=4, max=20)])
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
+
+class CardProgramForm(FlaskForm):
+    name = StringField('Program Name', validators=[DataRequired()])
+    description = TextAreaField('Description')
+    sector_data = TextAreaField('Sector Data (JSON)', validators=[DataRequired()])
+
+class DistributeForm(FlaskForm):
+    program_id = SelectField('Card Program', coerce=int, validators=[DataRequired()])
+    user_id = SelectField('User', coerce=int, validators=[DataRequired()])
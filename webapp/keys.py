@@ -0,0 +1,64 @@
+"""
+Per-card sector keys
+
+When MIFARE_MASTER_KEY is configured, program data fetched for a known card
+UID carries keys diversified for that card (AN10922) instead of the static
+keys stored with the program. Diversifiers are built once per master key and
+keep an LRU cache of the keys they derive. Only the numbered sectors of
+MIFARE Classic programs carry keys; NDEF and DESFire parts of a program are
+passed through unchanged.
+"""
+
+from typing import Dict, Optional
+
+from flask import current_app
+
+UID_LENGTHS = (4, 7, 10)
+
+_diversifiers = {}
+
+
+class InvalidUidError(ValueError):
+    """The card UID passed by the client is not 4, 7 or 10 bytes of hex"""
+
+
+def parse_uid(uid: str) -> bytes:
+    try:
+        value = bytes.fromhex(uid.replace(' ', '').replace(':', ''))
+    except ValueError:
+        value = b''
+    if len(value) not in UID_LENGTHS:
+        raise InvalidUidError(f'Invalid card UID: {uid}')
+    return value
+
+
+def diversifier():
+    """The diversifier for the configured master key, or None if there is none"""
+    master_key = current_app.config.get('MIFARE_MASTER_KEY')
+    if not master_key:
+        return None
+    system_id = current_app.config.get('MIFARE_SYSTEM_ID') or ''
+    key = (master_key, system_id)
+    if key not in _diversifiers:
+        from mifare.diversify import KeyDiversifier
+
+        _diversifiers[key] = KeyDiversifier(master_key, bytes.fromhex(system_id))
+    return _diversifiers[key]
+
+
+def diversify_sector_data(sector_data: Dict, uid: str) -> Optional[Dict]:
+    """sector_data with the card's diversified keys
+
+    None if no master key is configured or the program has no Classic
+    sectors. Raises InvalidUidError for a malformed UID.
+    """
+    current = diversifier()
+    sectors = [int(sector) for sector in sector_data if sector.isdigit()]
+    if current is None or not sectors:
+        return None
+
+    from mifare.diversify import apply_sector_keys
+
+    # Always derive a whole card's keys so full programs and deltas share one cache entry
+    sector_count = 40 if max(sectors) >= 16 else 16
+    return apply_sector_keys(sector_data, current.sector_keys(parse_uid(uid), range(sector_count)))
@@ -0,0 +1,26 @@
+"""
+Landing page and user dashboard
+"""
+
+from flask import Blueprint, render_template, redirect, url_for
+from flask_login import login_required, current_user
+
+from .models import ProgramDistribution
+
+bp = Blueprint('main', __name__)
+
+
+@bp.route('/')
+def index():
+    if current_user.is_authenticated:
+        if current_user.is_admin:
+            return redirect(url_for('admin.admin_dashboard'))
+        else:
+            return redirect(url_for('main.user_dashboard'))
+    return render_template('index.html')
+
+@bp.route('/user')
+@login_required
+def user_dashboard():
+    distributions = ProgramDistribution.query.filter_by(user_id=current_user.id).all()
+    return render_template('user_dashboard.html', distributions=distributions)
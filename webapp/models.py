@@ -0,0 +1,179 @@
+"""
+Database models for the MIFARE card programming system
+"""
+
+from datetime import datetime
+
+from flask_login import UserMixin
+
+from .extensions import db, login_manager
+
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(120), nullable=False)
+    is_admin = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    programs_received = db.relationship('ProgramDistribution', backref='user', lazy=True)
+
+class CardProgram(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    sector_data = db.Column(db.Text, nullable=False)  # JSON string of sector data
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_active = db.Column(db.Boolean, default=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    template_fields = db.Column(db.Text)  # JSON list of per-holder fields, see mifare.personalize
+    distributions = db.relationship('ProgramDistribution', backref='program', lazy=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'sector_data': self.sector_data,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'is_active': self.is_active,
+            'version': self.version,
+            'template_fields': self.template_fields,
+        }
+
+class ProgramVersion(db.Model):
+    """Immutable snapshot of a program's sector data at one version"""
+    id = db.Column(db.Integer, primary_key=True)
+    program_id = db.Column(db.Integer, db.ForeignKey('card_program.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    sector_data = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('program_id', 'version'),)
+
+class ProgramDelta(db.Model):
+    """Cached block-level delta between two versions of a program"""
+    id = db.Column(db.Integer, primary_key=True)
+    program_id = db.Column(db.Integer, db.ForeignKey('card_program.id'), nullable=False)
+    from_version = db.Column(db.Integer, nullable=False)
+    to_version = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Text, nullable=False)  # JSON, sector_data shape
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('program_id', 'from_version', 'to_version'),)
+
+class ProgramDistribution(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    program_id = db.Column(db.Integer, db.ForeignKey('card_program.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    access_token = db.Column(db.String(200), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    used_at = db.Column(db.DateTime)
+    is_used = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    program_version = db.Column(db.Integer)  # version this link delivers
+    base_version = db.Column(db.Integer)  # version already on the user's card, if any
+    expired_at = db.Column(db.DateTime)  # when the link was first seen expired and unused
+    personalized_data = db.Column(db.Text)  # rendered sector_data JSON for this holder, if templated
+    card_digest = db.Column(db.String(32))  # mifare.verify digest of the card as read back
+    card_matches = db.Column(db.Boolean)  # whether that read-back matched the program
+    verified_at = db.Column(db.DateTime)
+
+class ArchivedDistribution(db.Model):
+    """A used or long-expired distribution moved out of the live table by webapp.sweeper"""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # the original id
+    program_id = db.Column(db.Integer, db.ForeignKey('card_program.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    access_token = db.Column(db.String(200), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    used_at = db.Column(db.DateTime)
+    is_used = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime)
+    program_version = db.Column(db.Integer)
+    base_version = db.Column(db.Integer)
+    expired_at = db.Column(db.DateTime)
+    personalized_data = db.Column(db.Text)
+    card_digest = db.Column(db.String(32))
+    card_matches = db.Column(db.Boolean)
+    verified_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_archived_distribution_user_program', 'user_id', 'program_id'),)
+
+class DistributionStats(db.Model):
+    """Distribution counters, maintained incrementally by webapp.stats
+
+    program_id 0 holds the totals across all of an admin's programs, and
+    bucket_start TOTAL_BUCKET holds all-time totals; other rows count the
+    events of one hour.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, nullable=False)
+    program_id = db.Column(db.Integer, nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    fetched = db.Column(db.Integer, nullable=False, default=0)
+    programmed = db.Column(db.Integer, nullable=False, default=0)
+    expired = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint('owner_id', 'program_id', 'bucket_start'),)
+
+    def to_dict(self):
+        return {
+            'program_id': self.program_id or None,
+            'created': self.created,
+            'fetched': self.fetched,
+            'programmed': self.programmed,
+            'expired': self.expired,
+            'pending': max(self.created - self.programmed - self.expired, 0),
+        }
+
+class ProgrammingEvent(db.Model):
+    """Append-only audit record of a fetch, attempt, success, error or expiry (webapp.audit)
+
+    No foreign key: events outlive their distribution when it is archived.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    distribution_id = db.Column(db.Integer, nullable=False)
+    program_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    occurred_at = db.Column(db.DateTime, nullable=False)
+    duration_ms = db.Column(db.Integer)
+    client = db.Column(db.String(200))  # User-Agent of the request
+    remote_addr = db.Column(db.String(64))
+    detail = db.Column(db.String(500))
+    __table_args__ = (db.Index('ix_programming_event_distribution_time', 'distribution_id', 'occurred_at'),
+                      db.Index('ix_programming_event_time', 'occurred_at'))
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'occurred_at': self.occurred_at.isoformat() + 'Z',
+            'duration_ms': self.duration_ms,
+            'client': self.client,
+            'remote_addr': self.remote_addr,
+            'detail': self.detail,
+        }
+
+class ProgrammingConfirmation(db.Model):
+    """A programming success reported by a companion app, kept to make its op_id idempotent"""
+    id = db.Column(db.Integer, primary_key=True)
+    op_id = db.Column(db.String(100), unique=True, nullable=False)  # chosen by the client
+    distribution_id = db.Column(db.Integer, db.ForeignKey('program_distribution.id'), nullable=False)
+    programmed_at = db.Column(db.DateTime, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ArchivedConfirmation(db.Model):
+    """A ProgrammingConfirmation whose distribution was archived; its op_id stays idempotent"""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # the original id
+    op_id = db.Column(db.String(100), unique=True, nullable=False)
+    distribution_id = db.Column(db.Integer, nullable=False)  # an ArchivedDistribution id
+    programmed_at = db.Column(db.DateTime, nullable=False)
+    received_at = db.Column(db.DateTime)
+
+class ReplicationHeartbeat(db.Model):
+    """Single row rewritten on the primary to measure replica lag (webapp.routing)"""
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.DateTime, nullable=False)
+
+@login_manager.user_loader
+def load_user(user_id):
+    return User.query.get(int(user_id))
@@ -0,0 +1,29 @@
+"""
+Ultralight/NTAG page images for NDEF programs
+
+Programs whose sector data holds an "ndef" entry ({"ndef": {"records": [...]}})
+are delivered to Type 2 tags as page images. Versions are immutable, so
+the encoded image of each program version and tag type is cached.
+"""
+
+from functools import lru_cache
+
+from .models import CardProgram
+from . import versions
+
+
+def is_ndef_program(sector_data: dict) -> bool:
+    return isinstance(sector_data.get('ndef'), dict)
+
+
+@lru_cache(maxsize=256)
+def page_image(program_id: int, version: int, tag: str) -> bytes:
+    """Encoded page image of one program version for one tag type"""
+    from mifare import ndef, ultralight
+
+    program = CardProgram.query.get(program_id)
+    sector_data = versions.version_sector_data(program, version)
+    if not is_ndef_program(sector_data):
+        raise ValueError('Program has no NDEF records')
+    message = ndef.encode_message(ndef.records_from_json(sector_data['ndef'].get('records', [])))
+    return ultralight.encode_ndef_image(ultralight.get_spec(tag), message).to_bytes()
@@ -0,0 +1,85 @@
+"""
+Personalised bulk distribution
+
+Programs with template fields are rendered once per card holder. The
+compiled template of each program version is cached, and a bulk request
+renders every card before any distribution is created, so a bad row
+rejects the whole batch.
+"""
+
+import json
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from .models import CardProgram, ProgramDistribution, User
+from . import distributions, versions
+
+MAX_ROWS = 5000
+
+
+class PersonalizationError(ValueError):
+    """One or more rows of a bulk request could not be rendered"""
+
+    def __init__(self, errors: List[Dict]):
+        self.errors = errors
+        super().__init__(f'{len(errors)} rows could not be personalized')
+
+
+def parse_template_fields(sector_data: Dict, items) -> Optional[str]:
+    """Validated template fields as stored in CardProgram.template_fields"""
+    if not items:
+        return None
+    from mifare.personalize import Template, parse_fields
+
+    fields = parse_fields(items)
+    Template(sector_data, fields)
+    return json.dumps([field.to_json() for field in fields])
+
+
+@lru_cache(maxsize=64)
+def _template(program_id: int, version: int, template_fields: str):
+    from mifare.personalize import Template, parse_fields
+
+    program = CardProgram.query.get(program_id)
+    return Template(versions.version_sector_data(program, version), parse_fields(json.loads(template_fields)))
+
+
+def template_for(program: CardProgram):
+    """Compiled template of the program's current version, or None if it has no fields"""
+    if not program.template_fields:
+        return None
+    return _template(program.id, program.version, program.template_fields)
+
+
+def personalize(program: CardProgram, rows: List[Dict], hours: int) -> List[ProgramDistribution]:
+    """Render a card per row ({"user_id" or "username", "values"}) and distribute them"""
+    template = template_for(program)
+    if template is None:
+        raise ValueError('Program has no template fields')
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f'At most {MAX_ROWS} rows per request')
+
+    usernames = {row['username'] for row in rows if isinstance(row, dict) and 'username' in row}
+    user_ids = {}
+    if usernames:
+        user_ids = dict(User.query.with_entities(User.username, User.id)
+                        .filter(User.username.in_(usernames)))
+    known_ids = {row['user_id'] for row in rows if isinstance(row, dict) and 'user_id' in row}
+    if known_ids:
+        known_ids = {user_id for (user_id,) in User.query.with_entities(User.id).filter(User.id.in_(known_ids))}
+
+    recipients = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError('Row must be an object')
+            user_id = row['user_id'] if 'user_id' in row else user_ids.get(row.get('username'))
+            if user_id is None or ('user_id' in row and user_id not in known_ids):
+                raise ValueError('Unknown user')
+            recipients.append((user_id, template.render_json(row.get('values') or {})))
+        except ValueError as e:
+            errors.append({'row': index, 'error': str(e)})
+    if errors:
+        raise PersonalizationError(errors)
+    return distributions.create_distributions(program, recipients, hours)
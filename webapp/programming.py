@@ -0,0 +1,294 @@
+"""
+Program delivery: distribution links, the receive page and the
+companion-app APIs used while a card is being programmed
+"""
+
+import json
+from collections import Counter
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, request, jsonify
+
+from .models import ProgramDistribution
+from . import audit, confirmations, distributions, keys, pages, routing, verification, versions
+
+MAX_CLIENT_EVENTS = 20
+
+bp = Blueprint('programming', __name__)
+
+
+@bp.route('/mobile_redirect')
+def mobile_redirect():
+    token = request.args.get('token')
+    distribution = routing.first_or_primary(ProgramDistribution.query.filter_by(access_token=token))
+    
+    if not distribution:
+        return render_template('error.html', message='Invalid program link')
+    
+    return render_template('mobile_redirect.html', token=token, distribution=distribution)
+
+@bp.route('/debug_mobile_redirect')
+def debug_mobile_redirect():
+    return render_template('debug_mobile_redirect.html')
+
+@bp.route('/program/<token>')
+def receive_program(token):
+    # Debug logging
+    print(f"Received token: {token[:8]}... at {datetime.utcnow()}")
+    
+    distribution = routing.first_or_primary(ProgramDistribution.query.filter_by(access_token=token))
+    
+    if not distribution:
+        print(f"Token not found in database: {token[:8]}...")
+        return render_template('error.html', message='Invalid or expired program link')
+    
+    print(f"Found distribution: expires={distribution.expires_at}, now={datetime.utcnow()}, used={distribution.is_used}")
+    
+    if distribution.expires_at < datetime.utcnow():
+        print(f"Token expired: {distribution.expires_at} < {datetime.utcnow()}")
+        distributions.mark_expired(distribution)
+        return render_template('error.html', message='Program link has expired')
+    
+    # Check if programming was already completed successfully
+    if distribution.is_used:
+        return render_template('error.html', message='This program has already been successfully programmed. Request a new distribution to program again.')
+    
+    # Mobile detection and app redirect (unless forced to use web)
+    force_web = request.args.get('force_web') == '1'
+    user_agent = request.headers.get('User-Agent', '').lower()
+    is_mobile = any(device in user_agent for device in ['android', 'iphone', 'ipad', 'mobile', 'webos', 'blackberry'])
+    
+    if is_mobile and not force_web:
+        # Extract username from distribution or use default
+        username = distribution.user.username if distribution.user else 'user_from_web'
+        
+        # Create app deep link with token as card data
+        app_url = f"rfaccess://open?username={username}&cardData={token}&action=program"
+        
+        # Return redirect template that tries app first, then falls back to web
+        return render_template('mobile_redirect.html', 
+                             app_url=app_url, 
+                             token=token,
+                             distribution=distribution, 
+                             program=distribution.program)
+    
+    program = distribution.program
+    return render_template('receive_program.html', 
+                         distribution=distribution, program=program)
+
+@bp.route('/api/programming_success/<token>', methods=['POST'])
+def mark_programming_success(token):
+    """Mark a distribution as successfully programmed
+
+    A read-back of the card ({"image": ...} or {"block_hashes": ...}) is
+    checked against the program first; a card that does not match is
+    rejected with 409 and the link stays usable.
+    """
+    try:
+        distribution = routing.first_or_primary(ProgramDistribution.query.filter_by(access_token=token))
+        
+        if not distribution:
+            return jsonify({'error': 'Token not found'}), 404
+        
+        if distribution.expires_at < datetime.utcnow():
+            distributions.mark_expired(distribution)
+            return jsonify({'error': 'Token expired'}), 403
+            
+        if distribution.is_used:
+            return jsonify({'error': 'Already marked as used'}), 403
+        
+        payload = request.get_json(silent=True) or {}
+        card = None
+        response = {'success': True, 'message': 'Programming marked as successful'}
+        if verification.has_readback(payload):
+            try:
+                result = verification.verify(distribution, payload)
+            except (TypeError, ValueError) as e:
+                return jsonify({'error': f'Invalid read-back: {e}'}), 400
+            except LookupError as e:  # the pinned program version is not available
+                return jsonify({'error': f'Cannot verify the card: {e}'}), 409
+            card = verification.card_values(result)
+            if not result.matched:
+                distributions.record_verification(distribution, card)
+                audit.record('error', distribution, detail=f'Read-back mismatch in blocks '
+                             f'{result.mismatched + result.missing}')
+                return jsonify(dict(result.to_dict(), error='The card does not match the program')), 409
+            response['verification'] = result.to_dict()
+        elif current_app.config.get('REQUIRE_CARD_VERIFICATION'):
+            return jsonify({'error': 'A read-back of the card (image or block_hashes) is required'}), 400
+        
+        # Mark as successfully programmed
+        distributions.mark_programmed(distribution, card)
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+@bp.route('/api/programming_success', methods=['POST'])
+def confirm_programming_results():
+    """Apply programming results queued by an offline companion app"""
+    results = (request.get_json(silent=True) or {}).get('results')
+    if not isinstance(results, list):
+        return jsonify({'error': 'results must be a list'}), 400
+    
+    try:
+        outcomes = confirmations.confirm(results)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    
+    summary = Counter(outcome['outcome'] for outcome in outcomes)
+    return jsonify({'results': outcomes, 'summary': summary})
+
+@bp.route('/api/verify_cards', methods=['POST'])
+def verify_cards():
+    """Check read-backs of many programmed cards against their programs"""
+    cards = (request.get_json(silent=True) or {}).get('cards')
+    if not isinstance(cards, list):
+        return jsonify({'error': 'cards must be a list'}), 400
+    
+    try:
+        results = verification.verify_many(cards)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    
+    summary = Counter(result['outcome'] for result in results)
+    return jsonify({'results': results, 'summary': summary})
+
+@bp.route('/api/programming_events/<token>', methods=['POST'])
+def report_programming_events(token):
+    """Record write attempts and errors reported by the receive page"""
+    events = (request.get_json(silent=True) or {}).get('events')
+    if not isinstance(events, list) or not events or len(events) > MAX_CLIENT_EVENTS:
+        return jsonify({'error': f'events must be a list of 1 to {MAX_CLIENT_EVENTS} events'}), 400
+    if any(not isinstance(event, dict) or event.get('kind') not in audit.CLIENT_KINDS for event in events):
+        return jsonify({'error': f"Event kind must be one of: {', '.join(audit.CLIENT_KINDS)}"}), 400
+    
+    distribution = routing.first_or_primary(ProgramDistribution.query.filter_by(access_token=token))
+    if not distribution:
+        return jsonify({'error': 'Token not found'}), 404
+    
+    for event in events:
+        duration_ms = event.get('duration_ms')
+        detail = event.get('detail')
+        audit.record(event['kind'], distribution,
+                     duration_ms=int(duration_ms) if isinstance(duration_ms, (int, float)) else None,
+                     detail=str(detail) if detail is not None else None)
+    return jsonify({'accepted': len(events)}), 202
+
+@bp.route('/api/program_data/<token>')
+def get_program_data(token):
+    try:
+        distribution = routing.first_or_primary(ProgramDistribution.query.filter_by(access_token=token))
+        
+        if not distribution:
+            return jsonify({'error': 'Token not found - program may have been lost due to database restart'}), 404
+        
+        if distribution.expires_at < datetime.utcnow():
+            distributions.mark_expired(distribution)
+            return jsonify({'error': 'Token expired'}), 403
+            
+        # Check if programming was already completed successfully
+        if distribution.is_used:
+            return jsonify({'error': 'This program has already been successfully programmed. Request a new distribution to program again.'}), 403
+        
+        program = distribution.program
+        if not program:
+            return jsonify({'error': 'Program not found - data may have been lost'}), 404
+        
+        # Update last accessed time but don't mark as used yet (wait for success confirmation)
+        distributions.mark_fetched(distribution)
+        
+        response = {
+            'program_name': program.name,
+            'program_version': distribution.program_version or program.version,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        
+        if distribution.personalized_data:
+            response['sector_data'] = json.loads(distribution.personalized_data)
+            response['personalized'] = True
+        elif distribution.base_version and distribution.program_version:
+            # The card already holds an older version: send only what changed
+            from mifare.delta import changed_block_count, removed_sectors
+
+            delta = versions.get_delta(program.id, distribution.base_version,
+                                       distribution.program_version)
+            response['sector_data'] = delta
+            response['delta'] = {
+                'from_version': distribution.base_version,
+                'to_version': distribution.program_version,
+                'changed_blocks': changed_block_count(delta),
+                'removed_sectors': removed_sectors(delta)
+            }
+        else:
+            response['sector_data'] = versions.version_sector_data(program, distribution.program_version)
+        
+        # Companion apps that read the card first pass its UID to receive per-card keys
+        uid = request.args.get('uid')
+        if uid:
+            try:
+                diversified = keys.diversify_sector_data(response['sector_data'], uid)
+            except keys.InvalidUidError:
+                return jsonify({'error': 'Invalid card UID'}), 400
+            if diversified is not None:
+                response['sector_data'] = diversified
+                response['diversified'] = True
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+@bp.route('/api/program_pages/<token>', methods=['GET', 'POST'])
+def get_program_pages(token):
+    """Page image of an NDEF program for an Ultralight/NTAG tag (?tag=NTAG213)
+
+    POST the tag's current image as {"current": "<hex>"} to receive only the
+    page writes that differ.
+    """
+    from mifare import ultralight
+
+    distribution = routing.first_or_primary(ProgramDistribution.query.filter_by(access_token=token))
+    if not distribution:
+        return jsonify({'error': 'Token not found'}), 404
+    if distribution.expires_at < datetime.utcnow():
+        distributions.mark_expired(distribution)
+        return jsonify({'error': 'Token expired'}), 403
+    if distribution.is_used:
+        return jsonify({'error': 'This program has already been successfully programmed. Request a new distribution to program again.'}), 403
+    
+    program = distribution.program
+    version = distribution.program_version or program.version
+    try:
+        spec = ultralight.get_spec(request.args.get('tag', 'NTAG213'))
+        image = ultralight.PageImage(spec, pages.page_image(program.id, version, spec.name))
+    except ultralight.CapacityError as e:
+        return jsonify({'error': str(e)}), 422
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    distributions.mark_fetched(distribution)
+    response = {'program_name': program.name, 'program_version': version, 'tag': spec.name}
+    
+    if request.method == 'POST':
+        current_hex = (request.get_json(silent=True) or {}).get('current', '')
+        try:
+            current = ultralight.PageImage(spec, bytes.fromhex(current_hex))
+            plan = ultralight.write_plan(current, image)
+        except ultralight.LockedPageError as e:
+            return jsonify({'error': str(e)}), 409
+        except ValueError as e:
+            return jsonify({'error': f'Invalid current image: {e}'}), 400
+        response['writes'] = [{'page': page, 'data': data.hex().upper()} for page, data in plan]
+    else:
+        response['pages'] = {
+            str(page): data.hex().upper()
+            for page, data in enumerate(image.pages(ultralight.CC_PAGE, spec.user_end), ultralight.CC_PAGE)
+        }
+    
+    return jsonify(response)
@@ -0,0 +1,181 @@
+"""
+Read replica routing
+
+Every URL in DATABASE_REPLICA_URLS becomes a replica bind (replica_0,
+replica_1, ...), and db.session sends the SELECTs of GET and HEAD requests
+to the replicas in turn. Everything else uses the primary: other request
+methods, work outside a request (CLI, write queue), flushes and
+INSERT/UPDATE/DELETE statements, and every query of a session after it
+has written. A request that wrote sets a cookie that keeps the client on
+the primary for READ_YOUR_WRITES_SECONDS, so it sees its own changes.
+
+Lag is measured with a heartbeat row that the app rewrites on the primary
+every REPLICA_CHECK_SECONDS. A replica that has missed the latest beat
+while its own is more than REPLICA_MAX_LAG_SECONDS old, or that cannot be
+queried, gets no reads until the next check.
+
+To try it locally, copy the database file and point a replica at the copy:
+
+    sqlite3 mifare_system.db ".backup replica.db"
+    DATABASE_REPLICA_URLS=sqlite:///replica.db python app.py
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+REPLICA_PREFIX = 'replica_'
+STICKY_COOKIE = 'db_primary_until'
+READ_METHODS = frozenset({'GET', 'HEAD'})
+_SELECTS = (sa.Select, sa.CompoundSelect)
+
+
+class ReplicaSet:
+    """An app's replica binds and which of them are fresh enough to read from"""
+
+    def __init__(self, keys: List[str], check_seconds: float = 5, max_lag_seconds: float = 10):
+        self.keys = list(keys)
+        self.check_seconds = check_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.healthy: List[str] = []
+        self.lag: Dict[str, Optional[float]] = {}
+        self.checked_at = float('-inf')
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def pick(self, engines) -> Optional[str]:
+        """Bind key of the next healthy replica, or None to read from the primary"""
+        if time.monotonic() - self.checked_at >= self.check_seconds and self._lock.acquire(blocking=False):
+            try:
+                self.check(engines)
+            finally:
+                self._lock.release()
+        healthy = self.healthy
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def check(self, engines) -> None:
+        """Write a heartbeat on the primary and compare each replica's last beat with it"""
+        from .models import ReplicationHeartbeat
+
+        table = ReplicationHeartbeat.__table__
+        beat = sa.select(table.c.beat_at).where(table.c.id == 1)
+        now = datetime.utcnow()
+        healthy: List[str] = []
+        lag: Dict[str, Optional[float]] = dict.fromkeys(self.keys)
+        try:
+            with engines[None].begin() as connection:
+                latest = connection.execute(beat).scalar()
+                if latest is None:
+                    connection.execute(table.insert().values(id=1, beat_at=now))
+                else:
+                    connection.execute(table.update().where(table.c.id == 1).values(beat_at=now))
+        except sa.exc.SQLAlchemyError:
+            latest = None  # no beat to compare with: read from the primary until it works
+
+        for key in self.keys if latest is not None else ():
+            try:
+                with engines[key].connect() as connection:
+                    replica_beat = connection.execute(beat).scalar()
+            except sa.exc.SQLAlchemyError:
+                continue
+            if replica_beat is None:
+                continue
+            lag[key] = 0.0 if replica_beat >= latest else (now - replica_beat).total_seconds()
+            if lag[key] <= self.max_lag_seconds:
+                healthy.append(key)
+        self.healthy, self.lag, self.checked_at = healthy, lag, time.monotonic()
+
+
+def replica_binds(urls: List[str]) -> Dict[str, str]:
+    return {f'{REPLICA_PREFIX}{n}': url for n, url in enumerate(urls)}
+
+
+def init_app(app) -> None:
+    """Add the replica binds and stickiness hooks (call before db.init_app)"""
+    urls = app.config.get('DATABASE_REPLICAS') or []
+    if not urls:
+        return
+    binds = replica_binds(urls)
+    app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {}, **binds)
+    app.extensions['db_replicas'] = ReplicaSet(
+        list(binds), app.config.get('REPLICA_CHECK_SECONDS', 5), app.config.get('REPLICA_MAX_LAG_SECONDS', 10))
+    app.before_request(_read_sticky_cookie)
+    app.after_request(_set_sticky_cookie)
+
+
+def _read_sticky_cookie():
+    until = request.cookies.get(STICKY_COOKIE, '')
+    if until.isdigit() and int(until) > time.time():
+        g.db_primary = True
+
+
+def _set_sticky_cookie(response):
+    if g.get('db_wrote'):
+        seconds = int(current_app.config.get('READ_YOUR_WRITES_SECONDS', 10))
+        response.set_cookie(STICKY_COOKIE, str(int(time.time()) + seconds), max_age=seconds,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+def mark_written(session=None) -> None:
+    """Keep this session, and the client of this request, on the primary"""
+    if session is not None:
+        session.info['wrote'] = True
+    if has_request_context():
+        g.db_wrote = True
+
+
+def read_bind(session) -> Optional[str]:
+    """Replica bind key for a read in this session, or None for the primary"""
+    replicas = current_app.extensions.get('db_replicas')
+    if (replicas is None or session.info.get('wrote') or not has_request_context()
+            or request.method not in READ_METHODS or g.get('db_primary')):
+        return None
+    return replicas.pick(session._db.engines)
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block"""
+    previous = g.get('db_primary', False)
+    g.db_primary = True
+    try:
+        yield
+    finally:
+        g.db_primary = previous
+
+
+def first_or_primary(query):
+    """query.first(), asked again on the primary when a replica has no row yet"""
+    row = query.first()
+    if row is None and 'db_replicas' in current_app.extensions and not g.get('db_primary'):
+        with use_primary():
+            row = query.first()
+    return row
+
+
+class RoutingSession(Session):
+    """db.session that reads from a replica where that is safe"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or isinstance(clause, sa.sql.dml.UpdateBase):
+                mark_written(self)
+            elif isinstance(clause, _SELECTS) and not _has_bind_key(mapper):
+                key = read_bind(self)
+                if key is not None:
+                    return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _has_bind_key(mapper) -> bool:
+    return mapper is not None and sa.inspect(mapper).local_table.metadata.info.get('bind_key') is not None
@@ -0,0 +1,28 @@
+"""
+Schema creation and in-place upgrades
+
+The app has no migration framework: create_all() creates missing tables,
+and columns added to existing models later are added with ALTER TABLE.
+New columns must therefore be nullable or carry a server default.
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateColumn
+
+from .extensions import db
+
+
+def upgrade_schema():
+    """Create missing tables and add missing columns to existing ones"""
+    db.create_all()
+    engine = db.engine
+    inspector = sa.inspect(engine)
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                spec = CreateColumn(column).compile(dialect=engine.dialect)
+                print(f"Adding column {table.name}.{column.name}")
+                connection.execute(sa.text(f'ALTER TABLE "{table.name}" ADD COLUMN {spec}'))
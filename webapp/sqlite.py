@@ -0,0 +1,40 @@
+"""
+SQLite production settings
+
+Engines for SQLite databases run these pragmas on every new connection:
+WAL journaling lets readers work while a write commits, busy_timeout makes
+a writer wait for the lock instead of failing with "database is locked",
+and synchronous=NORMAL is durable in WAL mode while syncing only at
+checkpoints. Override or disable them with the SQLITE_PRAGMAS config key.
+"""
+
+from typing import Dict
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 10000,  # milliseconds
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,  # negative: KiB, so about 20 MB per connection
+    'temp_store': 'MEMORY',
+}
+
+
+def is_file_database(uri: str) -> bool:
+    """True for SQLite URIs that name a file rather than an in-memory database"""
+    return uri.startswith('sqlite') and ':memory:' not in uri and not uri.rstrip('/').endswith('sqlite:')
+
+
+def configure_engine(engine, pragmas: Dict) -> None:
+    """Run pragmas on every connection the engine opens"""
+    if not pragmas:
+        return
+    from sqlalchemy import event
+
+    statements = [f'PRAGMA {name}={value}' for name, value in pragmas.items()]
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
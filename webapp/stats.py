@@ -0,0 +1,178 @@
+"""
+Incrementally maintained distribution statistics
+
+Each distribution transition bumps four DistributionStats rows in the same
+transaction as the change itself: the program's all-time totals, the
+admin's all-time totals and the hourly bucket of each. Reading a summary is
+a single-row lookup however many distributions exist; rollups sum hourly
+buckets. reconcile_stats() rebuilds every counter from the distributions
+(live and archived), for data imported in bulk or counters that drifted.
+"""
+
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, union_all, update
+
+from .extensions import db
+from .models import ArchivedDistribution, CardProgram, DistributionStats, ProgramDistribution
+
+COUNTERS = ('created', 'fetched', 'programmed', 'expired')
+ALL_PROGRAMS = 0
+TOTAL_BUCKET = datetime(1970, 1, 1)
+GRANULARITIES = ('hour', 'day')
+
+
+def hour_bucket(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _increment(execute, dialect: str, owner_id: int, program_id: int, bucket_start: datetime,
+               counter: str, amount: int) -> None:
+    table = DistributionStats.__table__
+    values = dict.fromkeys(COUNTERS, 0)
+    values.update(owner_id=owner_id, program_id=program_id, bucket_start=bucket_start)
+    values[counter] = amount
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.owner_id, table.c.program_id, table.c.bucket_start],
+            set_={counter: table.c[counter] + amount},
+        )
+        execute(statement)
+        return
+
+    # Generic fallback: update in place, insert when the row does not exist yet
+    result = execute(
+        update(table)
+        .where(table.c.owner_id == owner_id, table.c.program_id == program_id,
+               table.c.bucket_start == bucket_start)
+        .values({counter: table.c[counter] + amount})
+    )
+    if not result.rowcount:
+        execute(table.insert().values(**values))
+
+
+def record(counter: str, program: CardProgram, at: Optional[datetime] = None, amount: int = 1) -> None:
+    """Count a transition of one of the program's distributions (caller commits)"""
+    record_ids(counter, program.created_by, program.id, at, amount)
+
+
+def record_ids(counter: str, owner_id: int, program_id: int, at: Optional[datetime] = None,
+               amount: int = 1, connection=None) -> None:
+    """record() by ids, on connection if given (as the write queue does) or the session"""
+    if connection is not None:
+        execute, dialect = connection.execute, connection.dialect.name
+    else:
+        execute, dialect = db.session.execute, db.session.get_bind().dialect.name
+    bucket = hour_bucket(at or datetime.utcnow())
+    for pid in (program_id, ALL_PROGRAMS):
+        for bucket_start in (TOTAL_BUCKET, bucket):
+            _increment(execute, dialect, owner_id, pid, bucket_start, counter, amount)
+
+
+def owner_summary(owner_id: int) -> Dict:
+    """All-time totals across an admin's programs"""
+    row = DistributionStats.query.filter_by(owner_id=owner_id, program_id=ALL_PROGRAMS,
+                                            bucket_start=TOTAL_BUCKET).first()
+    return (row or DistributionStats(**dict.fromkeys(COUNTERS, 0))).to_dict()
+
+
+def program_summaries(owner_id: int) -> Dict[int, Dict]:
+    """All-time totals of each of an admin's programs, keyed by program id"""
+    rows = DistributionStats.query.filter(
+        DistributionStats.owner_id == owner_id,
+        DistributionStats.program_id != ALL_PROGRAMS,
+        DistributionStats.bucket_start == TOTAL_BUCKET,
+    )
+    return {row.program_id: row.to_dict() for row in rows}
+
+
+def rollup(owner_id: int, program_id: Optional[int] = None, granularity: str = 'day',
+           since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Dict]:
+    """Counters per hour or day between since and until (default: the last 30 days)"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    until = until or datetime.utcnow()
+    since = since or until - timedelta(days=30)
+    rows = DistributionStats.query.filter(
+        DistributionStats.owner_id == owner_id,
+        DistributionStats.program_id == (program_id or ALL_PROGRAMS),
+        DistributionStats.bucket_start >= hour_bucket(since),
+        DistributionStats.bucket_start < until,
+    ).order_by(DistributionStats.bucket_start)
+
+    buckets = {}
+    for row in rows:
+        start = row.bucket_start if granularity == 'hour' else row.bucket_start.replace(hour=0)
+        totals = buckets.setdefault(start, dict.fromkeys(COUNTERS, 0))
+        for name in COUNTERS:
+            totals[name] += getattr(row, name)
+    return [dict(totals, bucket_start=start.isoformat() + 'Z') for start, totals in buckets.items()]
+
+
+def expire_due(now: Optional[datetime] = None, batch_size: int = 1000) -> int:
+    """Stamp and count unused links whose expiry has passed; returns how many"""
+    now = now or datetime.utcnow()
+    expired = 0
+    while True:
+        batch = (ProgramDistribution.query
+                 .filter(ProgramDistribution.expires_at < now,
+                         ProgramDistribution.expired_at.is_(None),
+                         ProgramDistribution.is_used.isnot(True))
+                 .limit(batch_size).all())
+        if not batch:
+            return expired
+        per_program = Counter()
+        for distribution in batch:
+            distribution.expired_at = now
+            per_program[distribution.program_id] += 1
+        for program in CardProgram.query.filter(CardProgram.id.in_(per_program)):
+            record('expired', program, now, per_program[program.id])
+        db.session.commit()
+        expired += len(batch)
+
+
+def reconcile_stats(batch_size: int = 1000) -> int:
+    """Rebuild every counter from the live and archived distributions; returns rows written
+
+    Links are counted as fetched if they were ever accessed, in the hour of
+    their last access.
+    """
+    counts = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+    def add(owner_id, program_id, at, counter):
+        for pid in (program_id, ALL_PROGRAMS):
+            counts[(owner_id, pid, TOTAL_BUCKET)][counter] += 1
+            if at is not None:
+                counts[(owner_id, pid, hour_bucket(at))][counter] += 1
+
+    statement = union_all(*(
+        select(CardProgram.created_by, model.program_id, model.created_at, model.used_at,
+               model.is_used, model.expired_at)
+        .join(CardProgram, CardProgram.id == model.program_id)
+        for model in (ProgramDistribution, ArchivedDistribution)
+    )).execution_options(yield_per=batch_size)
+    for owner_id, program_id, created_at, used_at, is_used, expired_at in db.session.execute(statement):
+        add(owner_id, program_id, created_at, 'created')
+        if used_at is not None:
+            add(owner_id, program_id, used_at, 'fetched')
+        if is_used:
+            add(owner_id, program_id, used_at, 'programmed')
+        elif expired_at is not None:
+            add(owner_id, program_id, expired_at, 'expired')
+
+    rows = [
+        {'owner_id': owner_id, 'program_id': program_id, 'bucket_start': bucket_start, **values}
+        for (owner_id, program_id, bucket_start), values in counts.items()
+    ]
+    db.session.execute(DistributionStats.__table__.delete())
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(DistributionStats.__table__.insert(), rows[start:start + batch_size])
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,95 @@
+"""
+Distribution archival
+
+Used links and links that expired unused are dead weight in the
+distributions table: every token lookup goes through its unique index. The
+sweeper moves them to archived_distribution once they are past their
+retention (used_days after programming, expired_days after expiry), so the
+live table holds little more than the links that can still be used.
+
+Rows move in small batches, one short transaction each (copy the links and
+their programming confirmations, delete both), and the sweeper sleeps
+between batches to stay under max_rate rows per second, so live requests
+never wait long for the write lock. Statistics are unchanged: unused links
+are stamped and counted as expired before they are archived, and
+reconcile_stats() and card_version() read the archive as well, and so do
+bulk confirmations, so a retried op_id is still answered as a duplicate.
+"""
+
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import and_, delete, or_, select
+
+from .extensions import db
+from .models import ArchivedConfirmation, ArchivedDistribution, ProgramDistribution, ProgrammingConfirmation
+from . import stats
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_RATE = 2000  # rows per second
+USED_DAYS = 30
+EXPIRED_DAYS = 7
+
+COLUMNS = [column.name for column in ProgramDistribution.__table__.columns]
+CONFIRMATION_COLUMNS = [column.name for column in ProgrammingConfirmation.__table__.columns]
+
+
+def dead_filter(now: datetime, used_days: int = USED_DAYS, expired_days: int = EXPIRED_DAYS):
+    """Condition matching distributions that are due for archival"""
+    return or_(
+        and_(ProgramDistribution.is_used.is_(True), ProgramDistribution.used_at < now - timedelta(days=used_days)),
+        and_(ProgramDistribution.is_used.isnot(True),
+             ProgramDistribution.expires_at < now - timedelta(days=expired_days)),
+    )
+
+
+def archive_batch(ids) -> None:
+    """Move the given distributions to the archive in the current transaction"""
+    live = ProgramDistribution.__table__
+    archive = ArchivedDistribution.__table__
+    db.session.execute(archive.insert().from_select(
+        COLUMNS, select(*(live.c[name] for name in COLUMNS)).where(live.c.id.in_(ids))))
+    confirmations = ProgrammingConfirmation.__table__
+    db.session.execute(ArchivedConfirmation.__table__.insert().from_select(
+        CONFIRMATION_COLUMNS, select(*(confirmations.c[name] for name in CONFIRMATION_COLUMNS))
+        .where(confirmations.c.distribution_id.in_(ids))))
+    db.session.execute(delete(ProgrammingConfirmation).where(ProgrammingConfirmation.distribution_id.in_(ids)))
+    db.session.execute(live.delete().where(live.c.id.in_(ids)))
+
+
+def sweep(now: Optional[datetime] = None, used_days: int = USED_DAYS, expired_days: int = EXPIRED_DAYS,
+          batch_size: int = DEFAULT_BATCH_SIZE, max_rate: float = DEFAULT_MAX_RATE,
+          max_rows: Optional[int] = None) -> Dict:
+    """Archive dead distributions in rate-limited batches; returns a report"""
+    now = now or datetime.utcnow()
+    started = time.monotonic()
+    report = {'expired': stats.expire_due(now, batch_size), 'archived': 0, 'batches': 0,
+              'used': 0, 'unused': 0, 'programs': Counter()}
+    condition = dead_filter(now, used_days, expired_days)
+    while max_rows is None or report['archived'] < max_rows:
+        limit = batch_size if max_rows is None else min(batch_size, max_rows - report['archived'])
+        rows = db.session.execute(
+            select(ProgramDistribution.id, ProgramDistribution.program_id, ProgramDistribution.is_used)
+            .where(condition).order_by(ProgramDistribution.id).limit(limit)
+        ).all()
+        if not rows:
+            break
+        archive_batch([row.id for row in rows])
+        db.session.commit()
+
+        report['archived'] += len(rows)
+        report['batches'] += 1
+        for row in rows:
+            report['used' if row.is_used else 'unused'] += 1
+            report['programs'][row.program_id] += 1
+        if max_rate:
+            ahead = report['archived'] / max_rate - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    report['programs'] = dict(report['programs'])
+    report['remaining'] = ProgramDistribution.query.count()
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
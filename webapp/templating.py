@@ -0,0 +1,164 @@
+"""
+Template compilation and fragment caching
+
+Compiled templates are kept as bytecode files, so a new process or a cold
+serverless container loads them instead of parsing and compiling the
+templates again. Jinja checks each file against the template source, so
+edits and deploys are picked up. Bytecode is loaded with marshal, so the
+directory must not be writable by anyone else: by default it is Jinja's
+private per-user directory (mode 0700, ownership checked). JINJA_CACHE_DIR
+sets another one, which must be owned by the app's user and not writable by
+group or others; empty disables the cache.
+
+{% cache %} blocks keep their rendered output in a bounded in-memory LRU.
+The key is the block's arguments, which must include a version of
+everything the block shows:
+
+    {% cache 'program-row', program.id, program.version %} ... {% endcache %}
+
+A block is rendered again when any argument changes. The cache holds at
+most FRAGMENT_CACHE_SIZE entries and FRAGMENT_CACHE_BYTES characters, each
+for at most FRAGMENT_CACHE_SECONDS. Changes that keep ids and versions
+(bulk imports) call clear_fragments(); the age limit bounds how long other
+processes, such as a command-line import, can leave a stale row showing.
+"""
+
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+DEFAULT_FRAGMENT_ENTRIES = 2000
+DEFAULT_FRAGMENT_BYTES = 8 * 1024 * 1024
+DEFAULT_FRAGMENT_SECONDS = 600
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that renders uncached when the directory is not writable"""
+
+    def dump_bytecode(self, bucket) -> None:
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments, bounded by entries, total size and age"""
+
+    def __init__(self, max_entries: int = DEFAULT_FRAGMENT_ENTRIES, max_bytes: int = DEFAULT_FRAGMENT_BYTES,
+                 max_age: float = DEFAULT_FRAGMENT_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: str) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self._entries[key] = (value, time.monotonic() + self.max_age)
+            self.size += len(value)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _freeze(value) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache key, ... %}body{% endcache %}, stored in environment.fragment_cache"""
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        key = _freeze(key)
+        value = cache.get(key)
+        if value is None:
+            value = caller()
+            cache.set(key, value)
+        return value
+
+
+def _private_directory(directory: str) -> bool:
+    """Create directory for this user only; False if someone else could write to it"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return False
+    return not hasattr(os, 'getuid') or info.st_uid == os.getuid()
+
+
+def configure(app) -> None:
+    """Set up the bytecode and fragment caches (before app.jinja_env is first used)"""
+    options = dict(app.jinja_options)
+    options['extensions'] = list(options.get('extensions', ())) + [FragmentCacheExtension]
+    directory = app.config.get('JINJA_CACHE_DIR')
+    try:
+        if directory is None:
+            options['bytecode_cache'] = BytecodeCache()  # Jinja's checked per-user directory
+        elif directory and _private_directory(directory):
+            options['bytecode_cache'] = BytecodeCache(directory)
+        elif directory:
+            app.logger.warning('Not caching template bytecode in %s: it is writable by others', directory)
+    except (OSError, RuntimeError):  # Jinja raises RuntimeError when its directory is unsafe
+        pass
+    app.jinja_options = options
+
+    cache = app.jinja_env.fragment_cache
+    cache.max_entries = app.config.get('FRAGMENT_CACHE_SIZE', DEFAULT_FRAGMENT_ENTRIES)
+    cache.max_bytes = app.config.get('FRAGMENT_CACHE_BYTES', DEFAULT_FRAGMENT_BYTES)
+    cache.max_age = app.config.get('FRAGMENT_CACHE_SECONDS', DEFAULT_FRAGMENT_SECONDS)
+
+
+def clear_fragments(app) -> None:
+    """Drop every cached fragment, after changes that keep ids and versions"""
+    app.jinja_env.fragment_cache.clear()
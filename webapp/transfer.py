@@ -0,0 +1,279 @@
+"""
+Streaming bulk export and import
+
+Exports page through tables with server-side cursors (yield_per) and
+write NDJSON, optionally gzip-compressed, so memory use does not depend on
+table size. An export of everything tags each record with its kind and
+orders the tables so foreign keys resolve; the importer reads that stream
+back, upserting rows by primary key in batches.
+
+Everything is exported except cached program deltas (rebuilt on demand)
+and the replication heartbeat. A batch that violates a constraint is rolled
+back and reported with its first failing record.
+
+Given an owner_id, exports and imports are limited to the data of that
+admin's programs (OWNED_KINDS); users are only moved with transfer_data.py.
+"""
+
+import json
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from flask import current_app
+from sqlalchemy import not_, select
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import (User, CardProgram, ProgramVersion, ProgramDelta, ProgramDistribution, ArchivedDistribution,
+                     ProgrammingConfirmation, ArchivedConfirmation, DistributionStats, ProgrammingEvent)
+
+# Export order is also the import order that satisfies foreign keys
+MODELS = {
+    'users': User,
+    'programs': CardProgram,
+    'program_versions': ProgramVersion,
+    'distributions': ProgramDistribution,
+    'archived_distributions': ArchivedDistribution,
+    'programming_confirmations': ProgrammingConfirmation,
+    'archived_confirmations': ArchivedConfirmation,
+    'distribution_stats': DistributionStats,
+    'programming_events': ProgrammingEvent,
+}
+
+# Kinds that belong to a program owner
+OWNED_KINDS = [kind for kind in MODELS if kind != 'users']
+
+DEFAULT_BATCH_SIZE = 1000
+CHUNK_BYTES = 64 * 1024
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _owned(kind: str, owner_id: int):
+    """Where-clause selecting the rows of a kind that belong to owner_id's programs"""
+    table = MODELS[kind].__table__
+    programs = select(CardProgram.id).where(CardProgram.created_by == owner_id)
+    if kind == 'programs':
+        return table.c.created_by == owner_id
+    if kind == 'distribution_stats':
+        return table.c.owner_id == owner_id
+    if kind == 'programming_confirmations':
+        return table.c.distribution_id.in_(
+            select(ProgramDistribution.id).where(ProgramDistribution.program_id.in_(programs)))
+    if kind == 'archived_confirmations':
+        return table.c.distribution_id.in_(
+            select(ArchivedDistribution.id).where(ArchivedDistribution.program_id.in_(programs)))
+    if kind in OWNED_KINDS:
+        return table.c.program_id.in_(programs)
+    raise ValueError(f'{kind} records can only be moved with transfer_data.py')
+
+
+def iter_records(kind: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 owner_id: Optional[int] = None) -> Iterator[Dict]:
+    """Yield every row of one table (or owner_id's rows of it) as a dict, streaming from the database"""
+    table = MODELS[kind].__table__
+    statement = select(table).order_by(table.c.id).execution_options(yield_per=batch_size)
+    if owner_id is not None:
+        statement = statement.where(_owned(kind, owner_id))
+    for row in db.session.execute(statement).mappings():
+        yield {key: _encode(value) for key, value in row.items()}
+
+
+def iter_export(kinds: Iterable[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                tagged: bool = False, owner_id: Optional[int] = None) -> Iterator[str]:
+    """NDJSON lines for the given tables, tagged with '_kind' if requested"""
+    kinds = list(kinds)
+    if 'programming_events' in kinds:
+        from . import audit
+
+        audit.get_buffer().flush()  # include the events still in memory
+    for kind in kinds:
+        for record in iter_records(kind, batch_size, owner_id):
+            if tagged:
+                record['_kind'] = kind
+            yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def iter_chunks(lines: Iterable[str], compress: bool = False) -> Iterator[bytes]:
+    """Group lines into ~64 KB chunks, gzip-compressing them if requested"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer: List[bytes] = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= CHUNK_BYTES:
+            chunk = b''.join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b''.join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def _decode(table, record: Dict) -> Dict:
+    """Keep known columns and turn ISO timestamps back into datetimes"""
+    row = {}
+    for column in table.columns:
+        if column.name not in record:
+            continue
+        value = record[column.name]
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        row[column.name] = value
+    return row
+
+
+def _upsert(table, rows: List[Dict]) -> None:
+    """Insert rows, updating the ones whose primary key already exists"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        columns = {name for row in rows for name in row} - {'id'}
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={name: statement.excluded[name] for name in columns},
+        )
+        db.session.execute(statement, rows)
+        return
+
+    # Generic fallback: one lookup for the batch, then split inserts and updates
+    ids = [row['id'] for row in rows]
+    existing = set(db.session.execute(select(table.c.id).where(table.c.id.in_(ids))).scalars())
+    inserts = [row for row in rows if row['id'] not in existing]
+    for row in rows:
+        if row['id'] in existing:
+            db.session.execute(table.update().where(table.c.id == row['id']).values(**row))
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+
+
+def _failing_row(table, rows: List[Dict]) -> Dict:
+    """Replay a failed batch row by row to find the first row that conflicts (rolled back)"""
+    try:
+        for row in rows:
+            try:
+                _upsert(table, [row])
+            except IntegrityError:
+                return row
+        return rows[0]
+    finally:
+        db.session.rollback()
+
+
+def _check_owner(kind: str, ids: List, owner_id: int) -> None:
+    """ValueError if any of the rows with these ids belongs to someone else"""
+    table = MODELS[kind].__table__
+    foreign = db.session.execute(select(table.c.id).where(table.c.id.in_(ids), not_(_owned(kind, owner_id)))
+                                 .limit(1)).scalar()
+    if foreign is not None:
+        raise ValueError(f'{kind} record {foreign} belongs to another owner')
+
+
+def _clear_caches(versions_replaced: bool) -> None:
+    """Drop what was derived from rows an import may have replaced under the same id and version"""
+    from . import pages, personalization, verification, versions
+    from .templating import clear_fragments
+
+    clear_fragments(current_app)
+    versions._cached_delta.cache_clear()
+    verification._program_image.cache_clear()
+    pages.page_image.cache_clear()
+    personalization._template.cache_clear()
+    if versions_replaced:  # stored deltas are rebuilt on demand
+        db.session.query(ProgramDelta).delete()
+        db.session.commit()
+
+
+def _reset_sequences(kinds: Iterable[str]) -> None:
+    """Move PostgreSQL id sequences past explicitly imported ids"""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    for kind in kinds:
+        name = MODELS[kind].__table__.name
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('\"{name}\"', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM \"{name}\"), 1))"
+        ))
+
+
+def import_records(lines: Iterable, default_kind: str = None,
+                   batch_size: int = DEFAULT_BATCH_SIZE, owner_id: Optional[int] = None) -> Dict[str, int]:
+    """Upsert NDJSON records in batches, one transaction per batch
+
+    Records are routed by their '_kind' tag, or default_kind for an
+    untagged single-table export. With an owner_id, a record that would
+    replace or create a row outside that owner's programs stops the import
+    with ValueError. Returns the number of rows per kind.
+    """
+    counts = {kind: 0 for kind in MODELS}
+    try:
+        _import(lines, default_kind, batch_size, counts, owner_id)
+    finally:
+        if any(counts.values()):
+            _clear_caches(bool(counts['program_versions']))
+    _reset_sequences(kind for kind, count in counts.items() if count)
+    db.session.commit()
+    return counts
+
+
+def _import(lines: Iterable, default_kind: str, batch_size: int, counts: Dict[str, int],
+            owner_id: Optional[int]) -> None:
+    pending_kind = None
+    pending: List[Dict] = []
+
+    def flush():
+        if pending:
+            table = MODELS[pending_kind].__table__
+            try:
+                if owner_id is not None:
+                    ids = [row.get('id') for row in pending]
+                    _check_owner(pending_kind, ids, owner_id)  # rows it would replace
+                    _upsert(table, pending)
+                    _check_owner(pending_kind, ids, owner_id)  # rows as imported
+                else:
+                    _upsert(table, pending)
+                db.session.commit()
+            except ValueError:
+                db.session.rollback()
+                raise
+            except IntegrityError as e:
+                db.session.rollback()
+                row = _failing_row(table, pending)
+                raise ValueError(f'{pending_kind} record {row.get("id")} conflicts with existing data '
+                                 f'({e.orig}); {sum(counts.values())} earlier records were imported') from e
+            counts[pending_kind] += len(pending)
+            pending.clear()
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError(f'Expected a JSON object per line, got {type(record).__name__}')
+        kind = record.pop('_kind', default_kind)
+        if kind not in MODELS:
+            raise ValueError(f'Unknown record kind: {kind}')
+        if owner_id is not None and kind not in OWNED_KINDS:
+            raise ValueError(f'{kind} records can only be imported with transfer_data.py')
+        if kind != pending_kind or len(pending) >= batch_size:
+            flush()
+            pending_kind = kind
+        pending.append(_decode(MODELS[kind].__table__, record))
+    flush()
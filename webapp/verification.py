@@ -0,0 +1,105 @@
+"""
+Card read-back verification
+
+After writing a card, a companion app can read it back and send the image
+({"image": "<hex>"}, starting at block 0) or per-block hashes
+({"block_hashes": {"4": "<16 hex digits>", ...}}, see mifare.verify). The
+read-back is compared with the program version pinned by the distribution,
+or with the holder's personalized image. Only a compact digest of the card
+is stored with the distribution, plus whether it matched.
+
+Programs are prepared once per version and kept in an in-process LRU
+cache, so a batch of cards for the same program costs one masked compare
+per card.
+"""
+
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List
+
+from sqlalchemy import update
+
+from .extensions import db
+from .models import CardProgram, ProgramDistribution
+from . import routing, versions
+
+MAX_CARDS = 1000
+
+
+@lru_cache(maxsize=256)
+def _program_image(program_id: int, version: int):
+    from mifare.verify import ExpectedImage
+
+    return ExpectedImage(versions.version_sector_data(db.session.get(CardProgram, program_id), version))
+
+
+def expected_image(distribution: ProgramDistribution):
+    """What the distribution's card should hold"""
+    if distribution.personalized_data:
+        from mifare.verify import ExpectedImage
+
+        return ExpectedImage(json.loads(distribution.personalized_data))
+    return _program_image(distribution.program_id, distribution.program_version or distribution.program.version)
+
+
+def has_readback(payload: Dict) -> bool:
+    return 'image' in payload or 'block_hashes' in payload
+
+
+def verify(distribution: ProgramDistribution, payload: Dict):
+    """Compare a read-back payload with the distribution's image; ValueError if it is malformed"""
+    expected = expected_image(distribution)
+    if 'image' in payload:
+        image = payload['image']
+        if not isinstance(image, str):
+            raise ValueError('image must be a hex string')
+        return expected.compare_image(bytes.fromhex(image))
+
+    reported = payload.get('block_hashes')
+    if not isinstance(reported, dict):
+        raise ValueError('block_hashes must map block numbers to hex hashes')
+    hashes = {}
+    for block, value in reported.items():
+        if not isinstance(value, str):
+            raise ValueError(f'Hash of block {block} must be a hex string')
+        hashes[int(block)] = bytes.fromhex(value)
+    return expected.compare_hashes(hashes)
+
+
+def card_values(result) -> Dict:
+    """Distribution columns recording a verification"""
+    return {'card_digest': result.digest, 'card_matches': result.matched, 'verified_at': datetime.utcnow()}
+
+
+def verify_many(cards: List) -> List[Dict]:
+    """Verify a batch of read-backs and store their digests in one commit; one result per card"""
+    if len(cards) > MAX_CARDS:
+        raise ValueError(f'At most {MAX_CARDS} cards per request')
+    tokens = {card['token'] for card in cards if isinstance(card, dict) and isinstance(card.get('token'), str)}
+    by_token = {}
+    if tokens:
+        by_token = {d.access_token: d for d in
+                    ProgramDistribution.query.filter(ProgramDistribution.access_token.in_(tokens))}
+
+    results = []
+    rows = []
+    for card in cards:
+        token = card.get('token') if isinstance(card, dict) else None
+        distribution = by_token.get(token)
+        if distribution is None:
+            results.append({'token': token, 'outcome': 'not_found'})
+            continue
+        try:
+            result = verify(distribution, card)
+        except (LookupError, TypeError, ValueError) as e:
+            results.append({'token': token, 'outcome': 'invalid', 'error': str(e)})
+            continue
+        results.append(dict(result.to_dict(), token=token, outcome='matched' if result.matched else 'mismatched'))
+        rows.append(dict(card_values(result), id=distribution.id))
+
+    if rows:
+        db.session.execute(update(ProgramDistribution), rows)
+        db.session.commit()
+        routing.mark_written(db.session)
+    return results
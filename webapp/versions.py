@@ -0,0 +1,113 @@
+"""
+Program versions and delta distribution
+
+Every change to a program's sector data creates a new immutable
+ProgramVersion. Distributions pin the version they deliver and, when the
+user's card already holds an older version of the same program, the
+version it holds; the program data API then serves only the delta between
+the two. Deltas are computed once per version pair, stored in ProgramDelta
+and kept in an in-process LRU cache. Snapshots missing on a lagging read
+replica are looked up again on the primary.
+"""
+
+import json
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import ArchivedDistribution, CardProgram, ProgramVersion, ProgramDelta, ProgramDistribution
+from . import routing
+
+
+def ensure_snapshot(program: CardProgram) -> ProgramVersion:
+    """Return the snapshot of the program's current version, creating it if missing
+
+    Programs created before versioning (or bulk-imported) only have their
+    sector_data column; their first snapshot is taken on demand.
+    """
+    snapshot = ProgramVersion.query.filter_by(program_id=program.id, version=program.version).first()
+    if snapshot is None:
+        snapshot = ProgramVersion(program_id=program.id, version=program.version,
+                                  sector_data=program.sector_data)
+        db.session.add(snapshot)
+        db.session.flush()
+    return snapshot
+
+
+def publish_version(program: CardProgram, sector_data: str) -> int:
+    """Store new sector data as the program's next version (caller commits)"""
+    ensure_snapshot(program)
+    program.version += 1
+    program.sector_data = sector_data
+    db.session.add(ProgramVersion(program_id=program.id, version=program.version,
+                                  sector_data=sector_data))
+    db.session.flush()
+    return program.version
+
+
+def version_sector_data(program: CardProgram, version: Optional[int]) -> dict:
+    """Parsed sector data of a program version (the current one if version is None)"""
+    if version is None or version == program.version:
+        return json.loads(program.sector_data)
+    snapshot = routing.first_or_primary(ProgramVersion.query.filter_by(program_id=program.id, version=version))
+    if snapshot is None:
+        raise LookupError(f'Program {program.id} has no version {version}')
+    return json.loads(snapshot.sector_data)
+
+
+def card_version(user_id: int, program_id: int) -> Optional[int]:
+    """Version of a program last programmed onto the user's card, if known"""
+    for model in (ProgramDistribution, ArchivedDistribution):  # archived links are all older
+        distribution = (model.query
+                        .filter_by(user_id=user_id, program_id=program_id, is_used=True)
+                        .filter(model.program_version.isnot(None))
+                        .order_by(model.used_at.desc())
+                        .first())
+        if distribution:
+            return distribution.program_version
+    return None
+
+
+def distribution_versions(program: CardProgram, user_id: int, full: bool = False) -> dict:
+    """program_version/base_version values for a new distribution"""
+    ensure_snapshot(program)
+    base = None if full else card_version(user_id, program.id)
+    if base is not None and base >= program.version:
+        base = None  # card already current: send the full program for a rewrite
+    return {'program_version': program.version, 'base_version': base}
+
+
+@lru_cache(maxsize=512)
+def _cached_delta(program_id: int, from_version: int, to_version: int) -> str:
+    from mifare.delta import compute_delta
+
+    cached = ProgramDelta.query.filter_by(program_id=program_id, from_version=from_version,
+                                          to_version=to_version).first()
+    if cached is not None:
+        return cached.delta
+
+    query = ProgramVersion.query.filter(ProgramVersion.program_id == program_id,
+                                        ProgramVersion.version.in_([from_version, to_version]))
+    versions = {v.version: json.loads(v.sector_data) for v in query}
+    if from_version not in versions or to_version not in versions:
+        with routing.use_primary():  # a replica may not have the newest version yet
+            versions = {v.version: json.loads(v.sector_data) for v in query}
+    if from_version not in versions or to_version not in versions:
+        raise LookupError(f'Program {program_id} is missing version {from_version} or {to_version}')
+
+    delta = json.dumps(compute_delta(versions[from_version], versions[to_version]),
+                       separators=(',', ':'))
+    try:
+        db.session.add(ProgramDelta(program_id=program_id, from_version=from_version,
+                                    to_version=to_version, delta=delta))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # another worker stored the same delta first
+    return delta
+
+
+def get_delta(program_id: int, from_version: int, to_version: int) -> dict:
+    """Delta between two versions, computed once and cached"""
+    return json.loads(_cached_delta(program_id, from_version, to_version))
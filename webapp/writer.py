@@ -0,0 +1,117 @@
+"""
+Single-writer commit queue
+
+SQLite allows one writer at a time. Rather than have every request thread
+open its own write transaction and contend for the lock, the distribution
+updates made while cards are programmed are queued to one writer thread.
+It runs every job that queued up while it was busy in one transaction
+and commits once. A job that fails rolls its batch back, and the jobs are
+then retried one transaction each so the others still commit. Callers
+wait on the job's future until the commit that includes it has finished.
+
+Used for file-backed SQLite databases unless SQLITE_WRITER is False;
+reads and all other writes go through the normal session.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from flask import current_app
+
+from .extensions import db
+from .sqlite import is_file_database
+
+DEFAULT_MAX_BATCH = 128
+
+_Job = Tuple[Callable, tuple, Future]
+_lock = threading.Lock()
+
+
+class WriteQueue:
+    """Runs write jobs (fn(connection, *args)) on one thread, grouping commits"""
+
+    def __init__(self, engine, max_batch: int = DEFAULT_MAX_BATCH):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.commits = 0
+        self.jobs = 0
+        self._queue: 'queue.SimpleQueue[Optional[_Job]]' = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        future = Future()
+        self._queue.put((fn, args, future))
+        if self._thread is None:
+            self._start()
+        return future
+
+    def run(self, fn: Callable, *args):
+        """Submit a job and wait until the transaction holding it is committed"""
+        return self.submit(fn, *args).result()
+
+    def stop(self) -> None:
+        """Finish the queued jobs and stop the writer thread"""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _start(self) -> None:
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='sqlite-writer', daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._commit(batch)
+                    return
+                batch.append(job)
+            self._commit(batch)
+
+    def _commit(self, batch: List[_Job]) -> None:
+        try:
+            results = self._transaction(batch)
+        except Exception as e:
+            if len(batch) > 1:
+                for job in batch:  # isolate the failing job
+                    self._commit([job])
+            else:
+                batch[0][2].set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _transaction(self, batch: List[_Job]) -> list:
+        with self.engine.begin() as connection:
+            results = [fn(connection, *args) for fn, args, _ in batch]
+        self.commits += 1
+        self.jobs += len(batch)
+        return results
+
+
+def get_writer() -> Optional[WriteQueue]:
+    """The app's write queue, or None when writes go through the session"""
+    app = current_app._get_current_object()
+    if 'sqlite_writer' not in app.extensions:
+        with _lock:
+            if 'sqlite_writer' not in app.extensions:
+                enabled = (app.config.get('SQLITE_WRITER', True)
+                           and is_file_database(app.config['SQLALCHEMY_DATABASE_URI']))
+                app.extensions['sqlite_writer'] = WriteQueue(
+                    db.engine, app.config.get('SQLITE_COMMIT_BATCH', DEFAULT_MAX_BATCH)) if enabled else None
+    return app.extensions['sqlite_writer']